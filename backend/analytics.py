@@ -0,0 +1,254 @@
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+
+from . import archive, database, models, reference, rollover, logs
+from .utils.punctuality import BUCKET_LABELS, Rollup, Tally
+from .utils.stop_store import NO_TIME
+
+# Statystyki punktualności z historii statusów postojów.
+# Postój bez statusu odbył się zgodnie z planem, więc podstawą są planowe postoje kursujące danej doby
+# (z danych referencyjnych w pamięci), a statusy doby tylko zmieniają udział swoich postojów.
+# Liczniki grup (trasa, stacja, przewoźnik, godzina, dzień tygodnia) zamkniętych dób zapisywane są przy zmianie
+# doby w tabeli punctuality_rollup; bieżąca doba liczona jest raz w pamięci i aktualizowana przy każdej edycji.
+# Zapytania statystyk czytają tylko te liczniki - nigdy stop_status.
+#
+# PUNCTUALITY_ON_TIME_MINUTES - największe opóźnienie (w minutach) liczone jako punktualne, domyślnie 5.
+# PUNCTUALITY_BACKFILL=0 - bez uzupełniania liczników minionych dób przy starcie (np. w testach wydajności).
+
+log = logs.get_logger("analytics")
+
+ON_TIME_MINUTES = int(os.getenv("PUNCTUALITY_ON_TIME_MINUTES", "5"))
+DIMENSIONS = ("route", "station", "carrier", "hour", "weekday")
+WEEKDAYS = ("poniedziałek", "wtorek", "środa", "czwartek", "piątek", "sobota", "niedziela")
+# Tyle minionych dób bez liczników uzupełnianych jest przy starcie serwera
+CLOSE_MISSING_DAYS = 7
+BACKFILL = os.getenv("PUNCTUALITY_BACKFILL", "1") != "0"
+# Grupa zapisywana dla każdej zamkniętej doby (także bez postojów) - suma doby, oznacza dobę jako zamkniętą
+DAY_TOTAL = ("day", "all")
+
+Contribution = Tuple[int, bool, bool]  # (opóźnienie, odwołany, komunikacja zastępcza)
+ON_PLAN: Contribution = (0, False, False)
+
+class DayRollup:
+    """
+    Liczniki wszystkich grup jednej doby wraz z udziałem postojów, które mają status (do aktualizacji przy edycji).
+    """
+
+    def __init__(self, data: reference.ReferenceData, day: date, statuses: Dict[int, tuple]):
+        self.day = day
+        self.version = data.version
+        self.rollup = Rollup(ON_TIME_MINUTES)
+        self.contributions: Dict[int, Contribution] = {}
+
+        store = data.store
+        running = store.running(day)
+        for trip, runs in enumerate(running):
+            if not runs:
+                continue
+            for position in store.itinerary(trip):
+                contribution = ON_PLAN
+                status = statuses.get(store.stop_id[position])
+                if status is not None:
+                    contribution = self.contributions[store.stop_id[position]] = stop_contribution(store, position, *status)
+                self.rollup.add(group_keys(data, position, day), *contribution)
+
+    def update(self, data: reference.ReferenceData, stop_id: int, status: tuple):
+        store = data.store
+        position = store.position(stop_id)
+        if position is None or not store.running(self.day)[store.trip[position]]:
+            return
+        keys = group_keys(data, position, self.day)
+        self.rollup.add(keys, *self.contributions.get(stop_id, ON_PLAN), sign=-1)
+        contribution = self.contributions[stop_id] = stop_contribution(store, position, *status)
+        self.rollup.add(keys, *contribution)
+
+def stop_contribution(store, position: int, arrival_delay, departure_delay, is_cancelled, bus) -> Contribution:
+    """
+    Opóźnienie postoju: przyjazdu, a na stacji początkowej (bez przyjazdu) - odjazdu.
+    """
+    delay = arrival_delay if store.arrival[position] != NO_TIME else departure_delay
+    return (delay or 0, bool(is_cancelled), bool(bus))
+
+def group_keys(data: reference.ReferenceData, position: int, day: date) -> List[Tuple[str, str]]:
+    store = data.store
+    route = data.trips[store.trip_ids[store.trip[position]]].route
+    minute = store.arrival[position] if store.arrival[position] != NO_TIME else store.departure[position]
+    keys = [("route", route.id), ("carrier", route.carrier_name or ""), ("weekday", str(day.weekday()))]
+    if minute != NO_TIME:
+        keys.append(("hour", str(minute // 60 % 24)))
+    if store.station[position] != -1:
+        keys.append(("station", str(store.station[position])))
+    return keys
+
+def day_statuses(connection, day: date) -> Dict[int, tuple]:
+    history = archive.history(since=day, until=day)
+    rows = connection.execute(select(
+        history.c.stop_id, history.c.arrival_delay, history.c.departure_delay, history.c.is_cancelled, history.c.bus,
+    ))
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+def build_day(engine, day: date) -> DayRollup:
+    with engine.connect() as connection:
+        statuses = day_statuses(connection, day)
+    return DayRollup(reference.get(), day, statuses)
+
+TALLY_COLUMNS = ("stops", "cancelled", "bus", "on_time", "delay_minutes")
+BUCKET_COLUMNS = tuple(f"bucket_{i}" for i in range(len(BUCKET_LABELS)))
+
+def close_day(engine, day: date):
+    """
+    Zapisuje liczniki doby w punctuality_rollup (zastępując poprzednie liczniki tej doby).
+    """
+    day_rollup = build_day(engine, day)
+    total = Tally()
+    for (dimension, _), tally in day_rollup.rollup.groups.items():
+        if dimension == "weekday":
+            total.merge(tally)
+    groups = {**day_rollup.rollup.groups, DAY_TOTAL: total}
+    rows = [
+        dict(
+            date=day, dimension=dimension, key=key,
+            **{column: getattr(tally, column) for column in TALLY_COLUMNS},
+            **dict(zip(BUCKET_COLUMNS, tally.buckets)),
+        )
+        for (dimension, key), tally in groups.items()
+    ]
+    table = models.PunctualityRollup.__table__
+    with engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.date == day))
+        connection.execute(table.insert(), rows)
+    log.info("Zapisano statystyki punktualności", extra={"service_date": day, "groups": len(rows)})
+
+def closed_days(engine, since: date, until: date) -> set:
+    table = models.PunctualityRollup.__table__
+    with engine.connect() as connection:
+        return set(connection.execute(
+            select(table.c.date).where(table.c.date.between(since, until)).distinct()
+        ).scalars())
+
+def close_missing_days(today: date, engine=None):
+    if not BACKFILL:
+        return
+    engine = engine if engine is not None else database.engine
+    since = today - timedelta(days=CLOSE_MISSING_DAYS)
+    done = closed_days(engine, since, today - timedelta(days=1))
+    for offset in range(CLOSE_MISSING_DAYS, 0, -1):
+        day = today - timedelta(days=offset)
+        if day not in done:
+            close_day(engine, day)
+
+# Liczniki bieżącej doby (budowane przy pierwszym zapytaniu, potem aktualizowane przez record_status)
+_live: Optional[DayRollup] = None
+_live_lock = threading.Lock()
+# Statusy zapisane w trakcie budowy liczników - nakładane na nie przed podmianą
+_building = 0
+_pending: List[Tuple[date, int, tuple]] = []
+
+def live_rollup(today: date, engine=None) -> DayRollup:
+    global _live, _building
+    data = reference.get()
+    live = _live
+    if live is not None and live.day == today and live.version == data.version:
+        return live
+
+    # Budowa (zapytanie i przejście całej sieci) odbywa się poza blokadą, więc record_status wywoływane
+    # z pętli zdarzeń na nią nie czeka
+    with _live_lock:
+        _building += 1
+    try:
+        built = build_day(engine if engine is not None else database.engine, today)
+    finally:
+        with _live_lock:
+            _building -= 1
+            pending = list(_pending)
+            if not _building:
+                _pending.clear()
+    with _live_lock:
+        if _live is None or _live.day != built.day or _live.version != built.version:
+            for day, stop_id, contribution in pending:
+                if day == built.day:
+                    built.update(reference.get(), stop_id, contribution)
+            _live = built
+        return _live
+
+def record_status(stop: models.Stop, today: date, data: reference.ReferenceData):
+    """
+    Aktualizuje liczniki bieżącej doby po zapisaniu statusu postoju (jeśli zostały już zbudowane).
+    `data` - dane referencyjne wczytane przez wywołującego (bez wczytywania w pętli zdarzeń).
+    """
+    if (_live is None or _live.day != today) and not _building:
+        return
+    status = next((st for st in stop.statuses if st.date == today), None)
+    if status is None:
+        return
+    contribution = (status.arrival_delay, status.departure_delay, status.is_cancelled, status.bus)
+    with _live_lock:
+        if _building:
+            _pending.append((today, stop.id, contribution))
+        if _live is not None and _live.day == today:
+            _live.update(data, stop.id, contribution)
+
+def stored_tallies(engine, dimension: str, since: date, until: date, key: Optional[str] = None,
+                   by_day: bool = False) -> Dict[tuple, Tally]:
+    """
+    Sumy liczników zamkniętych dób z punctuality_rollup dla kluczy grupy (lub dób, gdy by_day).
+    """
+    table = models.PunctualityRollup.__table__
+    group = table.c.date if by_day else table.c.key
+    query = (
+        select(group, *(func.sum(table.c[column]) for column in TALLY_COLUMNS + BUCKET_COLUMNS))
+        .where(table.c.dimension == dimension, table.c.date.between(since, until))
+        .group_by(group)
+    )
+    if key is not None:
+        query = query.where(table.c.key == key)
+    tallies = {}
+    with engine.connect() as connection:
+        for row in connection.execute(query):
+            tally = Tally()
+            for column, value in zip(TALLY_COLUMNS, row[1:]):
+                setattr(tally, column, value or 0)
+            tally.buckets = [value or 0 for value in row[1 + len(TALLY_COLUMNS):]]
+            tallies[row[0]] = tally
+    return tallies
+
+def tallies(dimension: str, since: date, until: date, key: Optional[str] = None, by_day: bool = False,
+            engine=None) -> Dict[object, Tally]:
+    """
+    Liczniki w zakresie dób: zamknięte doby z tabeli, a bieżąca doba (jeśli jest w zakresie) z pamięci.
+    """
+    engine = engine if engine is not None else database.engine
+    today = rollover.today()
+    result = stored_tallies(engine, dimension, since, min(until, today - timedelta(days=1)), key, by_day)
+    if since <= today <= until:
+        live = live_rollup(today, engine)
+        with _live_lock:
+            groups = [
+                (group_key, tally) for (group_dimension, group_key), tally in live.rollup.groups.items()
+                if group_dimension == dimension and (key is None or group_key == key)
+            ]
+            for group_key, tally in groups:
+                merged = result.setdefault(today if by_day else group_key, Tally())
+                merged.merge(tally)
+    return result
+
+def group_name(data: reference.ReferenceData, dimension: str, key: str) -> Optional[str]:
+    if dimension == "station":
+        return data.stations.get(int(key))
+    if dimension == "route":
+        route = data.routes.get(key)
+        return route.train_number if route else None
+    if dimension == "hour":
+        return f"{int(key):02d}:00"
+    if dimension == "weekday":
+        return WEEKDAYS[int(key)]
+    return key
+
+@rollover.on_rollover
+async def close_previous_day(new_date: date):
+    await run_in_threadpool(close_day, database.engine, new_date - timedelta(days=1))
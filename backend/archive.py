@@ -0,0 +1,97 @@
+import os
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, union_all
+
+from . import database, models, rollover, logs
+
+# Podział statusów postojów na bieżące doby (stop_status) i archiwum (stop_status_archive).
+# Przy każdej zmianie doby statusy starszych dób przenoszone są do archiwum - po jednej dobie na transakcję,
+# więc pierwsze przeniesienie dużej tabeli nie blokuje jej na długo. Zapytania o bieżącą dobę czytają
+# małą tabelę niezależnie od tego, ile lat historii jest przechowywane.
+#
+# STOP_STATUS_KEEP_DAYS - ile minionych dób zostaje w stop_status (domyślnie 1, czyli poprzednia doba).
+# STOP_STATUS_RETENTION_DAYS - po ilu dniach statusy są usuwane z archiwum (domyślnie 0 - nigdy).
+
+log = logs.get_logger("archive")
+
+KEEP_DAYS = int(os.getenv("STOP_STATUS_KEEP_DAYS", "1"))
+RETENTION_DAYS = int(os.getenv("STOP_STATUS_RETENTION_DAYS", "0"))
+
+COLUMNS = ("id", "stop_id", "date", "arrival_delay", "departure_delay", "track_id", "is_cancelled", "bus")
+# Kolumny archiwum odpowiadające COLUMNS (archiwum ma własny klucz, id statusu trafia do status_id)
+ARCHIVE_COLUMNS = ("status_id",) + COLUMNS[1:]
+
+def ensure_indexes(engine):
+    """
+    Tworzy brakujące indeksy statusów - create_all pomija tabele, które już istnieją.
+    """
+    for table in (models.StopStatus.__table__, models.StopStatusArchive.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def archive_stop_statuses(engine, before: date) -> int:
+    """
+    Przenosi do archiwum statusy dób wcześniejszych niż before. Zwraca liczbę przeniesionych statusów.
+    """
+    current, archive = models.StopStatus.__table__, models.StopStatusArchive.__table__
+    with engine.connect() as connection:
+        days = connection.execute(
+            select(current.c.date).where(current.c.date < before).distinct().order_by(current.c.date)
+        ).scalars().all()
+
+    moved = 0
+    for day in days:
+        with engine.begin() as connection:
+            rows = select(*(current.c[name] for name in COLUMNS)).where(current.c.date == day)
+            connection.execute(archive.insert().from_select(ARCHIVE_COLUMNS, rows))
+            moved += connection.execute(current.delete().where(current.c.date == day)).rowcount
+    return moved
+
+def purge_archive(engine, before: date) -> int:
+    """
+    Usuwa z archiwum statusy dób wcześniejszych niż before.
+    """
+    archive = models.StopStatusArchive.__table__
+    with engine.begin() as connection:
+        return connection.execute(archive.delete().where(archive.c.date < before)).rowcount
+
+def history(since: Optional[date] = None, until: Optional[date] = None):
+    """
+    Statusy z obu tabel jako jedno podzapytanie (kolumny jak w stop_status) - do raportów i statystyk.
+    Warunki na daty trafiają do obu części, więc każda korzysta z indeksu swojej tabeli.
+    """
+    parts = []
+    current, archive = models.StopStatus.__table__, models.StopStatusArchive.__table__
+    for table, columns in ((current, COLUMNS), (archive, ARCHIVE_COLUMNS)):
+        query = select(*(table.c[column].label(name) for column, name in zip(columns, COLUMNS)))
+        if since is not None:
+            query = query.where(table.c.date >= since)
+        if until is not None:
+            query = query.where(table.c.date <= until)
+        parts.append(query)
+    return union_all(*parts).subquery("stop_status_history")
+
+def status_model(service_date: date):
+    """
+    Tabela statusów danej doby - doby starsze niż STOP_STATUS_KEEP_DAYS są już w archiwum.
+    """
+    if service_date < rollover.today() - timedelta(days=KEEP_DAYS):
+        return models.StopStatusArchive
+    return models.StopStatus
+
+def run(service_date: date, engine=None):
+    """
+    Archiwizacja i (jeśli ustawiono STOP_STATUS_RETENTION_DAYS) usuwanie najstarszych statusów.
+    """
+    engine = engine if engine is not None else database.engine
+    moved = archive_stop_statuses(engine, service_date - timedelta(days=KEEP_DAYS))
+    purged = purge_archive(engine, service_date - timedelta(days=RETENTION_DAYS)) if RETENTION_DAYS > 0 else 0
+    if moved or purged:
+        log.info("Archiwizacja statusów postojów", extra={"service_date": service_date, "moved": moved, "purged": purged})
+
+@rollover.on_rollover
+async def archive_previous_days(new_date: date):
+    await run_in_threadpool(run, new_date)
@@ -0,0 +1,144 @@
+import csv
+import os
+import random
+from datetime import date, time, timedelta
+from typing import Dict, List, Optional
+
+# Deterministyczny generator rozkładu w skali sieci krajowej (format jak data/sample).
+# Te same parametry i to samo ziarno dają zawsze te same dane, więc wyniki pomiarów
+# przed i po zmianie dotyczą identycznego rozkładu.
+
+# Kolejność tabel zgodna z kluczami obcymi (do wczytywania i zapisu CSV)
+TABLES = ("station", "carrier", "route_type", "calendar", "platform", "track", "route", "trip", "stop", "stop_status")
+
+NAME_PARTS = (
+    ("Stara", "Nowa", "Górna", "Dolna", "Wielka", "Mała", "Zielona", "Biała", "Czarna", "Łęczna"),
+    ("Wieś", "Góra", "Łąka", "Wola", "Dąbrowa", "Żabnica", "Ślęza", "Rzeka", "Polana", "Kępa"),
+)
+CARRIERS = (("Koleje Śląskie", "KŚ"), ("Polregio", "PR"), ("PKP Intercity", "IC"), ("Koleje Mazowieckie", "KM"))
+ROUTE_TYPES = (("Osobowy", "Os"), ("Osobowy Przyspieszony", "OsP"), ("Intercity", "IC"), ("Express Intercity", "EIC"))
+# Kalendarze: codziennie, w dni robocze, w weekendy
+CALENDAR_DAYS = ((True,) * 7, (True,) * 5 + (False,) * 2, (False,) * 5 + (True,) * 2)
+ROMAN = ("I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X")
+
+def station_name(index: int) -> str:
+    first, second = NAME_PARTS
+    name = f"{first[index % len(first)]} {second[index // len(first) % len(second)]}"
+    cycle = index // (len(first) * len(second))
+    return f"{name} {cycle + 1}" if cycle else name
+
+def generate(stations: int = 500, trips: int = 2000, stops_per_trip: int = 12,
+             platforms_per_station: int = 2, tracks_per_platform: int = 2,
+             delay_density: float = 0.1, service_date: Optional[date] = None, seed: int = 1) -> Dict[str, List[dict]]:
+    """
+    Zwraca wiersze tabel (nazwa tabeli -> lista słowników z kolumnami modeli).
+    Kursy jeżdżą liniami o stałej trasie, a stacje o niskich numerach są węzłami obsługiwanymi przez
+    większość linii. delay_density to udział postojów z wpisem w stop_status na dzień service_date.
+    """
+    rng = random.Random(seed)
+    service_date = service_date or date.today()
+    stops_per_trip = max(2, min(stops_per_trip, stations))
+    tables: Dict[str, List[dict]] = {name: [] for name in TABLES}
+
+    tables["station"] = [{"id": i, "name": station_name(i - 1)} for i in range(1, stations + 1)]
+    tables["carrier"] = [{"id": i, "name": name, "code": code} for i, (name, code) in enumerate(CARRIERS, 1)]
+    tables["route_type"] = [{"id": i, "name": name, "code": code} for i, (name, code) in enumerate(ROUTE_TYPES, 1)]
+    weekdays = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+    tables["calendar"] = [
+        dict(zip(weekdays, days), service_id=i,
+             start_date=service_date - timedelta(days=180), end_date=service_date + timedelta(days=180))
+        for i, days in enumerate(CALENDAR_DAYS, 1)
+    ]
+
+    station_tracks: Dict[int, List[int]] = {}
+    for station_id in range(1, stations + 1):
+        for p in range(platforms_per_station):
+            platform_id = len(tables["platform"]) + 1
+            tables["platform"].append({"id": platform_id, "station_id": station_id, "number": ROMAN[p % len(ROMAN)]})
+            for _ in range(tracks_per_platform):
+                track_id = len(tables["track"]) + 1
+                tables["track"].append({"id": track_id, "platform_id": platform_id, "number": str(track_id)})
+                station_tracks.setdefault(station_id, []).append(track_id)
+
+    # Linie: stałe sekwencje stacji, węzły (niskie numery) wybierane częściej
+    weights = [1 / (i ** 0.8) for i in range(1, stations + 1)]
+    lines = []
+    for _ in range(max(1, trips // 10)):
+        line = []
+        while len(line) < stops_per_trip:
+            station_id = rng.choices(range(1, stations + 1), weights)[0]
+            if station_id not in line:
+                line.append(station_id)
+        lines.append(line)
+
+    stop_id = 0
+    for t in range(trips):
+        line = lines[t % len(lines)]
+        if t // len(lines) % 2:
+            line = line[::-1]
+        trip_id = f"T{t}"
+        number = 10000 + t
+        tables["route"].append({
+            "id": trip_id,
+            "train_number": f"{number} {station_name(t % stations)}" if t % 3 == 0 else str(number),
+            "carrier_id": rng.randint(1, len(CARRIERS)),
+            "type_id": rng.randint(1, len(ROUTE_TYPES)),
+            "final_station_id": line[-1],
+        })
+        tables["trip"].append({"trip_id": trip_id, "route_id": trip_id, "service_id": 1 if t % 5 else rng.randint(2, 3)})
+
+        minute = rng.randint(4 * 60, 22 * 60)
+        for sequence, station_id in enumerate(line):
+            stop_id += 1
+            last = sequence == len(line) - 1
+            arrival = None if sequence == 0 else minute
+            if sequence:
+                minute += rng.randint(0, 3)
+            departure = None if last else minute
+            tables["stop"].append({
+                "id": stop_id,
+                "trip_id": trip_id,
+                "original_track_id": rng.choice(station_tracks[station_id]),
+                "arrival": None if arrival is None else time(arrival // 60 % 24, arrival % 60),
+                "departure": None if departure is None else time(departure // 60 % 24, departure % 60),
+                "sequence": sequence,
+            })
+            minute += rng.randint(3, 15)
+
+            if rng.random() < delay_density:
+                delay = int(rng.expovariate(1 / 6))
+                tables["stop_status"].append({
+                    "id": len(tables["stop_status"]) + 1,
+                    "stop_id": stop_id,
+                    "date": service_date,
+                    "arrival_delay": delay,
+                    "departure_delay": delay,
+                    "track_id": rng.choice(station_tracks[station_id]) if rng.random() < 0.05 else None,
+                    "is_cancelled": rng.random() < 0.01,
+                    "bus": False,
+                })
+
+    return tables
+
+def csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, time):
+        return value.strftime("%H:%M:%S")
+    return str(value)
+
+def write_csv(tables: Dict[str, List[dict]], directory: str):
+    """
+    Zapisuje tabele jako pliki CSV (nazwa pliku = nazwa tabeli) do wczytania np. w pgAdmin.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in TABLES:
+        rows = tables[name]
+        if not rows:
+            continue
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(rows[0].keys())
+            writer.writerows([csv_value(v) for v in row.values()] for row in rows)
@@ -0,0 +1,322 @@
+"""
+Test obciążenia wyświetlaczy i komunikatów głosowych na syntetycznym rozkładzie (benchmarks.generator).
+
+Uruchamia serwer (benchmarks.server) jako osobny proces, otwiera wiele połączeń WebSocket
+do /displays/*-data/* oraz /voice-data/* i /voice-timetable-edit/* najbardziej obciążonych stacji,
+a następnie odtwarza strumień edycji przez PUT /timetable/edit/{id}. Mierzy:
+- czas od wysłania edycji do ostatniej aktualizacji ekranów stacji (fan-out),
+- liczbę wiadomości na sekundę i obciążenie procesora serwera,
+- zapytania SQL na edycję (wszystkie zapytania serwera od edycji do aktualizacji ostatniego ekranu,
+  razem z odświeżeniami w tle),
+- przyrost pamięci serwera na połączenie.
+
+Uruchomienie z katalogu głównego repozytorium:
+    python -m backend.benchmarks.load --screens 2000 --edits 50 --output obciazenie.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import List, Optional
+
+from .measure import percentile
+from .run import add_dataset_arguments, configure_database, seed_database
+
+# Widoki wyświetlaczy: (ścieżka, rodzaj identyfikatora w ścieżce)
+DISPLAY_VIEWS = (
+    ("/displays/station-display-departures-data/{}", "station"),
+    ("/displays/station-display-arrivals-data/{}", "station"),
+    ("/displays/platform-display-data/{}", "platform"),
+    ("/displays/entrance-platform-display-data/{}", "platform"),
+    ("/displays/edge-display-data/{}", "track"),
+)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążenia wyświetlaczy i komunikatów głosowych SDIP.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--screens", type=int, default=1000, help="liczba połączeń wyświetlaczy")
+    parser.add_argument("--voice", type=int, default=10, help="liczba połączeń /voice-data")
+    parser.add_argument("--voice-edit", type=int, default=10, help="liczba połączeń /voice-timetable-edit")
+    parser.add_argument("--test-stations", type=int, default=10, help="liczba stacji z wyświetlaczami")
+    parser.add_argument("--edits", type=int, default=50)
+    parser.add_argument("--edit-interval", type=float, default=0.5, help="odstęp między edycjami (s)")
+    parser.add_argument("--fanout-timeout", type=float, default=30.0, help="najdłuższe oczekiwanie na ekrany (s)")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="równoczesne otwierane połączenia")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server-log", help="plik na wyjście serwera (domyślnie pomijane)")
+    parser.add_argument("--output", help="plik wynikowy JSON (domyślnie standardowe wyjście)")
+    return parser.parse_args(argv)
+
+class Screen:
+    """
+    Połączenie testowe: ścieżka, stacja i czasy otrzymania kolejnych wiadomości.
+    """
+    __slots__ = ("path", "station_id", "initial", "fanout", "times", "rejected")
+
+    def __init__(self, path: str, station_id: int, initial: bool = True, fanout: bool = True):
+        self.path = path
+        self.station_id = station_id
+        self.initial = initial  # czy serwer wysyła dane od razu po połączeniu
+        self.fanout = fanout  # czy edycja rozkładu stacji wymusza wiadomość
+        self.times: List[float] = []
+        self.rejected = 0
+
+    def first_after(self, moment: float) -> Optional[float]:
+        i = bisect_right(self.times, moment)
+        return self.times[i] if i < len(self.times) else None
+
+async def keep_screen(base_url: str, screen: Screen, connect_slots: asyncio.Semaphore):
+    """
+    Utrzymuje połączenie jak wyświetlacz: po odrzuceniu (kod 1013) czeka sugerowany czas i łączy się ponownie.
+    """
+    import websockets
+
+    while True:
+        try:
+            async with connect_slots:
+                ws = await websockets.connect(base_url + screen.path, max_size=None, open_timeout=None)
+            try:
+                async for _ in ws:
+                    screen.times.append(time.perf_counter())
+            finally:
+                await ws.close()
+        except websockets.ConnectionClosed as e:
+            if e.rcvd is None or e.rcvd.code != 1013:
+                raise
+            screen.rejected += 1
+            await asyncio.sleep(float(e.rcvd.reason.partition("=")[2] or 1))
+
+def plan_screens(args, data, station_ids: List[int]) -> List[Screen]:
+    """
+    Rozkłada połączenia po stacjach testowych i widokach (perony i tory danej stacji na zmianę).
+    """
+    station_tracks = defaultdict(list)
+    for track in data.tracks.values():
+        station_tracks[track.station_id].append(track)
+
+    screens = []
+    for i in range(args.screens):
+        station_id = station_ids[i % len(station_ids)]
+        path, kind = DISPLAY_VIEWS[i // len(station_ids) % len(DISPLAY_VIEWS)]
+        tracks = station_tracks[station_id]
+        track = tracks[i // (len(station_ids) * len(DISPLAY_VIEWS)) % len(tracks)] if tracks else None
+        if kind == "station":
+            target = station_id
+        elif track is None:
+            continue
+        else:
+            target = track.platform_id if kind == "platform" else track.id
+        screens.append(Screen(path.format(target), station_id))
+    for i in range(args.voice):
+        station_id = station_ids[i % len(station_ids)]
+        screens.append(Screen(f"/voice-data/{station_id}", station_id, fanout=False))
+    for i in range(args.voice_edit):
+        station_id = station_ids[i % len(station_ids)]
+        screens.append(Screen(f"/voice-timetable-edit/{station_id}", station_id, initial=False))
+    return screens
+
+def plan_edits(args, data, station_ids: List[int], today) -> List[dict]:
+    """
+    Strumień edycji: opóźnienia narastające na kolejnych postojach kursów stacji testowych
+    oraz co dziesiąta edycja ze zmianą toru na inny tor tej samej stacji.
+    """
+    rng = random.Random(args.seed)
+    store = data.store
+    running = store.running(today)
+    station_tracks = defaultdict(list)
+    for track in data.tracks.values():
+        station_tracks[track.station_id].append(track.id)
+    stops = {
+        station_id: [store.stop_id[p] for p in store.station_stops(station_id) if running[store.trip[p]]]
+        for station_id in station_ids
+    }
+    delays = Counter()
+    edits = []
+    for i in range(args.edits):
+        station_id = station_ids[i % len(station_ids)]
+        if not stops[station_id]:
+            continue
+        stop_id = rng.choice(stops[station_id])
+        delays[stop_id] += rng.randint(1, 5)
+        body = {"arrival_delay": delays[stop_id], "departure_delay": delays[stop_id]}
+        if i % 10 == 9:
+            body["track_id"] = rng.choice(station_tracks[station_id])
+        edits.append({"station_id": station_id, "stop_id": stop_id, "body": body})
+    return edits
+
+async def wait_until(condition, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+async def run_load(args, screens: List[Screen], edits: List[dict], base_url: str, result: dict):
+    import httpx
+
+    ws_url = base_url.replace("http", "ws", 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as http:
+        async def stats():
+            return (await http.get("/benchmark/stats")).json()
+
+        idle = await stats()
+        connect_slots = asyncio.Semaphore(args.connect_concurrency)
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(keep_screen(ws_url, screen, connect_slots)) for screen in screens]
+        initial = [s for s in screens if s.initial]
+        connected = await wait_until(lambda: all(s.times for s in initial) or any(t.done() for t in tasks), 600)
+        failed = [t for t in tasks if t.done()]
+        if failed:
+            failed[0].result()
+        await asyncio.sleep(1)  # połączenia bez danych początkowych (voice-timetable-edit)
+        ready = await stats()
+        result["connections"] = {
+            "count": len(screens),
+            "all_received_initial_data": connected,
+            "seconds_to_first_data": round(time.perf_counter() - started, 3),
+            "rejected_by_admission_control": sum(s.rejected for s in screens),
+            "server_memory_idle_bytes": idle["memory_bytes"],
+            "server_memory_per_connection_bytes": round((ready["memory_bytes"] - idle["memory_bytes"]) / len(screens)),
+        }
+
+        by_station = defaultdict(list)
+        for screen in screens:
+            if screen.fanout:
+                by_station[screen.station_id].append(screen)
+
+        fanout, per_screen, edit_latency, queries, timeouts = [], [], [], [], 0
+        messages_before = sum(len(s.times) for s in screens)
+        before, phase_started = await stats(), time.perf_counter()
+        for edit in edits:
+            group = by_station[edit["station_id"]]
+            query_count = (await stats())["queries"]
+            sent = time.perf_counter()
+            response = await http.put(f"/timetable/edit/{edit['stop_id']}", json=edit["body"])
+            response.raise_for_status()
+            edit_latency.append(time.perf_counter() - sent)
+            if not await wait_until(lambda: all(s.first_after(sent) for s in group), args.fanout_timeout):
+                timeouts += 1
+            received = [t - sent for t in (s.first_after(sent) for s in group) if t is not None]
+            if received:
+                fanout.append(max(received))
+                per_screen.extend(received)
+            # Zapytanie o statystyki samo nie wykonuje zapytań SQL
+            queries.append((await stats())["queries"] - query_count)
+            await asyncio.sleep(args.edit_interval)
+        phase_seconds = time.perf_counter() - phase_started
+        after = await stats()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def ms(values, p):
+        return round(percentile(sorted(values), p) * 1000, 3)
+
+    result["edits"] = {
+        "count": len(edits),
+        "fanout_timeouts": timeouts,
+        "edit_request_p50_ms": ms(edit_latency, 50),
+        "edit_request_p99_ms": ms(edit_latency, 99),
+        "fanout_last_screen_p50_ms": ms(fanout, 50),
+        "fanout_last_screen_p99_ms": ms(fanout, 99),
+        "fanout_last_screen_max_ms": ms(fanout, 100),
+        "fanout_per_screen_p50_ms": ms(per_screen, 50),
+        "fanout_per_screen_p99_ms": ms(per_screen, 99),
+        "queries_per_edit_mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        "queries_per_edit_max": max(queries, default=0),
+    }
+    result["throughput"] = {
+        "seconds": round(phase_seconds, 3),
+        "messages": sum(len(s.times) for s in screens) - messages_before,
+        "messages_per_second": round((sum(len(s.times) for s in screens) - messages_before) / phase_seconds, 1),
+        "server_cpu_percent": round((after["cpu_seconds"] - before["cpu_seconds"]) / phase_seconds * 100, 1),
+        "server_queries": after["queries"] - before["queries"],
+    }
+
+def port_in_use(port: int) -> bool:
+    with socket.socket() as s:
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+def start_server(args) -> subprocess.Popen:
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.server", "--port", str(args.port)],
+        cwd=REPO_ROOT, env=os.environ.copy(), stdout=log, stderr=subprocess.STDOUT,
+    )
+
+def wait_for_server(base_url: str, server: subprocess.Popen, timeout: float = 120):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit("Serwer zakończył działanie przy starcie (szczegóły: --server-log).")
+        try:
+            if httpx.get(base_url + "/benchmark/stats").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    sys.exit("Serwer nie odpowiada.")
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_database(args)
+
+    from .. import reference, rollover
+
+    result = {"started_at": datetime.now().isoformat(timespec="seconds")}
+    seed_database(args, result)
+
+    # Stacje testowe: najbardziej obciążone stacje rozkładu
+    data = reference.get()
+    station_ids = [s for s, _ in Counter(data.store.station).most_common(args.test_stations + 1) if s != -1]
+    station_ids = station_ids[:args.test_stations]
+    screens = plan_screens(args, data, station_ids)
+    edits = plan_edits(args, data, station_ids, rollover.today())
+    result["test_stations"] = station_ids
+
+    # Tysiące połączeń wymagają podniesienia limitu otwartych plików (dziedziczy go też serwer)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if port_in_use(args.port):
+        sys.exit(f"Port {args.port} jest zajęty - zakończ poprzedni serwer lub wybierz inny (--port).")
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(args)
+    try:
+        wait_for_server(base_url, server)
+        asyncio.run(run_load(args, screens, edits, base_url, result))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    edits, throughput = result["edits"], result["throughput"]
+    print(f"{result['connections']['count']} połączeń: fan-out p50 {edits['fanout_last_screen_p50_ms']} ms, "
+          f"p99 {edits['fanout_last_screen_p99_ms']} ms, {throughput['messages_per_second']} wiadomości/s, "
+          f"CPU serwera {throughput['server_cpu_percent']}%, {edits['queries_per_edit_mean']} zapytań na edycję",
+          file=sys.stderr)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import math
+from typing import Dict, List, Sequence
+
+from sqlalchemy import event
+
+# Pomiary dla testów wydajności: liczba zapytań SQL i percentyle czasów.
+
+class QueryCounter:
+    """
+    Liczy zapytania SQL wykonane przez silnik (zdarzenie before_cursor_execute).
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        self.engine = engine
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """
+    Percentyl metodą najbliższej rangi z posortowanych wartości.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], queries: List[int]) -> Dict[str, float]:
+    """
+    Podsumowanie serii pomiarów: czasy w milisekundach oraz liczba zapytań SQL na wywołanie.
+    """
+    ms = sorted(t * 1000 for t in latencies)
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+        "queries_mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        "queries_max": max(queries, default=0),
+    }
@@ -0,0 +1,199 @@
+"""
+Testy wydajności endpointów rozkładu i wyświetlaczy na syntetycznym rozkładzie (benchmarks.generator).
+
+Uruchomienie z katalogu głównego repozytorium:
+    python -m backend.benchmarks.run --stations 3000 --trips 12000 --output wyniki.json
+
+Bez --database-url dane wczytywane są do pliku SQLite w katalogu tymczasowym. Z --database-url
+(np. lokalny PostgreSQL) baza powinna być przeznaczona tylko do testów - wczytanie danych usuwa
+istniejące tabele i wymaga opcji --reset. Wyniki (percentyle czasów i liczba zapytań SQL
+na wywołanie) zapisywane są jako JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+STAND_IN_DATABASE = os.path.join(tempfile.gettempdir(), "sdip_benchmark.sqlite")
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """
+    Parametry syntetycznego rozkładu i bazy danych (wspólne dla testów wydajności i testów obciążenia).
+    """
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--trips", type=int, default=2000)
+    parser.add_argument("--stops-per-trip", type=int, default=12)
+    parser.add_argument("--platforms", type=int, default=2, help="liczba peronów na stacji")
+    parser.add_argument("--tracks", type=int, default=2, help="liczba torów przy peronie")
+    parser.add_argument("--delay-density", type=float, default=0.1, help="udział postojów ze statusem na dziś")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", help=f"domyślnie SQLite: {STAND_IN_DATABASE}")
+    parser.add_argument("--reset", action="store_true", help="pozwala usunąć tabele w bazie z --database-url")
+    parser.add_argument("--skip-load", action="store_true", help="użyj danych wczytanych wcześniej")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Testy wydajności SDIP na syntetycznym rozkładzie.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--requests", type=int, default=50, help="liczba pomiarów na endpoint")
+    parser.add_argument("--warmup", type=int, default=3, help="wywołania przed pomiarami (niewliczane)")
+    parser.add_argument("--output", help="plik wynikowy JSON (domyślnie standardowe wyjście)")
+    return parser.parse_args(argv)
+
+def configure_database(args):
+    """
+    Ustawia bazę dla aplikacji - przed jej importem, bo database.py tworzy silnik przy imporcie.
+    """
+    if args.database_url and not (args.reset or args.skip_load):
+        sys.exit("Wczytanie danych usuwa tabele w bazie z --database-url - dodaj --reset lub --skip-load.")
+    os.environ["SQLALCHEMY_DATABASE_URL"] = args.database_url or f"sqlite:///{STAND_IN_DATABASE}"
+    os.environ.setdefault("ELEVENLABS_API_KEY", "benchmark")
+    # Uzupełnianie statystyk minionych dób przy starcie wykonuje zapytania w tle i zawyżałoby ich liczbę w pomiarach
+    os.environ.setdefault("PUNCTUALITY_BACKFILL", "0")
+
+def dataset_parameters(args) -> dict:
+    return {
+        "stations": args.stations, "trips": args.trips, "stops_per_trip": args.stops_per_trip,
+        "platforms_per_station": args.platforms, "tracks_per_platform": args.tracks,
+        "delay_density": args.delay_density, "seed": args.seed,
+    }
+
+def seed_database(args, result: dict):
+    """
+    Generuje i wczytuje rozkład (chyba że --skip-load), zapisując czas i liczbę wierszy w result.
+    """
+    from .. import database, models, rollover
+    from .generator import generate
+
+    result["database"] = database.engine.dialect.name
+    result["parameters"] = dataset_parameters(args)
+    if args.skip_load:
+        return
+    started = time.perf_counter()
+    tables = generate(service_date=rollover.today(), **result["parameters"])
+    load_tables(database.engine, models.Base.metadata, tables)
+    result["load_seconds"] = round(time.perf_counter() - started, 2)
+    result["rows"] = {name: len(rows) for name, rows in tables.items()}
+
+def load_tables(engine, metadata, tables):
+    """
+    Tworzy schemat od nowa i wczytuje wygenerowane tabele paczkami.
+    """
+    metadata.drop_all(bind=engine)
+    metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for name, rows in tables.items():
+            table = metadata.tables[name]
+            for start in range(0, len(rows), 5000):
+                connection.execute(table.insert(), rows[start:start + 5000])
+
+def measure(counter, call, targets, requests, warmup):
+    """
+    Wywołuje call(target) dla kolejnych celów i zwraca (czasy w sekundach, liczby zapytań, liczbę błędów).
+    """
+    latencies, queries, errors = [], [], 0
+    for i in range(warmup + requests):
+        target = targets[i % len(targets)]
+        before = counter.count
+        started = time.perf_counter()
+        ok = call(target)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        queries.append(counter.count - before)
+        errors += 0 if ok else 1
+    return latencies, queries, errors
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_database(args)
+
+    from fastapi.testclient import TestClient
+    from .. import database, reference
+    from ..main import app
+    from ..routers import displays
+    from .measure import QueryCounter, summarize
+
+    result = {"started_at": datetime.now().isoformat(timespec="seconds"), "requests": args.requests}
+    seed_database(args, result)
+
+    counter = QueryCounter(database.engine)
+    try:
+        with TestClient(app) as client:
+            # Wczytanie danych referencyjnych (przy starcie serwera i po POST /admin/reload-reference)
+            reference.invalidate()
+            before, started = counter.count, time.perf_counter()
+            data = reference.get()
+            result["reference"] = {
+                "load_ms": round((time.perf_counter() - started) * 1000, 3),
+                "queries": counter.count - before,
+                "stops": len(data.store),
+                "store_bytes": data.store.nbytes(),
+            }
+
+            # Cele pomiarów: połowa to najbardziej obciążone stacje (węzły), połowa losowe stacje i postoje
+            rng = random.Random(args.seed)
+            busiest = [station_id for station_id, _ in Counter(data.store.station).most_common(10) if station_id != -1]
+            station_ids = busiest + rng.sample(sorted(data.stations), min(10, len(data.stations)))
+            stop_ids = rng.sample(list(data.store.stop_id), min(20, len(data.store)))
+            tracks = [data.tracks[t] for t in sorted(data.tracks) if data.tracks[t].station_id in busiest[:5]]
+            rng.shuffle(tracks)
+            tracks = tracks[:10] or list(data.tracks.values())[:10]
+
+            def get(path):
+                return lambda target: client.get(path.format(target)).status_code == 200
+
+            def refresh(build):
+                def call(target):
+                    displays.build_display_payload(lambda db, now: build(db, target, now), datetime.now())
+                    return True
+                return call
+
+            # Odświeżenie wyświetlacza = zbudowanie danych widoku (bez pamięci podręcznej danych z bieżącej minuty)
+            benchmarks = {
+                "get_departures": (get("/timetable/departures/{}"), station_ids),
+                "get_timetable": (get("/timetable/arrivals/{}"), station_ids),
+                "get_tracks": (get("/timetable/tracks/{}"), stop_ids),
+                "get_train_details": (get("/timetable/train/{}"), stop_ids),
+                "infokiosk_departures": (get("/displays/infokiosk-departures-data/{}"), station_ids),
+                "infokiosk_arrivals": (get("/displays/infokiosk-arrivals-data/{}"), station_ids),
+                "display_station_departures": (refresh(displays.station_display_departures_data), station_ids),
+                "display_station_arrivals": (refresh(displays.station_display_arrivals_data), station_ids),
+                "display_platform": (
+                    refresh(lambda db, track, now: displays.platform_display_data(db, track.station_id, track.platform_id, now)),
+                    tracks,
+                ),
+                "display_entrance_platform": (
+                    refresh(lambda db, track, now: displays.entrance_platform_display_data(db, track.station_id, track.platform_id, now)),
+                    tracks,
+                ),
+                "display_edge": (
+                    refresh(lambda db, track, now: displays.edge_display_data(db, track.station_id, track.id, now)),
+                    tracks,
+                ),
+            }
+
+            result["endpoints"] = {}
+            for name, (call, targets) in benchmarks.items():
+                latencies, queries, errors = measure(counter, call, targets, args.requests, args.warmup)
+                result["endpoints"][name] = dict(summarize(latencies, queries), errors=errors)
+                print(f"{name}: p50 {result['endpoints'][name]['p50_ms']} ms, "
+                      f"p99 {result['endpoints'][name]['p99_ms']} ms, "
+                      f"{result['endpoints'][name]['queries_mean']} zapytań", file=sys.stderr)
+    finally:
+        counter.close()
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
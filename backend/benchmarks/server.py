@@ -0,0 +1,44 @@
+"""
+Serwer aplikacji do testów obciążenia (benchmarks.load) - aplikacja z dodatkowym endpointem
+GET /benchmark/stats (liczba zapytań SQL, czas procesora i pamięć procesu serwera).
+
+Uruchamiany przez benchmarks.load jako osobny proces:
+    python -m backend.benchmarks.server --port 8765
+"""
+import argparse
+import os
+import resource
+import time
+
+def memory_bytes() -> int:
+    """
+    Bieżąca pamięć procesu (RSS); poza Linuksem - największa dotychczasowa.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serwer SDIP do testów obciążenia.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    from .. import database
+    from ..main import app
+    from .measure import QueryCounter
+
+    counter = QueryCounter(database.engine)
+
+    @app.get("/benchmark/stats", include_in_schema=False)
+    def benchmark_stats():
+        return {"queries": counter.count, "cpu_seconds": time.process_time(), "memory_bytes": memory_bytes()}
+
+    # Otwarte WebSockety nie kończą się same - zamknięcie serwera nie czeka na nie dłużej niż kilka sekund
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", timeout_graceful_shutdown=5)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import time
+from datetime import date
+from itertools import groupby
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from . import archive, database, models, reference
+from .utils import gtfs_realtime
+from .utils.stop_store import NO_TIME
+from .utils.streaming import csv_chunks, zip_chunks
+
+# Eksport rozkładu dla systemów zewnętrznych: rozkład planowy jako GTFS, zmiany bieżącej doby jako
+# GTFS-Realtime TripUpdates i tablica wszystkich stacji jako CSV. Wszystkie eksporty są generatorami -
+# wiersze czytane są z kursora po stronie serwera i kodowane paczkami, więc zużycie pamięci nie zależy
+# od wielkości sieci.
+#
+# Identyfikatory przystanków GTFS: stacja "S{station_id}" (location_type 1), tor "T{track_id}" -
+# postoje kursów (stop_times) wskazują tor planowy, a zmiana toru trafia do assigned_stop_id.
+
+# Wiersze pobierane z kursora w jednej paczce
+YIELD_PER = 1000
+# Strefa czasowa przewoźników bez własnej (wymagane pole agency_timezone)
+DEFAULT_TIMEZONE = "Europe/Warsaw"
+
+def streamed(statement, engine=None):
+    """
+    Wiersze zapytania z kursora po stronie serwera (stream_results) - bez wczytywania całego wyniku.
+    """
+    engine = engine if engine is not None else database.engine
+    with engine.connect() as connection:
+        yield from connection.execution_options(stream_results=True, yield_per=YIELD_PER).execute(statement)
+
+def gtfs_time(minutes: int) -> str:
+    # Godziny kursu po północy zapisywane są jako 24:00 i dalej
+    h, m = divmod(minutes, 60)
+    return f"{h:02d}:{m:02d}:00"
+
+def gtfs_date(day: date) -> str:
+    return day.strftime("%Y%m%d")
+
+def station_stop_id(station_id: int) -> str:
+    return f"S{station_id}"
+
+def track_stop_id(track_id: int) -> str:
+    return f"T{track_id}"
+
+def agency_rows(engine=None):
+    carrier = models.Carrier
+    for row in streamed(select(carrier.id, carrier.name, carrier.url, carrier.timezone).order_by(carrier.id), engine):
+        yield row.id, row.name, row.url or "", row.timezone or DEFAULT_TIMEZONE
+
+def stop_rows(engine=None):
+    for row in streamed(select(models.Station.id, models.Station.name).order_by(models.Station.id), engine):
+        yield station_stop_id(row.id), row.name, 1, "", "", ""
+    stmt = (
+        select(models.Track.id, models.Track.number, models.Platform.number.label("platform"),
+               models.Platform.station_id, models.Station.name)
+        .join(models.Platform, models.Track.platform_id == models.Platform.id)
+        .join(models.Station, models.Platform.station_id == models.Station.id)
+        .order_by(models.Track.id)
+    )
+    for row in streamed(stmt, engine):
+        yield track_stop_id(row.id), row.name, 0, station_stop_id(row.station_id), row.number, f"peron {row.platform}"
+
+def route_rows(engine=None):
+    route, route_type = models.Route, models.RouteType
+    stmt = (
+        select(route.id, route.carrier_id, route.train_number, route_type.name)
+        .outerjoin(route_type, route.type_id == route_type.id)
+        .order_by(route.id)
+    )
+    # route_type 2 - kolej
+    for row in streamed(stmt, engine):
+        yield row.id, row.carrier_id, row.train_number, row.name or "", 2
+
+def trip_rows(engine=None):
+    trip, route = models.Trip, models.Route
+    stmt = (
+        select(trip.route_id, trip.service_id, trip.trip_id, models.Station.name, route.train_number)
+        .outerjoin(route, trip.route_id == route.id)
+        .outerjoin(models.Station, route.final_station_id == models.Station.id)
+        .order_by(trip.trip_id)
+    )
+    for row in streamed(stmt, engine):
+        yield row.route_id, row.service_id, row.trip_id, row.name or "", row.train_number
+
+def calendar_rows(engine=None):
+    c = models.Calendar
+    stmt = select(
+        c.service_id, c.monday, c.tuesday, c.wednesday, c.thursday, c.friday, c.saturday, c.sunday,
+        c.start_date, c.end_date,
+    ).order_by(c.service_id)
+    for row in streamed(stmt, engine):
+        yield (row[0], *(int(bool(day)) for day in row[1:8]), gtfs_date(row.start_date), gtfs_date(row.end_date))
+
+def stop_time_rows(engine=None):
+    stop = models.Stop
+    stmt = (
+        select(stop.trip_id, stop.arrival, stop.departure, stop.original_track_id, stop.sequence)
+        .order_by(stop.trip_id, stop.sequence)
+    )
+    trip_id, previous, offset = None, -1, 0
+    for row in streamed(stmt, engine):
+        if row.trip_id != trip_id:
+            trip_id, previous, offset = row.trip_id, -1, 0
+        times = []
+        for t in (row.arrival or row.departure, row.departure or row.arrival):
+            minutes = reference.time_minutes(t)
+            if minutes is None:
+                times.append("")
+                continue
+            # Godzina wcześniejsza niż poprzednia w kursie - kurs przekroczył północ
+            if minutes + offset < previous:
+                offset += 1440
+            previous = minutes + offset
+            times.append(gtfs_time(previous))
+        yield row.trip_id, times[0], times[1], track_stop_id(row.original_track_id), row.sequence
+
+GTFS_FILES = (
+    ("agency.txt", ("agency_id", "agency_name", "agency_url", "agency_timezone"), agency_rows),
+    ("stops.txt", ("stop_id", "stop_name", "location_type", "parent_station", "platform_code", "stop_desc"), stop_rows),
+    ("routes.txt", ("route_id", "agency_id", "route_short_name", "route_desc", "route_type"), route_rows),
+    ("trips.txt", ("route_id", "service_id", "trip_id", "trip_headsign", "trip_short_name"), trip_rows),
+    ("calendar.txt", ("service_id", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+                      "start_date", "end_date"), calendar_rows),
+    ("stop_times.txt", ("trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"), stop_time_rows),
+)
+
+def gtfs_chunks(engine=None) -> Iterator[bytes]:
+    """
+    Rozkład planowy jako archiwum GTFS (ZIP) tworzone w locie.
+    """
+    return zip_chunks((name, csv_chunks(header, rows(engine))) for name, header, rows in GTFS_FILES)
+
+def day_statuses(service_date: date, order_by, engine=None):
+    """
+    Statusy postojów doby z kursora, uporządkowane według `order_by` (kolumny stop_status, stop, platform).
+    """
+    status = archive.status_model(service_date).__table__.c
+    stmt = (
+        select(status.stop_id, status.arrival_delay, status.departure_delay, status.track_id,
+               status.is_cancelled, status.bus, models.Stop.trip_id, models.Platform.station_id)
+        .join(models.Stop, status.stop_id == models.Stop.id)
+        .join(models.Track, models.Stop.original_track_id == models.Track.id)
+        .join(models.Platform, models.Track.platform_id == models.Platform.id)
+        .where(status.date == service_date)
+        .order_by(*order_by(status))
+    )
+    return streamed(stmt, engine)
+
+def trip_update_chunks(service_date: date, engine=None, timestamp: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Zmiany doby (opóźnienia, odwołania, zmiany torów) jako komunikat GTFS-Realtime FeedMessage z TripUpdates,
+    po jednym fragmencie na kurs. Kurs z wszystkimi postojami odwołanymi jest odwołany w całości.
+    Zastępcza komunikacja autobusowa nie ma odpowiednika w TripUpdates - jest w eksporcie CSV tablicy.
+    """
+    data = reference.get()
+    store = data.store
+    running = store.running(service_date)
+    start_date = gtfs_date(service_date)
+    yield gtfs_realtime.feed_header(int(time.time()) if timestamp is None else timestamp)
+
+    statuses = day_statuses(service_date, lambda status: (models.Stop.trip_id, models.Stop.sequence), engine)
+    for trip_id, rows in groupby(statuses, key=lambda row: row.trip_id):
+        trip = store.trip_index(trip_id)
+        if trip is None or not running[trip]:
+            continue
+        updates = []
+        cancelled = 0
+        for row in rows:
+            position = store.position(row.stop_id)
+            # Postój dodany po wczytaniu danych referencyjnych - pomijany, jak w ReferenceData.stop()
+            if position is None:
+                continue
+            original_track_id = store.track[position]
+            cancelled += bool(row.is_cancelled)
+            updates.append(gtfs_realtime.stop_time_update(
+                store.sequence[position],
+                track_stop_id(original_track_id),
+                None if store.arrival[position] == NO_TIME else (row.arrival_delay or 0) * 60,
+                None if store.departure[position] == NO_TIME else (row.departure_delay or 0) * 60,
+                skipped=bool(row.is_cancelled),
+                assigned_stop_id=track_stop_id(row.track_id) if row.track_id and row.track_id != original_track_id else None,
+            ))
+        yield gtfs_realtime.trip_update_entity(
+            f"{trip_id}_{start_date}", trip_id, start_date, updates,
+            cancelled=cancelled == len(store.itinerary(trip)),
+            route_id=data.trips[trip_id].route.id,
+        )
+
+BOARD_HEADER = (
+    "date", "station_id", "station", "stop_id", "trip_id", "train_number", "category", "carrier", "sequence",
+    "arrival", "departure", "arrival_delay", "departure_delay", "planned_platform", "planned_track",
+    "platform", "track", "is_cancelled", "bus",
+)
+
+def board_rows(service_date: date, engine=None):
+    """
+    Wiersze tablicy doby wszystkich stacji: postoje kursujących pociągów według stacji i godziny,
+    ze statusem doby. Statusy czytane są z kursora uporządkowanego według stacji równolegle do postojów,
+    więc w pamięci są tylko statusy bieżącej stacji.
+    """
+    data = reference.get()
+    store = data.store
+    running = store.running(service_date)
+    statuses = day_statuses(service_date, lambda status: (models.Platform.station_id, status.stop_id), engine)
+    pending = next(statuses, None)
+
+    for station_id in sorted(data.stations):
+        station_statuses = {}
+        while pending is not None and pending.station_id <= station_id:
+            if pending.station_id == station_id:
+                station_statuses[pending.stop_id] = pending
+            pending = next(statuses, None)
+
+        positions = [p for p in store.station_stops(station_id) if running[store.trip[p]]]
+        # Kolejność tablicy: godzina odjazdu (przyjazdu na stacji końcowej)
+        positions.sort(key=lambda p: (store.departure[p] if store.departure[p] != NO_TIME else store.arrival[p], store.stop_id[p]))
+        for p in positions:
+            stop = reference.ItineraryStop(data, p)
+            route = data.trips[stop.trip_id].route
+            status = station_statuses.get(stop.id)
+            planned = data.tracks.get(stop.original_track_id)
+            actual = data.tracks.get(status.track_id) if status and status.track_id else planned
+            yield (
+                service_date.isoformat(), station_id, data.stations[station_id], stop.id, stop.trip_id,
+                route.train_number, route.type_code, route.carrier_name, stop.sequence,
+                stop.arrival.strftime("%H:%M") if stop.arrival else "",
+                stop.departure.strftime("%H:%M") if stop.departure else "",
+                status.arrival_delay if status else 0, status.departure_delay if status else 0,
+                planned.platform if planned else "", planned.number if planned else "",
+                actual.platform if actual else "", actual.number if actual else "",
+                int(bool(status and status.is_cancelled)), int(bool(status and status.bus)),
+            )
+
+def board_csv_chunks(since: date, until: date, engine=None) -> Iterator[bytes]:
+    """
+    Tablica wszystkich stacji dla kolejnych dób zakresu jako jeden plik CSV.
+    """
+    def rows():
+        for ordinal in range(since.toordinal(), until.toordinal() + 1):
+            yield from board_rows(date.fromordinal(ordinal), engine)
+    return csv_chunks(BOARD_HEADER, rows())
@@ -0,0 +1,72 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from typing import Optional
+
+# Logowanie aplikacji: poziomy zamiast print(), dodatkowe pola (extra=...) jako dane strukturalne.
+# Rekordy trafiają do kolejki, a zapisuje je osobny wątek (QueueListener) - wywołanie loggera
+# w pętli zdarzeń lub w gorącej pętli nie czeka na zapis na konsolę.
+#
+# LOG_LEVEL (domyślnie INFO) - poziom logów aplikacji; komunikaty o każdym połączeniu i edycji mają poziom DEBUG.
+# LOG_FORMAT=json - jeden obiekt JSON na linię (do zbierania logów), domyślnie czytelny tekst.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Atrybuty każdego LogRecord - pozostałe pola rekordu pochodzą z extra=...
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+class TextFormatter(logging.Formatter):
+    """
+    Czas, poziom, logger i treść, a po nich dodatkowe pola jako klucz=wartość.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{datetime.fromtimestamp(record.created):%Y-%m-%d %H:%M:%S} {record.levelname} {record.name}: {record.getMessage()}"
+        extra = fields(record)
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(fields(record))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup():
+    """
+    Konfiguruje logger "sdip" (wywoływane raz przy starcie aplikacji, kolejne wywołania nic nie zmieniają).
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger("sdip")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.propagate = False
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"sdip.{name}")
@@ -3,12 +3,42 @@ from backend.routers import admin, auth
 from backend.database import engine
 from backend import models
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routers import admin, auth, timetable, displays, voice
+from backend.routers import admin, auth, timetable, displays, voice, punctuality, search, export
+from backend.rollover import run_rollover_task
+from backend import reference, metrics, logs, profiling, archive, rollover, analytics
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
+
+# Logi aplikacji (poziom i format: LOG_LEVEL, LOG_FORMAT)
+logs.setup()
 
 # Tworzymy tabele w DB
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# Liczniki zapytań SQL dla każdego endpointu (/metrics), ostrzeżenia o wolnych i powtarzanych zapytaniach
+metrics.instrument(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Dane referencyjne wczytywane przy starcie, żeby pierwsze wyświetlacze nie czekały na ich wczytanie
+    await run_in_threadpool(reference.get)
+    # Indeksy statusów brakujące w tabelach utworzonych przed ich dodaniem
+    await run_in_threadpool(archive.ensure_indexes, engine)
+    # Statusy dób, których zmiana przypadła, gdy serwer nie działał
+    await run_in_threadpool(archive.run, rollover.today())
+    # Statystyki punktualności ostatnich dób, których zmiana przypadła, gdy serwer nie działał (w tle)
+    close_days_task = asyncio.create_task(run_in_threadpool(analytics.close_missing_days, rollover.today()))
+    # Zadanie w tle obsługujące zmianę doby przewozowej
+    rollover_task = asyncio.create_task(run_rollover_task())
+    # Monitor blokowania pętli zdarzeń (tylko z LOOP_LAG_MS)
+    profiling.start_loop_monitor()
+    yield
+    profiling.stop_loop_monitor()
+    rollover_task.cancel()
+    close_days_task.cancel()
+
+app = FastAPI(default_response_class=metrics.TimedJSONResponse, lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -18,9 +48,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(admin.router)
 app.include_router(auth.router)
 app.include_router(timetable.router)
 app.include_router(displays.router)
-app.include_router(voice.router)
\ No newline at end of file
+app.include_router(voice.router)
+app.include_router(punctuality.router)
+app.include_router(search.router)
+app.include_router(export.router)
+app.include_router(metrics.router)
+app.include_router(profiling.router)
\ No newline at end of file
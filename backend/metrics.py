@@ -0,0 +1,242 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+from . import logs
+from .utils.fast_json import FastJSONResponse
+
+# Liczniki obciążenia bazy dla każdego endpointu HTTP i każdego odświeżenia danych WebSocket:
+# liczba zapytań SQL, czas w bazie, liczba wierszy i czas kodowania odpowiedzi.
+# Zapytania przypisywane są do bieżącego żądania przez ContextVar (kontekst przechodzi też do puli wątków),
+# a do wspólnych liczników trafiają raz na żądanie - koszt to kilka dodawań na zapytanie.
+# Liczniki wystawiane są w formacie Prometheus pod /metrics.
+#
+# Przy okazji wykrywane są zapytania wolniejsze niż SLOW_QUERY_MS (domyślnie 200 ms) oraz to samo zapytanie
+# powtórzone co najmniej QUERY_REPEAT_THRESHOLD razy (domyślnie 5) w jednym żądaniu - typowy wzorzec N+1
+# (zapytanie w pętli po wierszach). Ostrzeżenia w logu zawierają endpoint i miejsce wywołania w kodzie.
+
+log = logs.get_logger("sql")
+
+SLOW_QUERY_SECONDS = int(os.getenv("SLOW_QUERY_MS", "200")) / 1000
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+# Nagłówek żądania włączający nagłówek Server-Timing w odpowiedzi (diagnostyka pojedynczego żądania)
+DEBUG_HEADER = b"x-debug-metrics"
+
+class RequestStats:
+    __slots__ = ("route", "scope", "statements", "db_seconds", "rows", "serialization_seconds", "repeats", "repeat_sites")
+
+    def __init__(self, route: str = "unmatched", scope: Optional[dict] = None):
+        self.route = route
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialization_seconds = 0.0
+        self.repeats: Dict[str, int] = {}
+        self.repeat_sites: Dict[str, str] = {}
+
+    def label(self) -> str:
+        """
+        Etykieta żądania - dla HTTP szablon ścieżki, znany dopiero po dopasowaniu endpointu.
+        """
+        if self.scope is not None:
+            return getattr(self.scope.get("route"), "path", self.route)
+        return self.route
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries, {self.rows} rows", '
+            f"serialize;dur={self.serialization_seconds * 1000:.2f}, total;dur={total_seconds * 1000:.2f}"
+        )
+
+class RouteTotals:
+    __slots__ = ("requests", "statements", "db_seconds", "rows", "serialization_seconds", "seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialization_seconds = 0.0
+        self.seconds = 0.0
+
+current: ContextVar[Optional[RequestStats]] = ContextVar("metrics_current", default=None)
+
+# Klucz: (rodzaj: "http" lub "ws", szablon ścieżki lub widok)
+totals: Dict[Tuple[str, str], RouteTotals] = {}
+_lock = threading.Lock()
+
+def record(kind: str, route: str, stats: RequestStats, seconds: float):
+    for statement, site in stats.repeat_sites.items():
+        log.warning("Powtarzane zapytanie SQL (N+1)", extra={
+            "route": route, "count": stats.repeats[statement], "call_site": site, "statement": shorten(statement),
+        })
+    with _lock:
+        route_totals = totals.get((kind, route))
+        if route_totals is None:
+            route_totals = totals[(kind, route)] = RouteTotals()
+        route_totals.requests += 1
+        route_totals.statements += stats.statements
+        route_totals.db_seconds += stats.db_seconds
+        route_totals.rows += stats.rows
+        route_totals.serialization_seconds += stats.serialization_seconds
+        route_totals.seconds += seconds
+
+@contextmanager
+def track(kind: str, route: str):
+    """
+    Przypisuje zapytania wykonane w bloku do (kind, route) - dla pracy poza żądaniami HTTP
+    (odświeżenia danych WebSocket, zadania w tle).
+    """
+    stats = RequestStats(route)
+    token = current.set(stats)
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        current.reset(token)
+        record(kind, route, stats, time.perf_counter() - started)
+
+@contextmanager
+def serialization():
+    """
+    Dolicza czas bloku do czasu kodowania bieżącego żądania.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - started
+
+def instrument(engine):
+    """
+    Podpina liczenie zapytań pod silnik SQLAlchemy.
+    Liczba wierszy pochodzi od sterownika (cursor.rowcount) - psycopg2 podaje ją także dla SELECT.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("metrics_started", time.perf_counter())
+        stats = current.get()
+        if elapsed >= SLOW_QUERY_SECONDS:
+            log.warning("Wolne zapytanie SQL", extra={
+                "route": stats.label() if stats else "background", "ms": round(elapsed * 1000, 1),
+                "call_site": call_site(), "statement": shorten(statement),
+            })
+        if stats is None:
+            return
+        stats.statements += 1
+        stats.db_seconds += elapsed
+        if cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+        # Teksty zapytań SQLAlchemy trzyma w pamięci podręcznej kompilacji, więc słownik liczy je tanio
+        count = stats.repeats[statement] = stats.repeats.get(statement, 0) + 1
+        if count == QUERY_REPEAT_THRESHOLD:
+            stats.repeat_sites[statement] = call_site()
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def call_site() -> str:
+    """
+    Najbliższe miejsce w kodzie aplikacji (poza tym modułem), z którego wykonano zapytanie.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_BACKEND_DIR) and filename != __file__:
+            return f"{os.path.relpath(filename, _BACKEND_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "nieznane"
+
+def shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI zbierające liczniki dla każdego żądania HTTP (etykieta: szablon ścieżki endpointu).
+    Z nagłówkiem X-Debug-Metrics w żądaniu odpowiedź zawiera nagłówek Server-Timing z pomiarami tego żądania.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope=scope)
+        token = current.set(stats)
+        started = time.perf_counter()
+        debug = any(name == DEBUG_HEADER for name, _ in scope["headers"])
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", stats.server_timing(time.perf_counter() - started).encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing if debug else send)
+        finally:
+            current.reset(token)
+            record("http", stats.label(), stats, time.perf_counter() - started)
+
+class TimedJSONResponse(FastJSONResponse):
+    """
+    FastJSONResponse z pomiarem czasu kodowania.
+    """
+
+    def render(self, content) -> bytes:
+        with serialization():
+            return super().render(content)
+
+METRICS = (
+    ("requests", "sdip_requests_total", "counter", "Liczba żądań HTTP lub odświeżeń danych WebSocket."),
+    ("statements", "sdip_db_statements_total", "counter", "Liczba zapytań SQL."),
+    ("db_seconds", "sdip_db_seconds_total", "counter", "Łączny czas zapytań SQL w sekundach."),
+    ("rows", "sdip_db_rows_total", "counter", "Liczba wierszy zwróconych lub zmienionych (wg sterownika bazy)."),
+    ("serialization_seconds", "sdip_serialization_seconds_total", "counter", "Łączny czas kodowania odpowiedzi w sekundach."),
+    ("seconds", "sdip_request_seconds_total", "counter", "Łączny czas obsługi w sekundach."),
+)
+
+def label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus() -> str:
+    """
+    Liczniki w formacie tekstowym Prometheus.
+    """
+    fields = [field for field, *_ in METRICS]
+    with _lock:
+        snapshot = [(key, {f: getattr(totals[key], f) for f in fields}) for key in sorted(totals)]
+
+    lines = []
+    for field, name, kind, help_text in METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (source, route), values in snapshot:
+            lines.append(f'{name}{{kind="{label(source)}",route="{label(route)}"}} {values[field]}')
+    return "\n".join(lines) + "\n"
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
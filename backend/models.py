@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Interval, Float, Boolean, Date
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Interval, Float, Boolean, Date, Time, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime, date
@@ -128,8 +128,8 @@ class Stop(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(String, ForeignKey("trip.trip_id"), nullable=False)
     original_track_id = Column(Integer, ForeignKey("track.id"), nullable=False)
-    arrival = Column(DateTime, nullable=True)
-    departure = Column(DateTime, nullable=True)
+    arrival = Column(Time, nullable=True)
+    departure = Column(Time, nullable=True)
     sequence = Column(Integer, nullable=False)
 
     trip = relationship("Trip")
@@ -156,6 +156,57 @@ class StopStatus(Base):
     track = relationship("Track", foreign_keys=[track_id])
     stop = relationship("Stop", back_populates="statuses")
 
+    # Zapytania o bieżącą dobę filtrują po dacie i postoju
+    __table_args__ = (Index("ix_stop_status_date_stop_id", "date", "stop_id"),)
+
+class StopStatusArchive(Base):
+    """
+    Statusy minionych dób przeniesione z stop_status przez zadanie zmiany doby (archive.py).
+    Dzięki temu stop_status zawiera tylko bieżące doby i nie rośnie z każdym rokiem historii.
+    """
+    __tablename__ = 'stop_status_archive'
+    id = Column(Integer, primary_key=True)
+    # id z stop_status - nie jest unikalne, bo SQLite po opróżnieniu stop_status nadaje te same id ponownie
+    status_id = Column(Integer, nullable=True)
+    stop_id = Column(ForeignKey('stop.id'))
+    date = Column(Date, nullable=False)
+
+    arrival_delay = Column(Integer, default=0)
+    departure_delay = Column(Integer, default=0)
+    track_id = Column(Integer, ForeignKey("track.id"), nullable=True)
+    is_cancelled = Column(Boolean, default=False)
+    bus = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ix_stop_status_archive_date", "date"),
+        Index("ix_stop_status_archive_stop_id_date", "stop_id", "date"),
+    )
+
+class PunctualityRollup(Base):
+    """
+    Liczniki punktualności grupy postojów (trasa, stacja, przewoźnik, godzina, dzień tygodnia) zamkniętej doby.
+    Zapisywane przy zmianie doby przez analytics.py - statystyki nie czytają stop_status.
+    """
+    __tablename__ = 'punctuality_rollup'
+    date = Column(Date, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+
+    stops = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    bus = Column(Integer, nullable=False, default=0)
+    on_time = Column(Integer, nullable=False, default=0)
+    delay_minutes = Column(Integer, nullable=False, default=0)
+    # Liczba postojów w przedziałach opóźnień utils.punctuality.BUCKET_LABELS
+    bucket_0 = Column(Integer, nullable=False, default=0)
+    bucket_1 = Column(Integer, nullable=False, default=0)
+    bucket_2 = Column(Integer, nullable=False, default=0)
+    bucket_3 = Column(Integer, nullable=False, default=0)
+    bucket_4 = Column(Integer, nullable=False, default=0)
+    bucket_5 = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_punctuality_rollup_dimension_date", "dimension", "date"),)
+
 class Track(Base):
     __tablename__ = "track"
     id = Column(Integer, primary_key=True, index=True)
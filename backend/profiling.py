@@ -0,0 +1,220 @@
+import asyncio
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from . import logs
+
+# Diagnostyka działającego serwera:
+# - profiler próbkujący: co kilka milisekund odczytuje stosy wszystkich wątków (sys._current_frames)
+#   i zlicza je w formacie "collapsed stacks" (flamegraph.pl, speedscope.app),
+# - monitor opóźnień pętli zdarzeń: wykrywa odcinki, w których pętla nie oddała sterowania dłużej niż
+#   LOOP_LAG_MS (np. synchroniczne zapytanie do bazy w funkcji async), i zapisuje, gdzie była zablokowana.
+#
+# Endpointy są dostępne tylko po ustawieniu PROFILING_TOKEN i wymagają nagłówka X-Profiling-Token.
+# Monitor pętli działa tylko po ustawieniu LOOP_LAG_MS (próg w milisekundach).
+
+log = logs.get_logger("profiling")
+
+LOOP_LAG_MS = int(os.getenv("LOOP_LAG_MS", "0"))
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Funkcje, w których wątek czeka na pracę - stosy kończące się na nich pomijane są domyślnie w profilu
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"), ("thread.py", "_worker"),
+    ("handlers.py", "dequeue"),
+}
+
+def short_path(filename: str) -> str:
+    if filename.startswith(_BACKEND_DIR):
+        return os.path.relpath(filename, _BACKEND_DIR)
+    marker = filename.rfind("site-packages" + os.sep)
+    if marker != -1:
+        return filename[marker + len("site-packages") + 1:]
+    return os.path.basename(filename)
+
+def frame_label(code, labels: Dict[object, str]) -> str:
+    label = labels.get(code)
+    if label is None:
+        label = labels[code] = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+def is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+def sample(seconds: float, interval: float = 0.01, idle: bool = False) -> Counter:
+    """
+    Próbkuje stosy wszystkich wątków (poza bieżącym) przez podany czas.
+    Klucz wyniku: "wątek;funkcja (plik:linia);..." od korzenia do liścia, wartość: liczba próbek.
+    """
+    me = threading.get_ident()
+    labels: Dict[object, str] = {}
+    stacks: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (not idle and is_idle(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code, labels))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+def app_frames(frame) -> list:
+    """
+    Ramki kodu aplikacji na stosie (poza tym modułem) jako "plik:linia (funkcja)", od najgłębszej.
+    """
+    found = []
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(_BACKEND_DIR) and frame.f_code.co_filename != __file__:
+            found.append(f"{short_path(frame.f_code.co_filename)}:{frame.f_lineno} ({frame.f_code.co_name})")
+        frame = frame.f_back
+    return found
+
+class LoopLagMonitor:
+    """
+    Wykrywa zablokowanie pętli zdarzeń dłuższe niż threshold sekund.
+    Korutyna w pętli co interval sekund zaznacza, że pętla działa; osobny wątek, widząc brak znaku
+    dłużej niż próg, zapisuje stos wątku pętli i bieżące zadanie - czyli kod, który ją blokuje.
+    Po odblokowaniu odcinek trafia do logu i do listy ostatnich odcinków (spans).
+    """
+
+    def __init__(self, threshold: float, interval: Optional[float] = None, keep: int = 100):
+        self.threshold = threshold
+        # Wątek sprawdza pętlę co interval, więc krótszy odcinek niż próg + interval nie zostanie uchwycony
+        self.interval = interval if interval is not None else min(0.05, threshold / 2)
+        self.spans = deque(maxlen=keep)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self.beat = time.monotonic()
+        self.suspect: Optional[dict] = None
+        self.stopped = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self.task = asyncio.create_task(self.heartbeat())
+        threading.Thread(target=self.watch, name="loop-lag-monitor", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    async def heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.beat = time.monotonic()
+            lag = self.beat - started - self.interval
+            if lag >= self.threshold:
+                self.report(lag)
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            if self.suspect is None and time.monotonic() - self.beat > self.threshold + self.interval:
+                self.suspect = self.capture()
+
+    def capture(self) -> dict:
+        top = sys._current_frames().get(self.loop_thread)
+        task = asyncio.current_task(self.loop)
+        stack = []
+        labels: Dict[object, str] = {}
+        frame = top
+        while frame is not None and len(stack) < 30:
+            stack.append(frame_label(frame.f_code, labels))
+            frame = frame.f_back
+        found = app_frames(top)
+        # Handler endpointu to najpłytsza ramka z routers/, miejsce blokady - najgłębsza ramka aplikacji
+        handlers = [site for site in found if site.startswith("routers" + os.sep)]
+        return {
+            "task": task.get_coro().__qualname__ if task is not None else None,
+            "handler": handlers[-1] if handlers else None,
+            "call_site": found[0] if found else None,
+            "stack": stack,
+        }
+
+    def report(self, lag: float):
+        suspect, self.suspect = self.suspect, None
+        span = {"at": time.time(), "ms": round(lag * 1000, 1), **(suspect or {"task": None, "handler": None, "call_site": None, "stack": []})}
+        self.spans.append(span)
+        log.warning("Pętla zdarzeń zablokowana", extra={
+            "ms": span["ms"], "task": span["task"], "handler": span["handler"], "call_site": span["call_site"],
+        })
+
+loop_monitor: Optional[LoopLagMonitor] = None
+
+def start_loop_monitor():
+    """
+    Uruchamia monitor pętli (w lifespan aplikacji), jeśli ustawiono LOOP_LAG_MS.
+    """
+    global loop_monitor
+    if LOOP_LAG_MS > 0:
+        loop_monitor = LoopLagMonitor(LOOP_LAG_MS / 1000)
+        loop_monitor.start()
+    return loop_monitor
+
+def stop_loop_monitor():
+    if loop_monitor is not None:
+        loop_monitor.stop()
+
+def require_token(token: Optional[str]):
+    expected = os.getenv("PROFILING_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Profilowanie jest wyłączone")
+    if token is None or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Niepoprawny token profilowania")
+
+# Jednocześnie działa najwyżej jeden profiler
+_sampling = threading.Lock()
+
+router = APIRouter(prefix="/admin/profiling", tags=["Admin"], include_in_schema=False)
+
+@router.get("/sample", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=1, le=100),
+    idle: bool = False,
+    x_profiling_token: Optional[str] = Header(None),
+):
+    """
+    Profil CPU wszystkich wątków serwera z podanego czasu jako "collapsed stacks".
+    """
+    require_token(x_profiling_token)
+    if not _sampling.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Profilowanie już trwa")
+    try:
+        log.info("Profilowanie", extra={"seconds": seconds, "interval_ms": interval_ms})
+        stacks = await run_in_threadpool(sample, seconds, interval_ms / 1000, idle)
+    finally:
+        _sampling.release()
+    return PlainTextResponse(collapsed(stacks))
+
+@router.get("/loop-lag")
+def get_loop_lag(x_profiling_token: Optional[str] = Header(None)):
+    """
+    Ostatnie odcinki zablokowania pętli zdarzeń (najnowsze na końcu).
+    """
+    require_token(x_profiling_token)
+    if loop_monitor is None:
+        return {"threshold_ms": None, "spans": []}
+    return {"threshold_ms": LOOP_LAG_MS, "spans": list(loop_monitor.spans)}
@@ -0,0 +1,199 @@
+from array import array
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, Row
+from sqlalchemy.orm import Session
+
+from . import archive, models, reference
+from .utils import estimated_times
+
+# Wspólne zapytania dla endpointów rozkładu.
+# Dane referencyjne (trasy, stacje, tory, planowe postoje kursów) pochodzą z pamięci podręcznej reference,
+# a z bazy pobierane są tylko statusy na dany dzień - w stałej liczbie zapytań.
+
+def origin_station_names(db: Session, trip_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Nazwy stacji początkowych (postój o najmniejszym sequence) dla wielu kursów.
+    """
+    trip_ids = set(trip_ids)
+    if not trip_ids:
+        return {}
+    data = reference.get(db)
+    return {trip_id: data.origin_station(trip_id) for trip_id in trip_ids}
+
+def statuses_for(db: Session, stop_ids: Iterable[int], target_date: date) -> Dict[int, models.StopStatus]:
+    """
+    Statusy podanych postojów na dany dzień jednym zapytaniem, klucz: stop_id.
+    Statusy minionych dób pochodzą z archiwum (te same pola co models.StopStatus).
+    """
+    stop_ids = list(stop_ids)
+    if not stop_ids:
+        return {}
+    model = archive.status_model(target_date)
+    stmt = (
+        select(model)
+        .where(model.stop_id.in_(stop_ids), model.date == target_date)
+        .execution_options(populate_existing=True)
+    )
+    return {status.stop_id: status for status in db.execute(stmt).scalars()}
+
+# Szybka ścieżka tylko do odczytu dla tablic: planowe postoje stacji pochodzą z magazynu kolumnowego
+# danych referencyjnych (reference.store), a z bazy pobierane są jednym zapytaniem Core tylko statusy
+# postojów stacji na dany dzień - zwykle niewielka część rozkładu.
+
+class BoardRow:
+    """
+    Wiersz tablicy: postój ze statusem na dany dzień uzupełniony danymi referencyjnymi kursu i torów.
+    """
+    __slots__ = (
+        "id", "trip_id", "sequence", "arrival", "departure", "arrival_minute", "departure_minute", "original_track_id",
+        "status_id", "arrival_delay", "departure_delay", "status_track_id", "is_cancelled", "bus",
+        "track_id", "trip", "planned", "actual",
+    )
+
+    def __init__(self, data: reference.ReferenceData, position: int, status: Optional[Row]):
+        store = data.store
+        self.id = store.stop_id[position]
+        self.trip_id = store.trip_ids[store.trip[position]]
+        self.sequence = store.sequence[position]
+        self.arrival_minute = store.arrival[position]
+        self.departure_minute = store.departure[position]
+        self.arrival = reference.minute_time(self.arrival_minute)
+        self.departure = reference.minute_time(self.departure_minute)
+        self.original_track_id = store.track[position]
+        if status is None:
+            self.status_id = self.arrival_delay = self.departure_delay = self.status_track_id = None
+            self.is_cancelled = self.bus = None
+        else:
+            (self.status_id, self.arrival_delay, self.departure_delay, self.status_track_id,
+             self.is_cancelled, self.bus) = status[1:]
+        self.track_id = self.status_track_id or self.original_track_id
+        self.trip = data.trips[self.trip_id]
+        self.planned = data.tracks.get(self.original_track_id)
+        self.actual = data.tracks.get(self.track_id)
+
+    train_number = property(lambda self: self.trip.route.train_number)
+    final_station_id = property(lambda self: self.trip.route.final_station_id)
+    final_station = property(lambda self: self.trip.route.final_station)
+    type_name = property(lambda self: self.trip.route.type_name)
+    type_code = property(lambda self: self.trip.route.type_code)
+    carrier_name = property(lambda self: self.trip.route.carrier_name)
+    carrier_code = property(lambda self: self.trip.route.carrier_code)
+    planned_track = property(lambda self: self.planned.number if self.planned else None)
+    planned_platform = property(lambda self: self.planned.platform if self.planned else None)
+    track = property(lambda self: self.actual.number if self.actual else None)
+    platform_id = property(lambda self: self.actual.platform_id if self.actual else None)
+    platform = property(lambda self: self.actual.platform if self.actual else None)
+
+def station_statuses(db: Session, station_id: int, target_date: date) -> Dict[int, Row]:
+    """
+    Statusy postojów stacji na dany dzień jako płaskie wiersze, klucz: stop_id.
+    """
+    status = archive.status_model(target_date).__table__.c
+    stmt = (
+        station_status_query(status, station_id)
+        .where(status.date == target_date)
+    )
+    return {row.stop_id: row for row in db.execute(stmt)}
+
+def station_statuses_between(db: Session, station_id: int, since: date, until: date) -> Dict[Tuple[date, int], Row]:
+    """
+    Statusy postojów stacji w zakresie dób (z obu tabel statusów) jednym zapytaniem, klucz: (data, stop_id).
+    """
+    status = archive.history(since, until).c
+    stmt = station_status_query(status, station_id, status.date)
+    return {(row.date, row.stop_id): row[:-1] for row in db.execute(stmt)}
+
+def station_status_query(status, station_id: int, *extra):
+    # Kolejność kolumn jak w BoardRow: stop_id, a po nim pola statusu
+    return (
+        select(
+            status.stop_id, status.id, status.arrival_delay, status.departure_delay,
+            status.track_id, status.is_cancelled, status.bus, *extra,
+        )
+        .join(models.Stop, status.stop_id == models.Stop.id)
+        .join(models.Track, models.Stop.original_track_id == models.Track.id)
+        .join(models.Platform, models.Track.platform_id == models.Platform.id)
+        .where(models.Platform.station_id == station_id)
+    )
+
+def board_rows(db: Session, station_id: int, target_date: date, field: Optional[str] = None) -> List[BoardRow]:
+    """
+    Postoje stacji kursujące danego dnia z godziną `field` ("arrival" lub "departure"), uporządkowane
+    według tej godziny, razem ze statusem na ten dzień oraz torem rzeczywistym (tor ze statusu lub planowy).
+    Bez `field` - wszystkie postoje stacji w kolejności kursów.
+    """
+    data = reference.get(db)
+    if field is None:
+        running = data.store.running(target_date)
+        positions = [p for p in data.store.station_stops(station_id) if running[data.store.trip[p]]]
+    else:
+        positions = data.store.at_station(station_id, field, target_date)
+    if not positions:
+        return []
+    statuses = station_statuses(db, station_id, target_date)
+    stop_id = data.store.stop_id
+    return [BoardRow(data, p, statuses.get(stop_id[p])) for p in positions]
+
+def row_times(rows: List[BoardRow], field: str, day_start: int = 0) -> Tuple[array, array]:
+    """
+    (plan, czas rzeczywisty) godziny `field` wierszy w minutach od północy dnia doby (utils.estimated_times).
+    """
+    return estimated_times.estimate(
+        [getattr(row, field + "_minute") for row in rows],
+        [getattr(row, field + "_delay") for row in rows],
+        day_start,
+    )
+
+# Wiersze pomijane na tablicach: odjazdy kursów kończących bieg na stacji i przyjazdy na stację początkową
+BOARD_FILTERS = {
+    "departure": lambda row, station_id: row.final_station_id != station_id,
+    "arrival": lambda row, station_id: row.sequence != 0,
+}
+
+def departure_rows(db: Session, station_id: int, target_date: date) -> List[BoardRow]:
+    keep = BOARD_FILTERS["departure"]
+    return [row for row in board_rows(db, station_id, target_date, "departure") if keep(row, station_id)]
+
+def arrival_rows(db: Session, station_id: int, target_date: date) -> List[BoardRow]:
+    keep = BOARD_FILTERS["arrival"]
+    return [row for row in board_rows(db, station_id, target_date, "arrival") if keep(row, station_id)]
+
+def schedule_rows(db: Session, station_id: int, since: date, until: date, field: str) -> List[Tuple[date, List[BoardRow]]]:
+    """
+    Wiersze tablicy (jak departure_rows / arrival_rows) każdej doby zakresu [since, until], uporządkowane według
+    planowej godziny `field`. Postoje stacji wybierane są raz dla całego zakresu, dni kursowania - raz na kurs
+    (StopStore.service_days), a statusy wszystkich dób pobierane jednym zapytaniem.
+    """
+    data = reference.get(db)
+    store = data.store
+    days = (until - since).days + 1
+    positions = store.at_station(station_id, field)
+    service_days: Dict[int, int] = {}
+    for p in positions:
+        if store.trip[p] not in service_days:
+            service_days[store.trip[p]] = store.service_days(store.trip[p], since, days)
+    statuses = station_statuses_between(db, station_id, since, until) if positions else {}
+
+    keep = BOARD_FILTERS[field]
+    result = []
+    for offset in range(days):
+        day = date.fromordinal(since.toordinal() + offset)
+        rows = (
+            BoardRow(data, p, statuses.get((day, store.stop_id[p])))
+            for p in positions if service_days[store.trip[p]] >> offset & 1
+        )
+        result.append((day, [row for row in rows if keep(row, station_id)]))
+    return result
+
+def trip_stop_rows(db: Session, trip_ids: Iterable[str]) -> Dict[str, List[reference.ItineraryStop]]:
+    """
+    Wszystkie planowe postoje podanych kursów (z nazwą stacji) uporządkowane według sequence -
+    z danych referencyjnych, bez zapytania o stacje pośrednie dla każdego wiersza tablicy.
+    """
+    trip_ids = set(trip_ids)
+    if not trip_ids:
+        return {}
+    data = reference.get(db)
+    return {trip_id: data.itinerary(trip_id) for trip_id in trip_ids}
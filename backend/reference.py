@@ -0,0 +1,224 @@
+import threading
+from time import monotonic
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models, database
+from .utils.runs_on_date import runs_on_date
+from .utils.stop_store import StopStore, NO_TIME
+
+# Pamięć podręczna danych referencyjnych (stacje, perony, tory, trasy, kursy i ich planowe postoje).
+# Planowe postoje trzymane są kolumnowo (utils.stop_store), co pozwala trzymać w pamięci rozkład całej sieci.
+# Dane te praktycznie nie zmieniają się w ciągu dnia, więc zamiast dołączać je w każdym zapytaniu
+# wczytywane są raz na proces. Aplikacja nie zapisuje tych tabel - po zmianach wprowadzonych poza nią
+# (import rozkładu, edycja bazy) trzeba wywołać invalidate() przez POST /admin/reload-reference,
+# a następne użycie wczytuje dane ponownie. Nieznany identyfikator kursu lub postoju wymusza ponowne
+# wczytanie samodzielnie (najwyżej raz na MISS_RELOAD_INTERVAL), ale zmiany istniejących wierszy
+# (np. nazwy stacji, tory planowe) bez invalidate() pozostają niewidoczne.
+
+class TrackRef:
+    __slots__ = ("id", "number", "platform_id", "platform", "station_id")
+
+    def __init__(self, id: int, number: str, platform_id: int, platform: str, station_id: int):
+        self.id = id
+        self.number = number
+        self.platform_id = platform_id
+        self.platform = platform
+        self.station_id = station_id
+
+class RouteRef:
+    __slots__ = ("id", "train_number", "type_name", "type_code", "carrier_name", "carrier_code", "final_station_id", "final_station")
+
+    def __init__(self, id: str, train_number: str, type_name: Optional[str], type_code: Optional[str],
+                 carrier_name: Optional[str], carrier_code: Optional[str], final_station_id: int, final_station: Optional[str]):
+        self.id = id
+        self.train_number = train_number
+        self.type_name = type_name
+        self.type_code = type_code
+        self.carrier_name = carrier_name
+        self.carrier_code = carrier_code
+        self.final_station_id = final_station_id
+        self.final_station = final_station
+
+# Godziny odtwarzane z kolumn minut - wspólne obiekty time zamiast osobnego na każdy postój
+MINUTE_TIMES = tuple(time(m // 60, m % 60) for m in range(1440))
+
+def minute_time(minutes: int) -> Optional[time]:
+    return None if minutes == NO_TIME else MINUTE_TIMES[minutes]
+
+def time_minutes(t: Optional[time]) -> Optional[int]:
+    return None if t is None else t.hour * 60 + t.minute
+
+class ItineraryStop:
+    """
+    Planowy postój kursu odczytany z magazynu kolumnowego (pola jak w wierszach queries.trip_stop_rows).
+    Tworzony na żądanie - magazyn nie przechowuje obiektów postojów.
+    """
+    __slots__ = ("id", "trip_id", "sequence", "arrival", "departure", "original_track_id", "station_id", "station")
+
+    def __init__(self, data: "ReferenceData", position: int):
+        store = data.store
+        self.id = store.stop_id[position]
+        self.trip_id = store.trip_ids[store.trip[position]]
+        self.sequence = store.sequence[position]
+        self.arrival = minute_time(store.arrival[position])
+        self.departure = minute_time(store.departure[position])
+        self.original_track_id = store.track[position]
+        self.station_id = None if store.station[position] == -1 else store.station[position]
+        self.station = data.stations.get(self.station_id)
+
+class TripRef:
+    __slots__ = ("trip_id", "route", "days_mask", "start_date", "end_date")
+
+    def __init__(self, trip_id: str, route: RouteRef, days_mask: int, start_date: date, end_date: date):
+        self.trip_id = trip_id
+        self.route = route
+        self.days_mask = days_mask
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def runs_on(self, target_date: date) -> bool:
+        return runs_on_date(self.start_date, self.end_date, self.days_mask, target_date)
+
+class ReferenceData:
+    __slots__ = ("version", "stations", "tracks", "routes", "trips", "store")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.stations: Dict[int, str] = {}
+        self.tracks: Dict[int, TrackRef] = {}
+        self.routes: Dict[str, RouteRef] = {}
+        self.trips: Dict[str, TripRef] = {}
+        self.store = StopStore((), {})
+
+    def stop(self, stop_id: int) -> Optional[ItineraryStop]:
+        position = self.store.position(stop_id)
+        return None if position is None else ItineraryStop(self, position)
+
+    def itinerary(self, trip_id: str) -> List[ItineraryStop]:
+        trip = self.store.trip_index(trip_id)
+        return [] if trip is None else [ItineraryStop(self, p) for p in self.store.itinerary(trip)]
+
+    def origin_station(self, trip_id: str) -> Optional[str]:
+        """
+        Nazwa stacji początkowej kursu (postój o najmniejszym sequence).
+        """
+        trip = self.store.trip_index(trip_id)
+        return None if trip is None else self.stations.get(self.store.station[self.store.trip_start[trip]])
+
+    def trip_of(self, stop_id: int) -> Optional[TripRef]:
+        position = self.store.position(stop_id)
+        return None if position is None else self.trips.get(self.store.trip_ids[self.store.trip[position]])
+
+    def train_number(self, stop_id: int) -> Optional[str]:
+        trip = self.trip_of(stop_id)
+        return trip.route.train_number if trip else None
+
+# Najkrótszy odstęp między ponownymi wczytaniami z powodu nieznanego identyfikatora (w sekundach)
+MISS_RELOAD_INTERVAL = 30
+
+_version = 0
+_data: Optional[ReferenceData] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+def invalidate():
+    """
+    Oznacza dane referencyjne jako nieaktualne (POST /admin/reload-reference po zmianach tabel referencyjnych).
+    """
+    global _version
+    with _lock:
+        _version += 1
+
+def load(db: Session, version: int) -> ReferenceData:
+    """
+    Wczytuje wszystkie dane referencyjne pięcioma zapytaniami.
+    """
+    data = ReferenceData(version)
+    data.stations = dict(db.execute(select(models.Station.id, models.Station.name)).all())
+
+    for row in db.execute(
+        select(models.Track.id, models.Track.number, models.Platform.id, models.Platform.number, models.Platform.station_id)
+        .join(models.Platform, models.Track.platform_id == models.Platform.id)
+    ):
+        data.tracks[row[0]] = TrackRef(*row)
+
+    for row in db.execute(
+        select(
+            models.Route.id, models.Route.train_number,
+            models.RouteType.name, models.RouteType.code,
+            models.Carrier.name, models.Carrier.code,
+            models.Route.final_station_id,
+        )
+        .outerjoin(models.RouteType, models.Route.type_id == models.RouteType.id)
+        .outerjoin(models.Carrier, models.Route.carrier_id == models.Carrier.id)
+    ):
+        data.routes[row[0]] = RouteRef(*row, data.stations.get(row[6]))
+
+    calendar = models.Calendar
+    for row in db.execute(
+        select(
+            models.Trip.trip_id, models.Trip.route_id,
+            calendar.monday, calendar.tuesday, calendar.wednesday, calendar.thursday,
+            calendar.friday, calendar.saturday, calendar.sunday,
+            calendar.start_date, calendar.end_date,
+        )
+        .join(calendar, models.Trip.service_id == calendar.service_id)
+    ):
+        route = data.routes.get(row.route_id)
+        if route is None:
+            continue
+        days_mask = sum(1 << weekday for weekday, runs in enumerate(row[2:9]) if runs)
+        data.trips[row.trip_id] = TripRef(row.trip_id, route, days_mask, row.start_date, row.end_date)
+
+    # Planowe postoje w magazynie kolumnowym (godziny jako minuty od północy)
+    rows = (
+        (stop_id, trip_id, sequence, time_minutes(arrival), time_minutes(departure), track_id,
+         data.tracks[track_id].station_id if track_id in data.tracks else None)
+        for stop_id, trip_id, sequence, arrival, departure, track_id in db.execute(
+            select(
+                models.Stop.id, models.Stop.trip_id, models.Stop.sequence,
+                models.Stop.arrival, models.Stop.departure, models.Stop.original_track_id,
+            )
+        )
+    )
+    calendars = {trip_id: (trip.days_mask, trip.start_date, trip.end_date) for trip_id, trip in data.trips.items()}
+    data.store = StopStore(rows, calendars)
+
+    return data
+
+def get(db: Optional[Session] = None, trip_ids: Iterable[str] = (), stop_ids: Iterable[int] = ()) -> ReferenceData:
+    """
+    Aktualne dane referencyjne procesu. Wczytywane przy pierwszym użyciu, po invalidate()
+    oraz gdy brakuje któregoś z `trip_ids` lub `stop_ids` (np. kurs dodany po wczytaniu danych).
+    """
+    trip_ids, stop_ids = tuple(trip_ids), tuple(stop_ids)
+    data = _data
+    if data is not None and data.version == _version and not _missing(data, trip_ids, stop_ids):
+        return data
+    return _reload(db, trip_ids, stop_ids)
+
+def _missing(data: ReferenceData, trip_ids: Iterable[str], stop_ids: Iterable[int]) -> bool:
+    return any(t not in data.trips for t in trip_ids) or any(data.store.position(s) is None for s in stop_ids)
+
+def _reload(db: Optional[Session], trip_ids: Iterable[str], stop_ids: Iterable[int]) -> ReferenceData:
+    global _data, _loaded_at
+    with _lock:
+        data = _data
+        if data is not None and data.version == _version:
+            # Brakujący identyfikator - dane mogą być nieaktualne, ale nieistniejące identyfikatory
+            # w zapytaniach nie mogą wymuszać ponownego wczytywania przy każdym żądaniu
+            if not _missing(data, trip_ids, stop_ids) or monotonic() - _loaded_at < MISS_RELOAD_INTERVAL:
+                return data
+
+        session = db if db is not None else database.SessionLocal()
+        try:
+            _data = load(session, _version)
+            _loaded_at = monotonic()
+        finally:
+            if db is None:
+                session.close()
+        return _data
@@ -0,0 +1,74 @@
+import asyncio
+import inspect
+import os
+from datetime import date, datetime, timedelta
+from typing import Callable, List
+
+from . import logs
+from .utils.operating_day import OperatingDay, parse_day_start
+
+log = logs.get_logger("rollover")
+
+# Doba przewozowa - wspólna dla wszystkich endpointów, wyświetlaczy i komunikatów głosowych.
+# OPERATING_DAY_START (HH:MM) przesuwa początek doby, np. "03:00" - pociągi nocne należą wtedy do poprzedniej doby.
+operating_day = OperatingDay(parse_day_start(os.getenv("OPERATING_DAY_START", "00:00")))
+# Z takim wyprzedzeniem przed zmianą doby przygotowywane są dane następnej doby
+WARM_UP_BEFORE = timedelta(minutes=int(os.getenv("OPERATING_DAY_WARM_UP_MINUTES", "10")))
+
+warm_up_handlers: List[Callable] = []
+rollover_handlers: List[Callable] = []
+
+def today() -> date:
+    """
+    Bieżąca doba przewozowa.
+    """
+    return operating_day.service_date(datetime.now())
+
+def on_warm_up(handler: Callable) -> Callable:
+    """
+    Rejestruje funkcję (zwykłą lub async) wywoływaną z datą następnej doby przed jej rozpoczęciem.
+    """
+    warm_up_handlers.append(handler)
+    return handler
+
+def on_rollover(handler: Callable) -> Callable:
+    """
+    Rejestruje funkcję (zwykłą lub async) wywoływaną z datą nowej doby w chwili jej rozpoczęcia.
+    """
+    rollover_handlers.append(handler)
+    return handler
+
+async def run_handlers(handlers: List[Callable], service_date: date):
+    for handler in handlers:
+        try:
+            result = handler(service_date)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            log.exception("Błąd obsługi zmiany doby", extra={"handler": handler.__name__})
+
+async def wait_until(moment: datetime):
+    while True:
+        seconds = (moment - datetime.now()).total_seconds()
+        if seconds <= 0:
+            return
+        await asyncio.sleep(seconds)
+
+async def run_rollover_task():
+    """
+    Zadanie w tle: przed zmianą doby przygotowuje dane następnej doby, a w chwili zmiany
+    powiadamia pamięci podręczne i wyświetlacze, żeby nie pokazywały danych z minionej doby.
+    """
+    while True:
+        now = datetime.now()
+        rollover = operating_day.next_rollover(now)
+        new_day = operating_day.service_date(rollover)
+
+        if now < rollover - WARM_UP_BEFORE:
+            await wait_until(rollover - WARM_UP_BEFORE)
+            log.info("Przygotowanie danych doby", extra={"service_date": new_day})
+            await run_handlers(warm_up_handlers, new_day)
+
+        await wait_until(rollover)
+        log.info("Zmiana doby przewozowej", extra={"service_date": new_day})
+        await run_handlers(rollover_handlers, new_day)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import models, schemas, database
+from .. import models, schemas, database, reference
 from pwdlib import PasswordHash
 
 # Hashowanie haseł
@@ -107,4 +107,13 @@ def delete_admin(admin_id: int, db: Session = Depends(database.get_db)):
 
     db.delete(admin)
     db.commit()
-    return {"msg": "Administrator usunięty pomyślnie"}
\ No newline at end of file
+    return {"msg": "Administrator usunięty pomyślnie"}
+
+@router.post("/reload-reference")
+def reload_reference_data():
+    """
+    Wymusza ponowne wczytanie danych referencyjnych (stacje, tory, trasy, kursy) - np. po imporcie rozkładu.
+    """
+    reference.invalidate()
+    data = reference.get()
+    return {"msg": "Dane referencyjne wczytane ponownie", "version": data.version, "trips": len(data.trips)}
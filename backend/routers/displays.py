@@ -1,14 +1,43 @@
-from fastapi import APIRouter, WebSocket, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload, contains_eager
-from datetime import datetime, timedelta, date
-from .. import models, database, schemas
-from sqlalchemy import and_
-import json
+from fastapi import APIRouter, WebSocket, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from contextlib import aclosing
+from collections import defaultdict
+from datetime import datetime, time, timedelta, date
+from typing import Callable, Dict, List, Optional
+import hashlib
+import math
+import os
+from .. import models, database, schemas, queries, reference, rollover, metrics, logs
 import asyncio
-from .timetable import station_update_listeners # Słownik kolejek zdarzeń dla wyświetlaczy stacyjnych
+from .timetable import station_update_listeners, station_versions, request_flights, SEND_TIMEOUT # Słownik kolejek zdarzeń dla wyświetlaczy stacyjnych
+from ..utils import fast_json
+from ..utils.payload_cache import PayloadCache
+from ..utils import compact_payload
+from ..utils.compact_payload import StringTable
+from ..utils.single_flight import SingleFlight, coalesce
+from ..utils.backoff import jittered_backoff
+from ..utils.fanout import Fanout, Overflow
+from ..utils import estimated_times
 
 router = APIRouter(prefix="/displays", tags=["displays"])
-connected_clients = {}  # Przechowuje połączenia WebSocket do zmian wyglądu
+log = logs.get_logger("displays")
+appearance_listeners = Fanout()  # Odbiorcy zmian wyglądu (WebSocket i SSE), temat: id wyświetlacza
+appearance_versions: Dict[int, int] = defaultdict(int)  # Numer ostatniej zmiany wyglądu wyświetlacza (id zdarzenia SSE)
+display_payloads = PayloadCache()  # Zakodowane dane widoków wspólne dla wszystkich wyświetlaczy tego samego widoku
+display_strings = StringTable()  # Numery nazw stacji w binarnym formacie danych wyświetlaczy
+DISPLAY_STRING_KEYS = ("station", "intermediate")
+# Kontrola obciążenia: liczba jednocześnie budowanych widoków i liczba widoków czekających na zbudowanie,
+# powyżej której nowe wyświetlacze innych widoków są odsyłane z sugerowanym czasem ponowienia
+MAX_CONCURRENT_RENDERS = int(os.getenv("DISPLAY_MAX_CONCURRENT_RENDERS", "4"))
+MAX_PENDING_RENDERS = int(os.getenv("DISPLAY_MAX_PENDING_RENDERS", "50"))
+render_slots = asyncio.Semaphore(MAX_CONCURRENT_RENDERS)
+render_flights = SingleFlight()  # Budowanie danych widoku trwające w danej chwili, klucz: (widok, wersja rozkładu)
+# Tablice pokazują początek następnej doby, gdy do jej rozpoczęcia zostało mniej niż tyle czasu
+NEXT_DAY_LOOKAHEAD = timedelta(hours=int(os.getenv("DISPLAY_NEXT_DAY_LOOKAHEAD_HOURS", "3")))
+# Odpowiedzi SSE nie mogą być buforowane przez proxy
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 # Typy wyświetlaczy
@@ -98,11 +127,347 @@ def get_displays(station_id: int, db: Session = Depends(database.get_db)):
 
     return result
 
+# Dane wyświetlaczy budowane są z płaskich wierszy (queries.board_rows) - bez obiektów ORM. Postoje stacji
+# i stacje pośrednie pochodzą z danych referencyjnych, z bazy pobierane są tylko statusy postojów stacji.
+
+@rollover.on_rollover
+def drop_previous_day_payloads(new_date: date):
+    """
+    Dane widoków minionej doby nie są już potrzebne (wyświetlacze odświeża notify_station_update).
+    """
+    display_payloads.clear()
+
+def next_refresh(estimated: Optional[datetime]) -> float:
+    """
+    Czas do następnego odświeżenia wyświetlacza - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie).
+    """
+    if estimated is None:
+        return 30 # Jeśli brak pociągów, sprawdź za 30 sekund
+    seconds_until_departure = (estimated - datetime.now()).total_seconds()
+    # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
+    # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
+    return max(60, min(seconds_until_departure + 1, 60))
+
+def upcoming_rows(fetch_rows: Callable[[date], list], now: datetime, field: str, limit: Optional[int], until: Optional[datetime] = None):
+    """
+    Pierwsze `limit` (None - wszystkie) kursujących postojów bieżącej doby, których czas rzeczywisty (`field` + opóźnienie)
+    nie minął (i nie przekracza `until`). Jeśli zbliża się zmiana doby, a tablica nie jest pełna, dopełniana jest
+    postojami następnej doby. `fetch_rows(dzień)` zwraca wiersze board_rows danej doby. Zwraca listę (wiersz, czas rzeczywisty).
+    """
+    day_start = rollover.operating_day.start_minute
+    today, tomorrow = rollover.operating_day.window(now)
+    next_day_start = datetime.combine(tomorrow, rollover.operating_day.start)
+    result = []
+    for day in (today, tomorrow):
+        if day == tomorrow and ((limit is not None and len(result) >= limit) or next_day_start > (until or now + NEXT_DAY_LOOKAHEAD)):
+            break
+        rows = fetch_rows(day)
+        planned, estimated = queries.row_times(rows, field, day_start)
+        end = rollover.operating_day.minutes_since_midnight(day, until) if until else None
+        # Kolejność według planu - po północy doby przewozowej wiersze posortowane po godzinie zmieniają kolejność
+        upcoming = estimated_times.argsort(planned, estimated_times.window(estimated, rollover.operating_day.minutes_since_midnight(day, now), end))
+        if limit is not None:
+            upcoming = upcoming[:limit - len(result)]
+        midnight = datetime.combine(day, time(0, 0))
+        result.extend((rows[i], midnight + timedelta(minutes=estimated[i])) for i in upcoming)
+    return result
+
+def next_stations(trip_stops, sequence: int, final_station_id: Optional[int]) -> List[str]:
+    """
+    Stacje po danym postoju (bez stacji docelowej).
+    """
+    return [i.station for i in trip_stops if i.sequence > sequence and i.station_id != final_station_id]
+
+def platform_display_data(db: Session, station_id: int, platform_id: int, now: datetime):
+    rows = lambda day: [s for s in queries.board_rows(db, station_id, day, "departure") if s.platform_id == platform_id]
+    upcoming = upcoming_rows(rows, now, "departure", 3)
+    trip_stops = queries.trip_stop_rows(db, [s.trip_id for s, _ in upcoming])
+
+    display_data = []
+    for s, _ in upcoming:
+        display_data.append({
+            "station": s.final_station,
+            "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
+            "departure_delay": s.departure_delay or 0,
+            "track": s.track,
+            "train_type": s.type_code,
+            "intermediate": next_stations(trip_stops[s.trip_id], s.sequence, s.final_station_id),
+            "train_number": s.train_number,
+            "is_cancelled": s.is_cancelled if s.status_id else False,
+            "bus": s.bus if s.status_id else False
+        })
+    return display_data, upcoming[0][1] if upcoming else None
+
+def entrance_platform_display_data(db: Session, station_id: int, platform_id: int, now: datetime):
+    available = lambda day: [
+        s for s in queries.board_rows(db, station_id, day, "departure")
+        if s.platform_id == platform_id and not s.is_cancelled and not s.bus
+    ]
+    track_ids = [t.id for t in reference.get(db).tracks.values() if t.platform_id == platform_id]
+    limit = now + timedelta(minutes=20)
+
+    # Pierwszy odjazd z każdego toru peronu w ciągu najbliższych 20 minut
+    first_on_track = {}
+    for s, estimated in upcoming_rows(available, now, "departure", None, limit):
+        first_on_track.setdefault(s.track_id, (s, estimated))
+    upcoming = [first_on_track[t] for t in track_ids if t in first_on_track]
+
+    display_data = []
+    for s, _ in upcoming:
+        display_data.append({
+            "station": s.final_station,
+            "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
+            "departure_delay": s.departure_delay or 0,
+            "track": s.track,
+            "train_type": s.type_code,
+            "train_number": s.train_number,
+            "intermediate": [],  # dodasz gdy będzie potrzebne
+        })
+    first_departure = min(estimated for _, estimated in upcoming[:2]) if upcoming else None
+    return display_data, first_departure
+
+def station_display_departures_data(db: Session, station_id: int, now: datetime):
+    rows = lambda day: queries.board_rows(db, station_id, day, "departure")
+    upcoming = upcoming_rows(rows, now, "departure", 10)
+    trip_stops = queries.trip_stop_rows(db, [s.trip_id for s, _ in upcoming])
+
+    display_data = []
+    for s, _ in upcoming:
+        display_data.append({
+            "station": s.final_station,
+            "time": s.departure.strftime("%H:%M") if s.departure else None,
+            "delay": s.departure_delay or 0,
+            "platform/track": s.platform + "/" + str(s.track),
+            "train_type": s.type_code,
+            "intermediate": next_stations(trip_stops[s.trip_id], s.sequence, s.final_station_id),
+            "train_number": s.train_number,
+            "carrier": s.carrier_code,
+            "is_cancelled": s.is_cancelled if s.status_id else False,
+            "bus": s.bus if s.status_id else False
+        })
+    return display_data, upcoming[0][1] if upcoming else None
+
+def station_display_arrivals_data(db: Session, station_id: int, now: datetime):
+    rows = lambda day: queries.board_rows(db, station_id, day, "arrival")
+    upcoming = upcoming_rows(rows, now, "arrival", 10)
+    trip_stops = queries.trip_stop_rows(db, [s.trip_id for s, _ in upcoming])
+
+    display_data = []
+    for s, _ in upcoming:
+        previous_stops = [i for i in trip_stops[s.trip_id] if i.sequence < s.sequence]
+        display_data.append({
+            "station": trip_stops[s.trip_id][0].station,
+            "time": s.arrival.strftime("%H:%M") if s.arrival else None,
+            "delay": s.arrival_delay or 0,
+            "platform/track": s.platform + "/" + str(s.track),
+            "train_type": s.type_code,
+            # Bez stacji początkowej
+            "intermediate": [i.station for i in previous_stops[1:]],
+            "train_number": s.train_number,
+            "carrier": s.carrier_code,
+            "is_cancelled": s.is_cancelled if s.status_id else False,
+            "bus": s.bus if s.status_id else False
+        })
+    return display_data, upcoming[0][1] if upcoming else None
+
+def edge_display_data(db: Session, station_id: int, track_id: int, now: datetime):
+    available = lambda day: [
+        s for s in queries.board_rows(db, station_id, day, "departure")
+        if s.track_id == track_id and not s.is_cancelled and not s.bus
+    ]
+    upcoming = upcoming_rows(available, now, "departure", 1, now + timedelta(minutes=20))
+    if not upcoming:
+        return [], None
+
+    s, estimated = upcoming[0]
+    trip_stops = queries.trip_stop_rows(db, [s.trip_id])
+    intermediate = next_stations(trip_stops[s.trip_id], s.sequence, s.final_station_id)
+    if intermediate:
+        intermediate.pop()  # Usuwamy stację docelową
+    data = {
+        "station": s.final_station or "",
+        "departure_time": s.departure.strftime("%H:%M") if s.departure else "",
+        "departure_delay": s.departure_delay or 0,
+        "train_type": s.type_name or "",
+        "train_number": s.train_number,
+        "carrier": s.carrier_name or "",
+        "intermediate": intermediate,
+    }
+    return data, estimated
+
+class DisplayPayload:
+    """
+    Dane widoku zbudowane dla jednej wersji rozkładu: tekst JSON, identyfikator treści (id zdarzenia SSE)
+    oraz (przy pierwszym użyciu) wersja binarna.
+    """
+    __slots__ = ("data", "text", "event_id", "first_estimated", "_binary")
+
+    def __init__(self, data, first_estimated: Optional[datetime]):
+        self.data = data
+        self.text = fast_json.dumps(data)
+        self.event_id = hashlib.blake2b(self.text.encode("utf-8"), digest_size=8).hexdigest()
+        self.first_estimated = first_estimated
+        self._binary = None
+
+    def binary(self):
+        """
+        Zwraca (numery użytych nazw, dane msgpack z nazwami zastąpionymi numerami z display_strings).
+        """
+        if self._binary is None:
+            compact, used = display_strings.compact(self.data, DISPLAY_STRING_KEYS)
+            self._binary = (used, compact_payload.pack_data(compact))
+        return self._binary
+
+def build_display_payload(build, now: datetime, view=("display",)) -> DisplayPayload:
+    """
+    Buduje dane widoku we własnej sesji - wywoływane w puli wątków, więc nie blokuje pętli zdarzeń,
+    a wynik współdzielony przez wiele połączeń nie zależy od sesji żadnego z nich.
+    """
+    db = database.SessionLocal()
+    try:
+        with metrics.track("ws", f"display:{view[0]}"):
+            # Pusta lista zamiast błędu, żeby wyczyścić ekran
+            data = build(db, now)
+            with metrics.serialization():
+                return DisplayPayload(*data)
+    finally:
+        db.close()
+
+async def render_display_payload(station_id: int, view, build) -> DisplayPayload:
+    """
+    Aktualne dane widoku: z pamięci podręcznej, z trwającego już budowania tego samego widoku (single-flight)
+    albo zbudowane od nowa, gdy zwolni się jedno z MAX_CONCURRENT_RENDERS miejsc.
+    """
+    now = datetime.now()
+    version = station_versions[station_id]
+    payload = display_payloads.get(view, version, now)
+    if payload is not None:
+        return payload
+
+    async def compute():
+        async with render_slots:
+            # Dane mogły zostać zbudowane w czasie oczekiwania na wolne miejsce
+            payload = display_payloads.get(view, version, datetime.now())
+            if payload is None:
+                payload = await run_in_threadpool(build_display_payload, build, now, view)
+                display_payloads.put(view, version, now.replace(second=0, microsecond=0) + timedelta(minutes=1), payload)
+            return payload
+
+    return await render_flights.run((view, version), compute)
+
+def admission_retry_after(station_id: int, view) -> Optional[float]:
+    """
+    Kontrola przyjmowania nowych wyświetlaczy (np. po awarii sieci, gdy wszystkie łączą się naraz).
+    Zwraca None, jeśli połączenie można obsłużyć, albo sugerowany czas ponowienia z losowym rozrzutem.
+    Połączenia do widoków, których dane są gotowe lub właśnie budowane, są przyjmowane zawsze -
+    obciążenie bazy zależy od liczby różnych budowanych widoków, a nie od liczby czekających wyświetlaczy.
+    """
+    version = station_versions[station_id]
+    if len(render_flights) < MAX_PENDING_RENDERS:
+        return None
+    if display_payloads.get(view, version, datetime.now()) is not None or (view, version) in render_flights:
+        return None
+    return jittered_backoff(len(render_flights) / MAX_CONCURRENT_RENDERS)
+
+async def display_payload_stream(station_id: int, view, build):
+    """
+    Kolejne dane widoku: bieżące dane, a następnie nowe po upływie czasu odświeżenia lub edycji rozkładu.
+    Dane widoku są budowane przez build(db, now) i kodowane raz na wersję rozkładu stacji i minutę
+    (czasy w rozkładzie mają dokładność minut), a pozostałe wyświetlacze tego samego widoku dostają gotowy tekst.
+    """
+    # Bufor zdarzeń tego połączenia - wiele edycji przed odświeżeniem daje jeden sygnał
+    with station_update_listeners.subscription(station_id) as updates:
+        while True:
+            payload = await render_display_payload(station_id, view, build)
+            yield payload
+            sleep_time = next_refresh(payload.first_estimated)
+
+            # Inteligentne oczekiwanie
+            try:
+                # Oczekiwanie na sygnał (od edit_timetable) PRZEZ określony czas (sleep_time)
+                await asyncio.wait_for(updates.get(), timeout=sleep_time)
+                # Jeśli kod tutaj dotrze, to znaczy, że nastąpiła edycja rozkładu
+                log.debug("Wykryto edycję - natychmiastowe odświeżanie", extra={"station_id": station_id})
+            except asyncio.TimeoutError:
+                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
+                pass
+
+async def serve_display(websocket: WebSocket, station_id: int, name, view, build):
+    """
+    Pętla wyświetlacza WebSocket.
+    Z parametrem ?format=msgpack dane wysyłane są binarnie, a nazwy stacji jako numery - każda nazwa
+    trafia do wyświetlacza tylko raz na połączenie (pole "strings").
+    Przy przeciążeniu połączenie jest zamykane z kodem 1013 (Try Again Later) i sugerowanym czasem
+    ponowienia w polu reason ("retry-after=<sekundy>").
+    """
+    retry_after = admission_retry_after(station_id, view)
+    if retry_after is not None:
+        log.warning("Przeciążenie - odrzucono wyświetlacz", extra={"display": name, "retry_after": round(retry_after)})
+        await websocket.close(code=1013, reason=f"retry-after={math.ceil(retry_after)}")
+        return
+
+    binary = websocket.query_params.get("format") == "msgpack"
+    if binary and compact_payload.msgpack is None:
+        log.warning("Brak biblioteki msgpack - dane wysyłane jako JSON")
+        binary = False
+    sent_strings = set()
+
+    try:
+        async with aclosing(display_payload_stream(station_id, view, build)) as payloads:
+            async for payload in payloads:
+                if binary:
+                    used, packed_data = payload.binary()
+                    new_strings = {string_id: display_strings.string(string_id) for string_id in used - sent_strings}
+                    sent_strings.update(new_strings)
+                    await asyncio.wait_for(websocket.send_bytes(compact_payload.pack_message(new_strings, packed_data)), SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(websocket.send_text(payload.text), SEND_TIMEOUT)
+    except Exception as e:
+        log.debug("Rozłączono wyświetlacz", extra={"display": name, "reason": repr(e)})
+
+def serve_display_events(request: Request, station_id: int, view, build) -> StreamingResponse:
+    """
+    Strumień SSE z danymi widoku - odpowiednik serve_display dla wyświetlaczy tylko do odczytu.
+    Id zdarzenia identyfikuje treść danych, więc wyświetlacz wznawiający połączenie z nagłówkiem
+    Last-Event-ID dostaje dane dopiero wtedy, gdy różnią się od ostatnio otrzymanych.
+    Przy przeciążeniu zwracany jest błąd 503 z nagłówkiem Retry-After, a pole retry strumienia
+    rozrzuca w czasie ponowne połączenia przeglądarek.
+    """
+    retry_after = admission_retry_after(station_id, view)
+    if retry_after is not None:
+        raise HTTPException(status_code=503, detail="Serwer przeciążony.", headers={"Retry-After": str(math.ceil(retry_after))})
+    last_event_id = request.headers.get("last-event-id")
+
+    async def events():
+        nonlocal last_event_id
+        yield f"retry: {int(jittered_backoff(len(render_flights) / MAX_CONCURRENT_RENDERS) * 1000)}\n\n"
+        async with aclosing(display_payload_stream(station_id, view, build)) as payloads:
+            async for payload in payloads:
+                if payload.event_id == last_event_id:
+                    yield ": bez zmian\n\n"  # komentarz SSE podtrzymujący połączenie
+                    continue
+                last_event_id = payload.event_id
+                yield f"id: {payload.event_id}\ndata: {payload.text}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def platform_station_id(db: Session, platform_id: int) -> int:
+    platform = db.query(models.Platform).filter(models.Platform.id == platform_id).first()
+    if not platform:
+        raise HTTPException(status_code=404, detail="Platform not found")
+    return platform.station_id
+
+def track_station_id(db: Session, track_id: int) -> int:
+    track = db.query(models.Track).filter(models.Track.id == track_id).first()
+    if not track:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return track.platform.station_id
+
 # Wyświetlacz zbiorczy peronowy
 @router.websocket("/platform-display-data/{platform_id}")
 async def ws_platform_display_data(websocket: WebSocket, platform_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Połączono z wyświetlaczem peronowym {platform_id}")
+    log.debug("Połączono z wyświetlaczem peronowym", extra={"platform_id": platform_id})
 
     station_id = (
         db.query(models.Platform)
@@ -110,138 +475,20 @@ async def ws_platform_display_data(websocket: WebSocket, platform_id: int, db: S
         .first()
         .station_id
     )
-    # Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    station_update_listeners[station_id].append(update_queue)
-
-    try:
-        while True:
-            db.commit()
-            current_datetime = datetime.now()
-            
-            today = current_datetime.date()
-
-            stop_data = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                .filter(
-                    models.Platform.station_id == station_id,
-                    models.Stop.departure.isnot(None)
-                )
-                .options(
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                    joinedload(models.Stop.original_track)
-                    .joinedload(models.Track.platform)
-                    .joinedload(models.Platform.station),
-                    contains_eager(models.Stop.statuses)
-                )
-                .order_by(models.Stop.departure.asc())
-                .all()
-            )
-
-            filtered_stops = []
-
-            for s in stop_data:
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-                status = next((st for st in s.statuses if st.date == today), None)
-                if not status and s.original_track.platform_id != platform_id:
-                    continue
-                elif status and status.track and status.track.platform_id != platform_id:
-                    continue
-                elif status and status.track is None and s.original_track.platform_id != platform_id:
-                    continue
-                scheduled_departure = datetime.combine(current_datetime.date(), s.departure)
-                
-                delay_minutes = status.departure_delay if status and status.departure_delay is not None else 0
-                estimated_departure = scheduled_departure + timedelta(minutes=delay_minutes)
-                
-                if estimated_departure >= current_datetime:
-                    # Dodano do każdego obiektu atrybut dynamiczny z szacowanym czasem do obliczenia czasu oczekiwania
-                    s.estimated_departure_dt = estimated_departure
-                    filtered_stops.append(s)
-                
-                if len(filtered_stops) >= 3:
-                    break
-
-            if not filtered_stops:
-                await websocket.send_text(json.dumps([])) # Pusta lista zamiast błędu, żeby wyczyścić ekran
-                sleep_time = 30 # Jeśli brak pociągów, sprawdź za 30 sekund
-            else:
-                display_data = []
-                for s in filtered_stops:
-                    intermediate_data = (
-                        db.query(models.Stop)
-                        .join(models.Track)
-                        .join(models.Platform)
-                        .filter(
-                            models.Stop.trip_id == s.trip_id,
-                            models.Stop.sequence > s.sequence,
-                        )
-                        .options(
-                            joinedload(models.Stop.original_track)
-                            .joinedload(models.Track.platform)
-                            .joinedload(models.Platform.station)
-                        )
-                        .order_by(models.Stop.departure.asc())
-                        .all()
-                    )
-
-                    intermediate = [
-                        i.original_track.platform.station.name
-                        for i in intermediate_data
-                        if i.original_track and i.original_track.platform and i.original_track.platform.station and i.original_track.platform.station.id != i.trip.route.final_station.id
-                    ]
-
-                    status = next((st for st in s.statuses if st.date == today), None)
-                    if status and status.track:
-                        track = db.query(models.Track).filter(models.Track.id == status.track_id).first()
-                    else:
-                        track = db.query(models.Track).filter(models.Track.id == s.original_track_id).first()
-                    d = {
-                        "station": s.trip.route.final_station.name if s.trip.route.final_station else None,
-                        "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
-                        "departure_delay": status.departure_delay if status and status.departure_delay else 0,
-                        "track": track.number if track else None,
-                        "train_type": s.trip.route.type.code if s.trip.route.type else None,
-                        "intermediate": intermediate,
-                        "train_number": s.trip.route.train_number,
-                        "is_cancelled": status.is_cancelled if status else False,
-                        "bus": status.bus if status else False
-                    }
-                    display_data.append(d)
-                await websocket.send_text(json.dumps(display_data))
-                # Obliczanie czasu do następnego odświeżenia - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie)
-                first_train_departure = filtered_stops[0].estimated_departure_dt
-                seconds_until_departure = (first_train_departure - datetime.now()).total_seconds()
-                
-                # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
-                # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
-                sleep_time = max(60, min(seconds_until_departure + 1, 60))
-            
-            # print(f"Czekam {sleep_time:.2f} sekund lub na edycję...")
+    # Dane budowane są we własnych sesjach - zwalniamy połączenie z puli na czas życia WebSocketu
+    db.close()
+    await serve_display(
+        websocket, station_id, platform_id, ("platform", platform_id),
+        lambda db, now: platform_display_data(db, station_id, platform_id, now)
+    )
 
-            # Inteligentne oczekiwanie
-            try:
-                # Oczekiwanie na sygnał z kolejki (od edit_timetable) PRZEZ określony czas (sleep_time)
-                await asyncio.wait_for(update_queue.get(), timeout=sleep_time)
-                # Jeśli kod tutaj dotrze, to znaczy, że update_queue.get() zwróciło wynik (nastąpiła edycja rozkladu)
-                print(f"Wykryto edycję dla stacji {station_id}! Natychmiastowe odświeżanie.")
-            except asyncio.TimeoutError:
-                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
-                pass
-    
-    except Exception as e:
-        print(f"Rozłączono ({platform_id}): {e}")
-    finally:
-        # Usuwanie kolejki z listy listenerów po rozłączeniu
-        if station_id in station_update_listeners:
-            if update_queue in station_update_listeners[station_id]:
-                station_update_listeners[station_id].remove(update_queue)
+@router.get("/events/platform-display-data/{platform_id}")
+def sse_platform_display_data(request: Request, platform_id: int, db: Session = Depends(database.get_db)):
+    station_id = platform_station_id(db, platform_id)
+    return serve_display_events(
+        request, station_id, ("platform", platform_id),
+        lambda db, now: platform_display_data(db, station_id, platform_id, now)
+    )
 
 # Wyświetlacz wejściowy peronowy
 @router.websocket("/entrance-platform-display-data/{platform_id}")
@@ -251,7 +498,7 @@ async def ws_entrance_platform_display_data(
     db: Session = Depends(database.get_db)
 ):
     await websocket.accept()
-    print(f"Połączono z wejściowym wyświetlaczem peronowym {platform_id}")
+    log.debug("Połączono z wejściowym wyświetlaczem peronowym", extra={"platform_id": platform_id})
 
     station_id = (
         db.query(models.Platform)
@@ -259,565 +506,131 @@ async def ws_entrance_platform_display_data(
         .first()
         .station_id
     )
+    # Dane budowane są we własnych sesjach - zwalniamy połączenie z puli na czas życia WebSocketu
+    db.close()
+    await serve_display(
+        websocket, station_id, platform_id, ("entrance", platform_id),
+        lambda db, now: entrance_platform_display_data(db, station_id, platform_id, now)
+    )
 
-    #  Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    station_update_listeners[station_id].append(update_queue)
-    today = date.today()
-    try:
-        while True:
-            db.commit()
-            limit = (datetime.now() + timedelta(minutes=20))
-
-            tracks = (
-                db.query(models.Track)
-                .filter(models.Track.platform_id == platform_id)
-                .all()
-            )
-
-            stops = []
-            for t in tracks:
-                stop_data = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                    .filter(models.Stop.departure.isnot(None))
-                    .options(
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                        contains_eager(models.Stop.statuses)
-
-                    )
-                    .order_by(models.Stop.departure.asc())
-                    .all()
-                )
-
-                current_datetime = datetime.now()
-                filtered_stop = []
-
-                for s in stop_data:
-                    status = next((st for st in s.statuses if st.date == today), None)
-                    if status and status.is_cancelled:
-                        continue
-                    if status and status.bus:
-                        continue
-                    if not s.trip.calendar.runs_on_date(today):
-                        continue
-                    if not status and s.original_track_id != t.id:
-                        continue
-                    if status and status.track is None and s.original_track_id != t.id:
-                        continue
-                    elif status and status.track_id != t.id:
-                        continue
-            
-                    scheduled_departure = datetime.combine(current_datetime.date(), s.departure)
-                    
-                    delay_minutes = status.departure_delay if status and status.departure_delay else 0
-                    estimated_departure = scheduled_departure + timedelta(minutes=delay_minutes)
-                    
-                    if estimated_departure >= current_datetime and estimated_departure <= limit:
-                        s.estimated_departure_dt = estimated_departure 
-                        filtered_stop = s
-                        break
-
-                # jeśli brak odjazdu — NIE dodawaj None
-                if filtered_stop:
-                    stops.append(filtered_stop)
-
-             # Wysłanie danych do klienta
-            if not stops:
-                await websocket.send_text(json.dumps([])) # Pusta lista zamiast błędu, żeby wyczyścić ekran
-                sleep_time = 30 # Jeśli brak pociągów, sprawdź za 30 sekund
-            else:
-                display_data = []
-                for s in stops:
-                    status = next((st for st in s.statuses if st.date == today), None)
-                
-                    d = {
-                        "station": (
-                            s.trip.route.final_station.name
-                            if s.trip and s.trip.route and s.trip.route.final_station
-                            else None
-                        ),
-                        "departure_time": (
-                            s.departure.strftime("%H:%M") if s.departure else None
-                        ),
-                        "departure_delay": status.departure_delay if status and status.departure_delay else 0,
-                        "track": status.track.number if status and status.track else s.original_track.number,
-                        "train_type": s.trip.route.type.code if s.trip and s.trip.route and s.trip.route.type else None,
-                        "train_number": s.trip.route.train_number if s.trip and s.trip.route else None,
-                        "intermediate": [],  # dodasz gdy będzie potrzebne
-                    }
-                    display_data.append(d)
-
-                await websocket.send_text(json.dumps(display_data))
-                # Obliczanie czasu do następnego odświeżenia - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie)
-                first_train_departure = min(stops[0].estimated_departure_dt, stops[1].estimated_departure_dt) if len(stops) > 1 else stops[0].estimated_departure_dt
-                seconds_until_departure = (first_train_departure - datetime.now()).total_seconds()
-                
-                # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
-                # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
-                sleep_time = max(60, min(seconds_until_departure + 1, 60))
-            
-            # print(f"Czekam {sleep_time:.2f} sekund lub na edycję...")
-
-            # Inteligentne oczekiwanie
-            try:
-                # Oczekiwanie na sygnał z kolejki (od edit_timetable) PRZEZ określony czas (sleep_time)
-                await asyncio.wait_for(update_queue.get(), timeout=sleep_time)
-                # Jeśli kod tutaj dotrze, to znaczy, że update_queue.get() zwróciło wynik (nastąpiła edycja rozkladu)
-                print(f"Wykryto edycję dla stacji {station_id}! Natychmiastowe odświeżanie.")
-            except asyncio.TimeoutError:
-                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
-                pass
-
-    except Exception as e:
-        print(f"Rozłączono ({platform_id}): {e}")
-    finally:
-        # Usuwanie kolejki z listy listenerów po rozłączeniu
-        if station_id in station_update_listeners:
-            if update_queue in station_update_listeners[station_id]:
-                station_update_listeners[station_id].remove(update_queue)
-
+@router.get("/events/entrance-platform-display-data/{platform_id}")
+def sse_entrance_platform_display_data(request: Request, platform_id: int, db: Session = Depends(database.get_db)):
+    station_id = platform_station_id(db, platform_id)
+    return serve_display_events(
+        request, station_id, ("entrance", platform_id),
+        lambda db, now: entrance_platform_display_data(db, station_id, platform_id, now)
+    )
 
 # Wyświetlacz stacyjny lub tablica informacyjna - odjazdy
 @router.websocket("/station-display-departures-data/{station_id}")
 async def ws_station_display_departures_data(websocket: WebSocket, station_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Połączono z wyświetlaczem stacyjnym {station_id}")
-
-    # Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    station_update_listeners[station_id].append(update_queue)
-
-    try:
-        while True:
-            # Pobieranie i przetwarzanie danych
-            db.commit() # Ważne: nowa transakcja przy każdym obiegu
-            current_datetime = datetime.now()
-            today = date.today()
-
-            stop_candidates = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                .filter(
-                    models.Platform.station_id == station_id,
-                    models.Stop.departure.isnot(None),
-                )
-                .options(
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                    joinedload(models.Stop.original_track).joinedload(models.Track.platform).joinedload(models.Platform.station),
-                    contains_eager(models.Stop.statuses)
-                )
-                .order_by(models.Stop.departure.asc())
-                .all()
-            )
-
-            filtered_stops = []
-            # Filtracja w Pythonie
-            for s in stop_candidates:
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-                status = next((st for st in s.statuses if st.date == today), None)
-                scheduled_departure = datetime.combine(current_datetime.date(), s.departure)
-                delay_minutes = status.departure_delay if status and status.departure_delay is not None else 0
-                estimated_departure = scheduled_departure + timedelta(minutes=delay_minutes)
-                if estimated_departure >= current_datetime:
-                    # Dodano do każdego obiektu atrybut dynamiczny z szacowanym czasem do obliczenia czasu oczekiwania
-                    s.estimated_departure_dt = estimated_departure 
-                    filtered_stops.append(s)
-                
-                if len(filtered_stops) >= 10:
-                    break
-            
-            # Wysłanie danych do klienta
-            if not filtered_stops:
-                await websocket.send_text(json.dumps([])) # Pusta lista zamiast błędu, żeby wyczyścić ekran
-                sleep_time = 30 # Jeśli brak pociągów, sprawdź za 30 sekund
-            else:
-                # Budowanie JSON
-                display_data = []
-                for s in filtered_stops:
-                    intermediate_data = (
-                        db.query(models.Stop)
-                        .join(models.Track)
-                        .join(models.Platform)
-                        .filter(
-                            models.Stop.trip_id == s.trip_id,
-                            models.Stop.sequence > s.sequence,
-                        )
-                        .options(
-                            joinedload(models.Stop.original_track)
-                            .joinedload(models.Track.platform)
-                            .joinedload(models.Platform.station)
-                        )
-                        .order_by(models.Stop.departure.asc())
-                        .all()
-                    )
-
-                    intermediate = [
-                        i.original_track.platform.station.name
-                        for i in intermediate_data
-                        if i.original_track and i.original_track.platform and i.original_track.platform.station and i.original_track.platform.station.id != i.trip.route.final_station.id
-                    ]
-                    status = next((st for st in s.statuses if st.date == today), None)
-                    if status and status.track:
-                        platform = status.track.platform.number if status.track.platform else None
-                        track = status.track.number
-                    else:
-                        platform = s.original_track.platform.number if s.original_track and s.original_track.platform else None
-                        track = s.original_track.number if s.original_track else None
-                    d = {
-                        "station": s.trip.route.final_station.name if s.trip.route.final_station else None,
-                        "time": s.departure.strftime("%H:%M") if s.departure else None,
-                        "delay": status.departure_delay if status and status.departure_delay else 0,
-                        "platform/track": platform + "/" + str(track),
-                        "train_type": s.trip.route.type.code if s.trip.route.type else None,
-                        "intermediate": intermediate,
-                        "train_number": s.trip.route.train_number,
-                        "carrier": s.trip.route.carrier.code if s.trip.route.carrier else None,
-                        "is_cancelled": status.is_cancelled if status else False,
-                        "bus": status.bus if status else False
-                    }
-                    display_data.append(d)
-                
-                await websocket.send_text(json.dumps(display_data))
-
-                # Obliczanie czasu do następnego odświeżenia - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie)
-                first_train_departure = filtered_stops[0].estimated_departure_dt
-                seconds_until_departure = (first_train_departure - datetime.now()).total_seconds()
-                
-                # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
-                # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
-                sleep_time = max(60, min(seconds_until_departure + 1, 60))
-            
-            # print(f"Czekam {sleep_time:.2f} sekund lub na edycję...")
-
-            # Inteligentne oczekiwanie
-            try:
-                # Oczekiwanie na sygnał z kolejki (od edit_timetable) PRZEZ określony czas (sleep_time)
-                await asyncio.wait_for(update_queue.get(), timeout=sleep_time)
-                # Jeśli kod tutaj dotrze, to znaczy, że update_queue.get() zwróciło wynik (nastąpiła edycja rozkladu)
-                print(f"Wykryto edycję dla stacji {station_id}! Natychmiastowe odświeżanie.")
-            except asyncio.TimeoutError:
-                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
-                pass
-            
-    except Exception as e:
-        print(f"Rozłączono ({station_id}): {e}")
-    finally:
-        # Usuwanie kolejki z listy listenerów po rozłączeniu
-        if station_id in station_update_listeners:
-            if update_queue in station_update_listeners[station_id]:
-                station_update_listeners[station_id].remove(update_queue)
+    log.debug("Połączono z wyświetlaczem stacyjnym", extra={"station_id": station_id})
+    await serve_display(
+        websocket, station_id, station_id, ("departures", station_id),
+        lambda db, now: station_display_departures_data(db, station_id, now)
+    )
 
+@router.get("/events/station-display-departures-data/{station_id}")
+def sse_station_display_departures_data(request: Request, station_id: int):
+    return serve_display_events(
+        request, station_id, ("departures", station_id),
+        lambda db, now: station_display_departures_data(db, station_id, now)
+    )
 
 # Wyświetlacz stacyjny lub tablica informacyjna - przyjazdy
 @router.websocket("/station-display-arrivals-data/{station_id}")
 async def ws_station_display_arrivals_data(websocket: WebSocket, station_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Połączono z wyświetlaczem stacyjnym {station_id}")
-
-    # Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    station_update_listeners[station_id].append(update_queue)
-
-    try:
-        while True:
-            db.commit()
-
-            current_datetime = datetime.now()
-            today = date.today()
-            filtered_stops = []
-
-            stop_data = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                .filter(
-                    models.Platform.station_id == station_id,
-                    models.Stop.arrival.isnot(None),
-                )
-                .options(
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                    joinedload(models.Stop.original_track)
-                    .joinedload(models.Track.platform)
-                    .joinedload(models.Platform.station),
-                    contains_eager(models.Stop.statuses)
-                )
-                .order_by(models.Stop.arrival.asc())
-                .all()
-            )
-
-            filtered_stops = []
-
-            for s in stop_data:
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-                status = next((st for st in s.statuses if st.date == today), None)
-                scheduled_arrival = datetime.combine(current_datetime.date(), s.arrival)
-                
-                delay_minutes = status.arrival_delay if status and status.arrival_delay is not None else 0
-                estimated_arrival = scheduled_arrival + timedelta(minutes=delay_minutes)
-                
-                if estimated_arrival >= current_datetime:
-                    s.estimated_arrival_dt = estimated_arrival
-                    filtered_stops.append(s)
-
-                if len(filtered_stops) >= 10:
-                    break
-
-            # Wysłanie danych do klienta
-            if not filtered_stops:
-                await websocket.send_text(json.dumps([])) # Pusta lista zamiast błędu, żeby wyczyścić ekran
-                sleep_time = 30 # Jeśli brak pociągów, sprawdź za 30 sekund
-            else:
-                display_data = []
-                for s in filtered_stops:
-                    intermediate_data = (
-                        db.query(models.Stop)
-                        .join(models.Track)
-                        .join(models.Platform)
-                        .filter(
-                            models.Stop.trip_id == s.trip_id,
-                            models.Stop.sequence < s.sequence,
-                        )
-                        .options(
-                            joinedload(models.Stop.original_track)
-                            .joinedload(models.Track.platform)
-                            .joinedload(models.Platform.station)
-                        )
-                        .order_by(models.Stop.sequence.asc())
-                        .all()
-                    )
-                    intermediate_data.pop(0)  # Usuwamy stację początkową
-                    intermediate = [
-                        i.original_track.platform.station.name
-                        for i in intermediate_data
-                        if i.original_track and i.original_track.platform and i.original_track.platform.station
-                    ]
-                    station = (
-                        db.query(models.Stop)
-                        .join(models.Track)
-                        .join(models.Platform)
-                        .join(models.Station)
-                        .filter(models.Stop.trip_id == s.trip_id)
-                        .order_by(models.Stop.sequence.asc())
-                        .first()
-                    ).original_track.platform.station.name if s.original_track and s.original_track.platform and s.original_track.platform.station else None
-
-                    status = next((st for st in s.statuses if st.date == today), None)
-                    if status and status.track:
-                        platform = status.track.platform.number if status.track.platform else None
-                        track = status.track.number
-                    else:
-                        platform = s.original_track.platform.number if s.original_track and s.original_track.platform else None
-                        track = s.original_track.number if s.original_track else None
-                    
-                    d = {
-                        "station": station,
-                        "time": s.arrival.strftime("%H:%M") if s.arrival else None,
-                        "delay": status.arrival_delay if status and status.arrival_delay else 0,
-                        "platform/track": platform + "/" + str(track),
-                        "train_type": s.trip.route.type.code if s.trip.route.type else None,
-                        "intermediate": intermediate,
-                        "train_number": s.trip.route.train_number,
-                        "carrier": s.trip.route.carrier.code if s.trip.route.carrier else None,
-                        "is_cancelled": status.is_cancelled if status else False,
-                        "bus": status.bus if status else False
-                    }
-                    display_data.append(d)
-                await websocket.send_text(json.dumps(display_data))
-                # Obliczanie czasu do następnego odświeżenia - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie)
-                first_train_arrival = filtered_stops[0].estimated_arrival_dt
-                seconds_until_arrival = (first_train_arrival - datetime.now()).total_seconds()
-                
-                # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
-                # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
-                sleep_time = max(60, min(seconds_until_arrival + 1, 60))
-            
-            # print(f"Czekam {sleep_time:.2f} sekund lub na edycję...")
+    log.debug("Połączono z wyświetlaczem stacyjnym", extra={"station_id": station_id})
+    await serve_display(
+        websocket, station_id, station_id, ("arrivals", station_id),
+        lambda db, now: station_display_arrivals_data(db, station_id, now)
+    )
 
-            # Inteligentne oczekiwanie
-            try:
-                # Oczekiwanie na sygnał z kolejki (od edit_timetable) PRZEZ określony czas (sleep_time)
-                await asyncio.wait_for(update_queue.get(), timeout=sleep_time)
-                # Jeśli kod tutaj dotrze, to znaczy, że update_queue.get() zwróciło wynik (nastąpiła edycja rozkladu)
-                print(f"Wykryto edycję dla stacji {station_id}! Natychmiastowe odświeżanie.")
-            except asyncio.TimeoutError:
-                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
-                pass
-    except Exception as e:
-        print(f"Rozłączono ({station_id}): {e}")
-    finally:
-        # Usuwanie kolejki z listy listenerów po rozłączeniu
-        if station_id in station_update_listeners:
-            if update_queue in station_update_listeners[station_id]:
-                station_update_listeners[station_id].remove(update_queue)
+@router.get("/events/station-display-arrivals-data/{station_id}")
+def sse_station_display_arrivals_data(request: Request, station_id: int):
+    return serve_display_events(
+        request, station_id, ("arrivals", station_id),
+        lambda db, now: station_display_arrivals_data(db, station_id, now)
+    )
 
 # Infokiosk - przyjazdy
 @router.get("/infokiosk-arrivals-data/{station_id}")
+@coalesce(request_flights)
 def infokiosk_arrivals_data(station_id: int, db: Session = Depends(database.get_db)):
-    print(f"Połączono z infokioskiem {station_id}")
+    log.debug("Połączono z infokioskiem", extra={"station_id": station_id})
     try:
-        today = date.today()
-        stop = (
-            db.query(models.Stop)
-            .join(models.Track)
-            .join(models.Platform)
-            .filter(
-                models.Platform.station_id == station_id,
-                models.Stop.arrival.isnot(None),
-            )
-            .options(
-                joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                joinedload(models.Stop.original_track)
-                .joinedload(models.Track.platform)
-                .joinedload(models.Platform.station),
-            )
-            .order_by(models.Stop.arrival.asc())
-            .all()
-        )
+        today = rollover.today()
+        stop = queries.board_rows(db, station_id, today, "arrival")
 
         if not stop:
             raise HTTPException(status_code=404, detail="Brak przyjazdów.")
 
+        trip_stops = queries.trip_stop_rows(db, [s.trip_id for s in stop])
+
         display_data = []
         for s in stop:
-            if not s.trip.calendar.runs_on_date(today):
-                continue
-            intermediate_data = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .filter(
-                    models.Stop.trip_id == s.trip_id,
-                    models.Stop.sequence < s.sequence,
-                )
-                .options(
-                    joinedload(models.Stop.original_track)
-                    .joinedload(models.Track.platform)
-                    .joinedload(models.Platform.station)
-                )
-                .order_by(models.Stop.sequence.asc())
-                .all()
-            )
-
             intermediate = [
-                {"station": i.original_track.platform.station.name, "time": i.arrival.strftime("%H:%M")}
-                for i in intermediate_data
-                if i.original_track and i.original_track.platform and i.original_track.platform.station and i.arrival
+                {"station": i.station, "time": i.arrival.strftime("%H:%M")}
+                for i in trip_stops[s.trip_id]
+                if i.sequence < s.sequence and i.arrival
             ]
-
-            station = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .join(models.Station)
-                .filter(models.Stop.trip_id == s.trip_id)
-                .order_by(models.Stop.sequence.asc())
-                .first()
-            ).original_track.platform.station.name if s.original_track and s.original_track.platform and s.original_track.platform.station else None
-
             d = {
-                "station": station,
+                "station": trip_stops[s.trip_id][0].station,
                 "time": s.arrival.strftime("%H:%M") if s.arrival else None,
-                "platform/track": s.original_track.platform.number + "/" + str(s.original_track.number) if s.original_track else None,
+                "platform/track": s.planned_platform + "/" + str(s.planned_track),
                 "intermediate": intermediate,
-                "train_type": s.trip.route.type.code if s.trip.route.type else None,
-                "train_number": s.trip.route.train_number,
-                "carrier": s.trip.route.carrier.code if s.trip.route.carrier else None,
+                "train_type": s.type_code,
+                "train_number": s.train_number,
+                "carrier": s.carrier_code,
             }
             display_data.append(d)
         return display_data
-    except Exception as e:
-        print(f"Błąd ({station_id}): {e}")
+    except Exception:
+        log.exception("Błąd danych infokiosku", extra={"station_id": station_id})
 
 # Infokiosk - odjazdy
 @router.get("/infokiosk-departures-data/{station_id}")
+@coalesce(request_flights)
 def infokiosk_departures_data(station_id: int, db: Session = Depends(database.get_db)):
-    print(f"Połączono z infokioskiem {station_id}")
+    log.debug("Połączono z infokioskiem", extra={"station_id": station_id})
     try:
-            stop = (
-                db.query(models.Stop)
-                .join(models.Track)
-                .join(models.Platform)
-                .filter(
-                    models.Platform.station_id == station_id,
-                    models.Stop.departure.isnot(None),
-                )
-                .options(
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                    joinedload(models.Stop.original_track)
-                    .joinedload(models.Track.platform)
-                    .joinedload(models.Platform.station),
-                )
-                .order_by(models.Stop.departure.asc())
-                .all()
-            )
-
-            if not stop:
-                raise HTTPException(status_code=404, detail="Brak odjazdów.")
-
-            display_data = []
-            for s in stop:
-                today = date.today()
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-                intermediate_data = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .join(models.Platform)
-                    .filter(
-                        models.Stop.trip_id == s.trip_id,
-                        models.Stop.sequence > s.sequence,
-                    )
-                    .options(
-                        joinedload(models.Stop.original_track)
-                        .joinedload(models.Track.platform)
-                        .joinedload(models.Platform.station)
-                    )
-                    .order_by(models.Stop.sequence.asc())
-                    .all()
-                )
-
-                intermediate = [
-                    {"station": i.original_track.platform.station.name, "time": i.departure.strftime("%H:%M")}
-                    for i in intermediate_data
-                    if i.original_track and i.original_track.platform and i.original_track.platform.station and i.departure
-                ]
-                d = {
-                    "station": s.trip.route.final_station.name if s.trip.route.final_station else None,
-                    "time": s.departure.strftime("%H:%M") if s.departure else None,
-                    "platform/track": s.original_track.platform.number + "/" + str(s.original_track.number) if s.original_track else None,
-                    "intermediate": intermediate,
-                    "train_type": s.trip.route.type.code if s.trip.route.type else None,
-                    "train_number": s.trip.route.train_number,
-                    "carrier": s.trip.route.carrier.code if s.trip.route.carrier else None,
-                }
-                display_data.append(d)
-            return display_data
-    except Exception as e:
-        print(f"Błąd ({station_id}): {e}")
+        today = rollover.today()
+        stop = queries.board_rows(db, station_id, today, "departure")
+
+        if not stop:
+            raise HTTPException(status_code=404, detail="Brak odjazdów.")
+
+        trip_stops = queries.trip_stop_rows(db, [s.trip_id for s in stop])
+
+        display_data = []
+        for s in stop:
+            intermediate = [
+                {"station": i.station, "time": i.departure.strftime("%H:%M")}
+                for i in trip_stops[s.trip_id]
+                if i.sequence > s.sequence and i.departure
+            ]
+            d = {
+                "station": s.final_station,
+                "time": s.departure.strftime("%H:%M") if s.departure else None,
+                "platform/track": s.planned_platform + "/" + str(s.planned_track),
+                "intermediate": intermediate,
+                "train_type": s.type_code,
+                "train_number": s.train_number,
+                "carrier": s.carrier_code,
+            }
+            display_data.append(d)
+        return display_data
+    except Exception:
+        log.exception("Błąd danych infokiosku", extra={"station_id": station_id})
 
 # Wyświetlacz krawędziowy
 @router.websocket("/edge-display-data/{track_id}")
 async def ws_edge_display_data(websocket: WebSocket, track_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Połączono z wyświetlaczem {track_id}")
-    
+    log.debug("Połączono z wyświetlaczem krawędziowym", extra={"track_id": track_id})
+
     station_id = (
         db.query(models.Track)
         .filter(models.Track.id == track_id)
@@ -825,132 +638,20 @@ async def ws_edge_display_data(websocket: WebSocket, track_id: int, db: Session
         .first()
         .platform.station_id
     )
+    # Dane budowane są we własnych sesjach - zwalniamy połączenie z puli na czas życia WebSocketu
+    db.close()
+    await serve_display(
+        websocket, station_id, track_id, ("edge", track_id),
+        lambda db, now: edge_display_data(db, station_id, track_id, now)
+    )
 
-    # Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    station_update_listeners[station_id].append(update_queue)
-    today = date.today()
-
-    try:
-        while True:
-            db.commit()
-            limit = (datetime.now() + timedelta(minutes=20))
-
-            stop_data = (
-                db.query(models.Stop)
-                .filter(models.Stop.departure.isnot(None))
-                .order_by(models.Stop.departure.asc())
-                .all()
-            )
-
-            current_datetime = datetime.now()
-            filtered_stops = []
-
-            for s in stop_data:
-                status = next((st for st in s.statuses if st.date == today), None)
-                if not status and s.original_track_id != track_id:
-                    continue
-                if status and status.is_cancelled:
-                    continue
-                if status and status.bus:
-                    continue
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-                if status and status.track is None and s.original_track_id != track_id:
-                    continue
-                if status and status.track_id != track_id:
-                    continue
-                
-                scheduled_departure = datetime.combine(current_datetime.date(), s.departure)
-                
-                delay_minutes = status.departure_delay if status and status.departure_delay is not None else 0
-                estimated_departure = scheduled_departure + timedelta(minutes=delay_minutes)
-                
-                if estimated_departure >= current_datetime and estimated_departure <= limit:
-                    s.estimated_departure_dt = estimated_departure
-                    filtered_stops = s
-                    break
-
-            stop = filtered_stops if filtered_stops else None
-
-            if not stop:
-                await websocket.send_text(json.dumps([])) # Pusta lista zamiast błędu, żeby wyczyścić ekran
-                sleep_time = 30 # Jeśli brak pociągów, sprawdź za 30 sekund
-            else:
-                display_data = (
-                    db.query(models.Stop)
-                    .options(
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                    )
-                    .filter(models.Stop.id == stop.id)
-                    .first()
-                )
-                # Pobieramy stacje pośrednie (po bieżącym przystanku)
-                intermediate_data = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .join(models.Platform)
-                    .filter(
-                        models.Stop.trip_id == display_data.trip_id,
-                        models.Stop.sequence > display_data.sequence,
-                    )
-                    .options(
-                        joinedload(models.Stop.original_track)
-                        .joinedload(models.Track.platform)
-                        .joinedload(models.Platform.station)
-                    )
-                    .order_by(models.Stop.departure.asc())
-                    .all()
-                )
-
-                intermediate = [
-                    i.original_track.platform.station.name
-                    for i in intermediate_data
-                    if i.original_track and i.original_track.platform and i.original_track.platform.station and i.original_track.platform.station.id != i.trip.route.final_station.id
-                ]
-                intermediate.pop()  # Usuwamy stację docelową
-                status = next((st for st in display_data.statuses if st.date == today), None)
-                data = {
-                    "station": display_data.trip.route.final_station.name if display_data.trip.route.final_station else "",
-                    "departure_time": display_data.departure.strftime("%H:%M") if display_data.departure else "",
-                    "departure_delay": status.departure_delay if status and status.departure_delay else 0,
-                    "train_type": display_data.trip.route.type.name if display_data.trip.route.type else "",
-                    "train_number": display_data.trip.route.train_number,
-                    "carrier": display_data.trip.route.carrier.name if display_data.trip.route.carrier else "",
-                    "intermediate": intermediate,
-                }
-
-                await websocket.send_text(json.dumps(data))
-                # Obliczanie czasu do następnego odświeżenia - gdy pierwszy pociąg na liście "odjedzie" (jego czas minie)
-                first_train_departure = stop.estimated_departure_dt
-                seconds_until_departure = (first_train_departure - datetime.now()).total_seconds()
-                
-                # Dodajno bufor (1 sekunda), żeby na pewno zniknął przy następnym pobraniu
-                # Oczekiwanie nie dłużej niż 60 sekund (health check) i nie krócej niż 5 sekund (żeby nie mrugało przy błędnych zegarach)
-                sleep_time = max(60, min(seconds_until_departure + 1, 60))
-            
-            # print(f"Czekam {sleep_time:.2f} sekund lub na edycję...")
-
-            # Inteligentne oczekiwanie
-            try:
-                # Oczekiwanie na sygnał z kolejki (od edit_timetable) PRZEZ określony czas (sleep_time)
-                await asyncio.wait_for(update_queue.get(), timeout=sleep_time)
-                # Jeśli kod tutaj dotrze, to znaczy, że update_queue.get() zwróciło wynik (nastąpiła edycja rozkladu)
-                print(f"Wykryto edycję dla stacji {station_id}! Natychmiastowe odświeżanie.")
-            except asyncio.TimeoutError:
-                # Jeśli minął czas timeout=sleep_time, rzucany jest wyjątek - nie wystąpiła edycja, ale czas minął
-                pass
-
-    except Exception as e:
-        print(f"Rozłączono ({track_id}): {e}")
-    finally:
-        # Usuwanie kolejki z listy listenerów po rozłączeniu
-        if station_id in station_update_listeners:
-            if update_queue in station_update_listeners[station_id]:
-                station_update_listeners[station_id].remove(update_queue)
+@router.get("/events/edge-display-data/{track_id}")
+def sse_edge_display_data(request: Request, track_id: int, db: Session = Depends(database.get_db)):
+    station_id = track_station_id(db, track_id)
+    return serve_display_events(
+        request, station_id, ("edge", track_id),
+        lambda db, now: edge_display_data(db, station_id, track_id, now)
+    )
 
 
 @router.get("/platforms/{station_id}")
@@ -1005,13 +706,9 @@ async def edit_display(display_id: int, data: schemas.DisplayUpdate, db: Session
 
     db.commit()
 
-    # powiadom WebSockety
-    if display_id in connected_clients:
-        for ws in list(connected_clients[display_id]):
-            try:
-                await ws.send_text(json.dumps({"updated": True}))
-            except:
-                pass
+    # powiadom WebSockety i strumienie SSE - wysyłają połączenia wyświetlaczy, edycja nie czeka na żadne z nich
+    appearance_versions[display_id] += 1
+    appearance_listeners.publish(display_id, appearance_versions[display_id], key="updated")
     return {"msg": "Wyświetlacz zaktualizowany pomyślnie"}
 
 @router.delete("/delete/{display_id}")
@@ -1028,16 +725,45 @@ def delete_display(display_id: int, db: Session = Depends(database.get_db)):
 @router.websocket("/appearance/{display_id}")
 async def ws_display(websocket: WebSocket, display_id: int):
     await websocket.accept()
-    print(f"Połączono WS z wyświetlaczem {display_id}")
-    clients = connected_clients.setdefault(display_id, set())
-    clients.add(websocket)
+    log.debug("Połączono z wyświetlaczem (wygląd)", extra={"display_id": display_id})
+    message = fast_json.dumps({"updated": True})
 
-    try:
+    async def receive():
         while True:
             await websocket.receive_text()
-    except:
-        pass
-    finally:
-        clients.remove(websocket)
-        if not clients:
-            del connected_clients[display_id]
\ No newline at end of file
+
+    with appearance_listeners.subscription(display_id) as updates:
+        async def send():
+            while True:
+                await updates.get()
+                await asyncio.wait_for(websocket.send_text(message), SEND_TIMEOUT)
+
+        # Połączenie kończy się rozłączeniem wyświetlacza albo błędem wysyłania (przekroczony czas, przepełnienie)
+        tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            if not task.cancelled() and isinstance(task.exception(), (Overflow, asyncio.TimeoutError)):
+                log.warning("Wyświetlacz nie nadąża - rozłączono", extra={"display_id": display_id})
+
+# Strumień SSE do powiadamiania o zmianach wyświetlacza
+@router.get("/events/appearance/{display_id}")
+def sse_display(request: Request, display_id: int):
+    last_event_id = request.headers.get("last-event-id")
+
+    async def events():
+        with appearance_listeners.subscription(display_id) as updates:
+            # Zmiana wyglądu, której wyświetlacz nie dostał przed ponownym połączeniem
+            if last_event_id is not None and last_event_id != str(appearance_versions[display_id]):
+                yield f"id: {appearance_versions[display_id]}\ndata: {fast_json.dumps({'updated': True})}\n\n"
+            while True:
+                try:
+                    version = await asyncio.wait_for(updates.get(), timeout=60)
+                    yield f"id: {version}\ndata: {fast_json.dumps({'updated': True})}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # komentarz SSE podtrzymujący połączenie
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
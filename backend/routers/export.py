@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import date
+from typing import Annotated, Optional
+from .. import feeds, rollover
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# Najdłuższy zakres dób eksportu tablicy jednym żądaniem
+MAX_EXPORT_DAYS = 31
+
+def attachment(filename: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+@router.get("/gtfs.zip")
+def export_gtfs():
+    """
+    Rozkład planowy (przewoźnicy, stacje i tory, trasy, kursy, kalendarze, postoje) jako archiwum GTFS.
+    """
+    return StreamingResponse(feeds.gtfs_chunks(), media_type="application/zip", headers=attachment("gtfs.zip"))
+
+@router.get("/gtfs-rt")
+def export_trip_updates(service_date: Annotated[Optional[date], Query(alias="date")] = None):
+    """
+    Opóźnienia, odwołania i zmiany torów bieżącej (lub wybranej) doby jako GTFS-Realtime TripUpdates (protobuf).
+    """
+    service_date = service_date or rollover.today()
+    return StreamingResponse(feeds.trip_update_chunks(service_date), media_type="application/x-protobuf")
+
+@router.get("/board.csv")
+def export_board(since: Optional[date] = None, until: Optional[date] = None):
+    """
+    Tablica wszystkich stacji (plan i statusy) dla doby lub zakresu dób jako CSV - domyślnie bieżąca doba.
+    """
+    since = since or rollover.today()
+    until = until or since
+    if since > until:
+        raise HTTPException(status_code=400, detail="Początek zakresu jest późniejszy niż koniec.")
+    if (until - since).days >= MAX_EXPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"Zakres może obejmować najwyżej {MAX_EXPORT_DAYS} dób.")
+    filename = f"board_{since.isoformat()}.csv" if since == until else f"board_{since.isoformat()}_{until.isoformat()}.csv"
+    return StreamingResponse(
+        feeds.board_csv_chunks(since, until), media_type="text/csv; charset=utf-8", headers=attachment(filename)
+    )
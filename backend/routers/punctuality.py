@@ -0,0 +1,93 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import date, timedelta
+from typing import Optional
+from .. import analytics, database, reference, rollover
+
+router = APIRouter(prefix="/punctuality", tags=["punctuality"])
+
+# Domyślny zakres statystyk: ostatnie 30 dób łącznie z bieżącą
+DEFAULT_DAYS = 30
+# Najdłuższy zakres ponownego przeliczenia liczników jednym żądaniem
+MAX_REBUILD_DAYS = 366
+
+def date_range(since: Optional[date], until: Optional[date]):
+    until = until or rollover.today()
+    since = since or until - timedelta(days=DEFAULT_DAYS - 1)
+    if since > until:
+        raise HTTPException(status_code=400, detail="Początek zakresu jest późniejszy niż koniec.")
+    return since, until
+
+def check_dimension(dimension: str):
+    if dimension not in analytics.DIMENSIONS:
+        raise HTTPException(status_code=404, detail=f"Nieznany podział statystyk. Dostępne: {', '.join(analytics.DIMENSIONS)}.")
+
+def summary(tally) -> dict:
+    return {
+        "stops": tally.stops,
+        "cancelled": tally.cancelled,
+        "bus": tally.bus,
+        "on_time_percent": tally.on_time_percent(),
+        "average_delay": tally.average_delay(),
+    }
+
+@router.get("/{dimension}")
+def get_punctuality_ranking(
+    dimension: str,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    Punktualność wszystkich grup podziału (np. stacji) w zakresie dób - od najmniej punktualnych.
+    """
+    check_dimension(dimension)
+    since, until = date_range(since, until)
+    data = reference.get()
+    tallies = analytics.tallies(dimension, since, until)
+    ranking = sorted(tallies.items(), key=lambda item: (item[1].on_time_percent(), -item[1].stops))[:limit]
+    return {
+        "since": since,
+        "until": until,
+        "on_time_minutes": analytics.ON_TIME_MINUTES,
+        "groups": [
+            {"key": key, "name": analytics.group_name(data, dimension, key), **summary(tally)}
+            for key, tally in ranking
+        ],
+    }
+
+@router.get("/{dimension}/{key}")
+def get_punctuality_details(dimension: str, key: str, since: Optional[date] = None, until: Optional[date] = None):
+    """
+    Punktualność jednej grupy: podsumowanie zakresu, rozkład opóźnień i punktualność w kolejnych dobach.
+    """
+    check_dimension(dimension)
+    since, until = date_range(since, until)
+    total = analytics.tallies(dimension, since, until, key=key).get(key)
+    if total is None:
+        raise HTTPException(status_code=404, detail="Brak danych dla tej grupy w podanym zakresie.")
+    days = analytics.tallies(dimension, since, until, key=key, by_day=True)
+    return {
+        "key": key,
+        "name": analytics.group_name(reference.get(), dimension, key),
+        "since": since,
+        "until": until,
+        "on_time_minutes": analytics.ON_TIME_MINUTES,
+        **summary(total),
+        "delays": total.distribution(),
+        "days": [{"date": day, **summary(tally)} for day, tally in sorted(days.items())],
+    }
+
+@router.post("/rebuild")
+def rebuild_punctuality(since: date, until: date):
+    """
+    Przelicza liczniki zamkniętych dób (np. po imporcie historii statusów).
+    Planowe postoje pochodzą z bieżącego rozkładu.
+    """
+    until = min(until, rollover.today() - timedelta(days=1))
+    if since > until or (until - since).days >= MAX_REBUILD_DAYS:
+        raise HTTPException(status_code=400, detail=f"Zakres musi obejmować od 1 do {MAX_REBUILD_DAYS} zamkniętych dób.")
+    day = since
+    while day <= until:
+        analytics.close_day(database.engine, day)
+        day += timedelta(days=1)
+    return {"msg": "Statystyki przeliczone", "days": (until - since).days + 1}
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Query
+from typing import Dict, List, Literal, Optional, Tuple
+import threading
+from .. import reference, rollover
+from ..utils.search_index import SearchIndex
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+class SearchIndexes:
+    """
+    Indeksy nazw stacji i pociągów zbudowane z jednej wersji danych referencyjnych.
+    Pociąg to numer z kategorią (np. "IC 102 Danubius") - trasy tego samego pociągu w różnych dniach są łączone.
+    """
+
+    def __init__(self, data: reference.ReferenceData):
+        self.version = data.version
+        self.stations = SearchIndex(
+            (name, {"type": "station", "id": station_id, "name": name}) for station_id, name in data.stations.items()
+        )
+
+        trains: Dict[Tuple[Optional[str], str], dict] = {}
+        self.train_trips: Dict[Tuple[Optional[str], str], List[str]] = {}
+        for route in data.routes.values():
+            key = (route.type_code, route.train_number)
+            if key not in trains:
+                trains[key] = {
+                    "type": "train",
+                    "name": f"{route.type_code or ''} {route.train_number}".strip(),
+                    "train_number": route.train_number,
+                    "category": route.type_name,
+                    "carrier": route.carrier_name,
+                    "final_station": route.final_station,
+                    "key": key,
+                }
+                self.train_trips[key] = []
+        for trip in data.trips.values():
+            self.train_trips[(trip.route.type_code, trip.route.train_number)].append(trip.trip_id)
+        self.trains = SearchIndex((train["name"], train) for train in trains.values())
+
+_indexes: Optional[SearchIndexes] = None
+_lock = threading.Lock()
+
+def search_indexes(data: reference.ReferenceData) -> SearchIndexes:
+    """
+    Indeksy aktualnej wersji danych referencyjnych - budowane ponownie po ich zmianie (reference.invalidate).
+    """
+    global _indexes
+    indexes = _indexes
+    if indexes is None or indexes.version != data.version:
+        with _lock:
+            if _indexes is None or _indexes.version != data.version:
+                _indexes = SearchIndexes(data)
+            indexes = _indexes
+    return indexes
+
+def first_stop_today(data: reference.ReferenceData, trip_ids: List[str]) -> Optional[int]:
+    """
+    Pierwszy postój kursu pociągu kursującego w bieżącej dobie (do /timetable/train/{stop_id}).
+    """
+    today = rollover.today()
+    for trip_id in trip_ids:
+        trip = data.trips[trip_id]
+        position = data.store.trip_index(trip_id)
+        if position is not None and trip.runs_on(today):
+            return data.store.stop_id[data.store.itinerary(position)[0]]
+    return None
+
+@router.get("")
+def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    type: Optional[Literal["station", "train"]] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Wyszukiwanie stacji i pociągów po początkach słów nazwy, bez polskich znaków i z tolerancją literówek
+    (np. "lodz kal" znajduje "Łódź Kaliska").
+    """
+    data = reference.get()
+    indexes = search_indexes(data)
+    results = []
+    if type in (None, "station"):
+        results += indexes.stations.search(q, limit)
+    if type in (None, "train"):
+        results += indexes.trains.search(q, limit)
+    results.sort(key=lambda result: (-result[0], len(result[1])))
+
+    response = []
+    for _, _, value in results[:limit]:
+        if value["type"] == "train":
+            trip_ids = indexes.train_trips[value["key"]]
+            value = {k: v for k, v in value.items() if k != "key"}
+            value["stop_id"] = first_stop_today(data, trip_ids)
+        response.append(value)
+    return response
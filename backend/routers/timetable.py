@@ -1,39 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload, contains_eager
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import or_
 from datetime import datetime, time, timedelta, date
-from .. import models, database, schemas
+from .. import models, database, schemas, queries, reference, rollover, logs, analytics
 import asyncio
+import os
 from typing import List, Dict
 from collections import defaultdict
-from typing import Optional, List, Tuple
+from typing import Annotated, Callable, Literal, Optional, List, Tuple
+from ..utils.track_occupancy import TrackOccupancyIndex
+from ..utils.track_reassignment import propose_track_changes
+from ..utils.single_flight import ThreadSingleFlight, coalesce
+from ..utils.fanout import Fanout
+from ..utils import estimated_times
 
 router = APIRouter(prefix="/timetable", tags=["timetable"])
+log = logs.get_logger("timetable")
 
-# Słownik przechowujący kolejki zdarzeń dla każdej stacji
-# Klucz: station_id (int), Wartość: Lista kolejek asyncio.Queue
-station_update_listeners: Dict[int, List[asyncio.Queue]] = defaultdict(list)
-voice_update_listeners: Dict[int, List[asyncio.Queue]] = defaultdict(list)
+# Odbiorcy zdarzeń dla każdej stacji (temat: station_id) - każde połączenie ma własny ograniczony bufor,
+# więc wolny wyświetlacz nie opóźnia edycji ani pozostałych wyświetlaczy
+station_update_listeners = Fanout()
+voice_update_listeners = Fanout()
+# Połączenie, które nie odbiera danych przez tyle sekund, jest zamykane (klient wznowi je z aktualnymi danymi)
+SEND_TIMEOUT = float(os.getenv("SEND_TIMEOUT_SECONDS", "10"))
+# Wersja danych rozkładu stacji - zwiększana przy każdej edycji, unieważnia zbudowane dane wyświetlaczy
+station_versions: Dict[int, int] = defaultdict(int)
+
+# Równoczesne identyczne zapytania do endpointów tablic (np. wiele infokiosków naraz) liczone są raz
+request_flights = ThreadSingleFlight()
+
+# Domyślny i najdłuższy zakres dób rozkładu stacji jednym żądaniem
+SCHEDULE_DAYS = 7
+MAX_SCHEDULE_DAYS = 31
+
+# Indeksy zajętości torów
+# Klucz: (station_id, data), Wartość: TrackOccupancyIndex
+track_occupancy_indexes: Dict[Tuple[int, date], TrackOccupancyIndex] = {}
 
 async def notify_station_update(station_id: int):
     """
     Funkcja pomocnicza do wysyłania sygnału odświeżenia 
     do wszystkich WebSocketów nasłuchujących na danej stacji.
     """
-    if station_id in station_update_listeners:
-        for queue in station_update_listeners[station_id]:
-            # Wrzucamy cokolwiek do kolejki, aby przerwać oczekiwanie (await)
-            await queue.put(True)
+    station_versions[station_id] += 1
+    # Kolejne sygnały przed odświeżeniem wyświetlacza łączą się w jeden
+    station_update_listeners.publish(station_id, True, key="refresh")
 
 async def notify_voice_update(station_id: int, stop_id: int):
     """
     Funkcja pomocnicza do wysyłania sygnału odświeżenia 
     do WebSocketów dla komunikatów głosowych nasłuchujących na danej stacji.
     """
-    if station_id in voice_update_listeners:
-        for queue in voice_update_listeners[station_id]:
-            # Wrzucamy id zmienionego postoju do kolejki, aby przerwać oczekiwanie (await)
-            await queue.put(stop_id)
+    # Kolejne zmiany tego samego postoju łączą się w jedną; kontroler, który nie nadąża, zostaje rozłączony
+    lagging = voice_update_listeners.publish(station_id, stop_id, key=stop_id)
+    if lagging:
+        log.warning("Kontrolery głosowe nie nadążają", extra={"station_id": station_id, "count": lagging})
 
 
 @router.get("/station/{station_id}")
@@ -43,350 +65,199 @@ def get_station_name(station_id: int, db: Session = Depends(database.get_db)):
         raise HTTPException(status_code=404, detail="Stacja nie znaleziona.")
     return {"id": station.id, "name": station.name}
 
-@router.get("/departures/{station_id}")
-def get_departures(station_id: int, db: Session = Depends(database.get_db)):
+def upcoming_board(fetch_rows: Callable[[date], List[queries.BoardRow]], field: str, now: datetime) -> List[queries.BoardRow]:
     """
-    Zwraca listę odjazdów ze stacji (dla danego station_id) uwzględniając kalendarz i statusy rzeczywiste.
+    Wiersze bieżącej doby, których czas rzeczywisty (`field` + opóźnienie) nie minął, oraz wiersze następnej doby
+    do godziny pierwszego z nich - uporządkowane według czasu rzeczywistego.
+    `fetch_rows(dzień)` zwraca wiersze queries.board_rows danej doby.
     """
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
-    current_datetime = datetime.now()
-
-    def get_stops_for_date(target_date: date):
-        return (
-            db.query(models.Stop)
-            .join(models.Trip)
-            .join(models.Track, models.Stop.original_track_id == models.Track.id)
-            .join(models.Platform, models.Track.platform_id == models.Platform.id)
-            .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == target_date))
-            .filter(
-                models.Platform.station_id == station_id,
-                models.Stop.departure.isnot(None),
-                models.Route.final_station_id != station_id
-            )
-            .options(
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                #joinedload(models.Stop.trip).joinedload(models.Trip.calendar),
-                #joinedload(models.Stop.original_track).joinedload(models.Track.platform),
-                contains_eager(models.Stop.statuses)
-            )
-            .all()
-        )
-
-    stops_today_raw = get_stops_for_date(today)
-    stops_tomorrow_raw = get_stops_for_date(tomorrow)
+    day_start = rollover.operating_day.start_minute
+    today, tomorrow = rollover.operating_day.window(now)
 
-    processed_stops = []
+    rows_today = fetch_rows(today)
+    planned, estimated = queries.row_times(rows_today, field, day_start)
+    now_minute = rollover.operating_day.minutes_since_midnight(today, now)
+    upcoming = estimated_times.argsort(estimated, estimated_times.window(estimated, now_minute))
 
-    # Przetwarzanie dzisiejszych odjazdów
-    for s in stops_today_raw:
-        if not s.trip.calendar.runs_on_date(today):
-            continue
-            
-        status = next((st for st in s.statuses if st.date == today), None)
-        
-        # Obliczanie czasu rzeczywistego do filtrowania i sortowania
-        delay = status.departure_delay if status and status.departure_delay else 0
-        planned_dt = datetime.combine(today, s.departure)
-        estimated_dt = planned_dt + timedelta(minutes=delay)
-
-        if estimated_dt >= current_datetime:
-            processed_stops.append({
-                "stop": s,
-                "status": status,
-                "estimated": estimated_dt,
-                "date": today
-            })
-
-    processed_stops.sort(key=lambda x: x['estimated'])
-    first_departure_time = processed_stops[0]['stop'].departure if processed_stops else time(23, 59, 59)
-
-    # Przetwarzanie jutrzejszych odjazdów (do czasu pierwszego dzisiejszego)
-    for s in stops_tomorrow_raw:
-        if not s.trip.calendar.runs_on_date(tomorrow):
-            continue
-            
-        if s.departure >= first_departure_time:
-            continue
+    # Jutrzejsze kursy tylko do godziny pierwszego dzisiejszego (bez niego - do końca jutrzejszej doby)
+    horizon = planned[upcoming[0]] + 1440 if upcoming else 2 * 1440 + day_start
+    rows_tomorrow = fetch_rows(tomorrow)
+    planned_tomorrow, estimated_tomorrow = queries.row_times(rows_tomorrow, field, day_start)
+    later = [i for i, minute in enumerate(planned_tomorrow) if minute + 1440 < horizon]
 
-        status = next((st for st in s.statuses if st.date == tomorrow), None)
-        delay = status.departure_delay if status else 0
-        estimated_dt = datetime.combine(tomorrow, s.departure) + timedelta(minutes=delay)
+    rows = [rows_today[i] for i in upcoming] + [rows_tomorrow[i] for i in later]
+    times = [estimated[i] for i in upcoming] + [estimated_tomorrow[i] + 1440 for i in later]
+    return [rows[i] for i in estimated_times.argsort(times)]
 
-        processed_stops.append({
-            "stop": s,
-            "status": status,
-            "estimated": estimated_dt,
-            "date": tomorrow
-        })
+def day_board(fetch_rows: Callable[[date], List[queries.BoardRow]], field: str, day: date) -> List[queries.BoardRow]:
+    """
+    Wszystkie wiersze doby `day` uporządkowane według czasu rzeczywistego - tablica na wybrany dzień.
+    """
+    return by_estimated_time(fetch_rows(day), field)
 
-    if not processed_stops:
-        raise HTTPException(status_code=404, detail="Brak odjazdów dla tej stacji.")
+def by_estimated_time(rows: List[queries.BoardRow], field: str) -> List[queries.BoardRow]:
+    _, estimated = queries.row_times(rows, field, rollover.operating_day.start_minute)
+    return [rows[i] for i in estimated_times.argsort(estimated, estimated_times.window(estimated))]
 
-    processed_stops.sort(key=lambda x: x['estimated'])
+def board(fetch_rows: Callable[[date], List[queries.BoardRow]], field: str, day: Optional[date]) -> List[queries.BoardRow]:
+    """
+    Bez `day` - najbliższe pociągi (upcoming_board), z `day` - cała wybrana doba.
+    """
+    if day is None:
+        return upcoming_board(fetch_rows, field, datetime.now())
+    return day_board(fetch_rows, field, day)
 
-    result = []
-    for item in processed_stops:
-        s = item['stop']
-        status = item['status']
-        
-        # Wyznaczanie aktualnego toru i peronu
-        # Jeśli w statusie jest track_id, musimy pobrać dane o tym torze
-        actual_track_id = status.track_id if (status and status.track_id) else s.original_track_id
-        
-        # Pobieramy obiekt toru (z cache SQLAlchemy dzięki joinedload/identity map)
-        actual_track = db.query(models.Track).options(joinedload(models.Track.platform)).filter(models.Track.id == actual_track_id).first()
-        
-        bus = False
-        # Obsługa pola delay: liczba lub "Odwołany"
-        display_delay = status.departure_delay if status else 0
-        if status and status.is_cancelled:
-            display_delay = "Odwołany"
-        elif status and status.bus:
-            bus = True
+@router.get("/departures/{station_id}")
+@coalesce(request_flights)
+def get_departures(station_id: int, db: Session = Depends(database.get_db),
+                   service_date: Annotated[Optional[date], Query(alias="date")] = None):
+    """
+    Zwraca listę odjazdów ze stacji (dla danego station_id) uwzględniając kalendarz i statusy rzeczywiste.
+    Z parametrem `date` - wszystkie odjazdy wybranej doby.
+    """
+    processed_stops = board(lambda day: queries.departure_rows(db, station_id, day), "departure", service_date)
 
-        result.append({
-            "id": s.id,
-            "station": s.trip.route.final_station.name if s.trip.route.final_station else None,
-            "train_number": s.trip.route.train_number,
-            "train_type": s.trip.route.type.code if s.trip.route.type else None,
-            "train_code": s.trip.route.type.code if s.trip.route.type else None,
-            "carrier": s.trip.route.carrier.name if s.trip.route.carrier else None,
-            "platform": actual_track.platform.number if actual_track and actual_track.platform else None,
-            "track": actual_track.number if actual_track else None,
-            "original": True if actual_track_id == s.original_track_id else False,
-            "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
-            "delay": display_delay,
-            "bus": bus,
-        })
+    if not processed_stops:
+        raise HTTPException(status_code=404, detail="Brak odjazdów dla tej stacji.")
 
-    return result
+    return [board_item(s, "departure", s.final_station) for s in processed_stops]
 
 @router.get("/arrivals/{station_id}")
-def get_timetable(station_id: int, db: Session = Depends(database.get_db)):
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
-    current_datetime = datetime.now()
-
-    def get_stops_for_date(target_date: date):
-        return (
-            db.query(models.Stop)
-            .join(models.Trip)
-            .join(models.Track, models.Stop.original_track_id == models.Track.id)
-            .join(models.Platform, models.Track.platform_id == models.Platform.id)
-            .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == target_date))
-            .filter(
-                models.Platform.station_id == station_id,
-                models.Stop.arrival.isnot(None),
-                models.Stop.sequence != 0
-            )
-            .options(
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-                #joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                #joinedload(models.Stop.original_track).joinedload(models.Track.platform),
-                contains_eager(models.Stop.statuses)
-            )
-            .all()
-        )
-
-    stops_today_raw = get_stops_for_date(today)
-    stops_tomorrow_raw = get_stops_for_date(tomorrow)
-
-    processed_stops = []
-
-    # Przetwarzanie dzisiejszych odjazdów
-    for s in stops_today_raw:
-        if not s.trip.calendar.runs_on_date(today):
-            continue
-            
-        status = next((st for st in s.statuses if st.date == today), None)
-        
-        # Obliczanie czasu rzeczywistego do filtrowania i sortowania
-        delay = status.arrival_delay if status and status.arrival_delay else 0
-        planned_dt = datetime.combine(today, s.arrival)
-        estimated_dt = planned_dt + timedelta(minutes=delay)
-
-        if estimated_dt >= current_datetime:
-            processed_stops.append({
-                "stop": s,
-                "status": status,
-                "estimated": estimated_dt,
-                "date": today
-            })
-
-    processed_stops.sort(key=lambda x: x['estimated'])
-    first_arrival_time = processed_stops[0]['stop'].arrival if processed_stops else time(23, 59, 59)
-
-    # Przetwarzanie jutrzejszych odjazdów (do czasu pierwszego dzisiejszego)
-    for s in stops_tomorrow_raw:
-        if not s.trip.calendar.runs_on_date(tomorrow):
-            continue
-            
-        if s.arrival >= first_arrival_time:
-            continue
-
-        status = next((st for st in s.statuses if st.date == tomorrow), None)
-        delay = status.arrival_delay if status else 0
-        estimated_dt = datetime.combine(tomorrow, s.arrival) + timedelta(minutes=delay)
-
-        processed_stops.append({
-            "stop": s,
-            "status": status,
-            "estimated": estimated_dt,
-            "date": tomorrow
-        })
+@coalesce(request_flights)
+def get_timetable(station_id: int, db: Session = Depends(database.get_db),
+                  service_date: Annotated[Optional[date], Query(alias="date")] = None):
+    processed_stops = board(lambda day: queries.arrival_rows(db, station_id, day), "arrival", service_date)
 
     if not processed_stops:
         raise HTTPException(status_code=404, detail="Brak przyjazdów dla tej stacji.")
 
-    processed_stops.sort(key=lambda x: x['estimated'])
+    # Stacje początkowe wszystkich kursów z danych referencyjnych
+    origin_stations = queries.origin_station_names(db, [s.trip_id for s in processed_stops])
 
-    result = []
-    for item in processed_stops:
-        s = item['stop']
-        status = item['status']
-        
-        # Wyznaczanie aktualnego toru i peronu
-        # Jeśli w statusie jest track_id, musimy pobrać dane o tym torze
-        actual_track_id = status.track_id if (status and status.track_id) else s.original_track_id
-        
-        # Pobieramy obiekt toru (z cache SQLAlchemy dzięki joinedload/identity map)
-        actual_track = db.query(models.Track).options(joinedload(models.Track.platform)).filter(models.Track.id == actual_track_id).first()
-        bus = False
-        # Obsługa pola delay: liczba lub "Odwołany"
-        display_delay = status.arrival_delay if status else 0
-        if status and status.is_cancelled:
-            display_delay = "Odwołany"
-        elif status and status.bus:
-             bus = True
-        
-        # stacja początkowa
-        station = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .join(models.Platform)
-                    .join(models.Station)
-                    .filter(models.Stop.trip_id == s.trip_id)
-                    .order_by(models.Stop.sequence.asc())
-                    .first()
-                ).original_track.platform.station.name if s.original_track and s.original_track.platform and s.original_track.platform.station else None
+    return [board_item(s, "arrival", origin_stations.get(s.trip_id)) for s in processed_stops]
 
-        result.append({
-            "id": s.id,
-            "station": station,
-            "train_number": s.trip.route.train_number,
-            "train_type": s.trip.route.type.code if s.trip.route.type else None,
-            "train_code": s.trip.route.type.code if s.trip.route.type else None,
-            "carrier": s.trip.route.carrier.name if s.trip.route.carrier else None,
-            "platform": actual_track.platform.number if actual_track and actual_track.platform else None,
-            "track": actual_track.number if actual_track else None,
-            "original": True if actual_track_id == s.original_track_id else False,
-            "arrival_time": s.arrival.strftime("%H:%M") if s.arrival else None,
-            "delay": display_delay,
-            "bus": bus,
-        })
+def board_item(s: queries.BoardRow, field: str, station: Optional[str]) -> dict:
+    """
+    Wiersz odpowiedzi tablicy odjazdów lub przyjazdów (`field`); `station` - stacja docelowa lub początkowa.
+    """
+    bus = False
+    # Obsługa pola delay: liczba lub "Odwołany"
+    display_delay = getattr(s, field + "_delay") if s.status_id else 0
+    if s.is_cancelled:
+        display_delay = "Odwołany"
+    elif s.bus:
+        bus = True
+
+    planned = getattr(s, field)
+    return {
+        "id": s.id,
+        "station": station,
+        "train_number": s.train_number,
+        "train_type": s.type_code,
+        "train_code": s.type_code,
+        "carrier": s.carrier_name,
+        "platform": s.platform,
+        "track": s.track,
+        "original": s.track_id == s.original_track_id,
+        field + "_time": planned.strftime("%H:%M") if planned else None,
+        "delay": display_delay,
+        "bus": bus,
+    }
 
-    return result
+@router.get("/schedule/{station_id}")
+def get_station_schedule(
+    station_id: int,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    field: Literal["departure", "arrival"] = "departure",
+    db: Session = Depends(database.get_db),
+):
+    """
+    Odjazdy lub przyjazdy stacji w zakresie dób (domyślnie tydzień od bieżącej doby), po jednej liście na dobę -
+    wiersze jak w /departures i /arrivals. Zakres rozwiązywany jest jednym przebiegiem (queries.schedule_rows),
+    a nie osobną tablicą dla każdej doby.
+    """
+    since = since or rollover.today()
+    until = until or since + timedelta(days=SCHEDULE_DAYS - 1)
+    if since > until:
+        raise HTTPException(status_code=400, detail="Początek zakresu jest późniejszy niż koniec.")
+    if (until - since).days >= MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Zakres może obejmować najwyżej {MAX_SCHEDULE_DAYS} dób.")
+
+    schedule = queries.schedule_rows(db, station_id, since, until, field)
+    if field == "arrival":
+        origins = queries.origin_station_names(db, [row.trip_id for _, rows in schedule for row in rows])
+        station = lambda row: origins.get(row.trip_id)
+    else:
+        station = lambda row: row.final_station
+
+    return [
+        {"date": day, "stops": [board_item(row, field, station(row)) for row in by_estimated_time(rows, field)]}
+        for day, rows in schedule
+    ]
 
 
 @router.get("/stop/{stop_id}")
-def get_stop_details(stop_id: int, db: Session = Depends(database.get_db)):
+def get_stop_details(stop_id: int, db: Session = Depends(database.get_db),
+                     service_date: Annotated[Optional[date], Query(alias="date")] = None):
     """
-    Zwraca szczegóły postoju (dla danego stop_id)
+    Zwraca szczegóły postoju (dla danego stop_id) ze statusem bieżącej lub wybranej doby
     """
-    today = date.today()
-    stop = (
-        db.query(models.Stop)
-        .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == date.today()))
-        .options(
-            joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-            joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.carrier),
-            joinedload(models.Stop.original_track).joinedload(models.Track.platform).joinedload(models.Platform.station),
-            contains_eager(models.Stop.statuses)
-        )
-        .filter(models.Stop.id == stop_id)
-        .first()
-    )
-
-    status = next((st for st in stop.statuses if st.date == date.today()), None)
-    if status:
-        platform = db.query(models.Platform).filter(models.Platform.id == status.track.platform_id).first()
-        track = db.query(models.Track).filter(models.Track.id == status.track_id).first()
-    else:
-        platform = db.query(models.Platform).filter(models.Platform.id == stop.original_track.platform_id).first()
-        track = db.query(models.Track).filter(models.Track.id == stop.original_track_id).first()
-    
+    today = service_date or rollover.today()
+    data = reference.get(db, stop_ids=(stop_id,))
+    stop = data.stop(stop_id)
 
     if not stop:
         raise HTTPException(status_code=404, detail="Postój nie znaleziony.")
 
+    route = data.trips[stop.trip_id].route
+    status = queries.statuses_for(db, [stop_id], today).get(stop_id)
+    track = data.tracks.get(status.track_id if status and status.track_id else stop.original_track_id)
+
     return {
         "id": stop.id,
-        "train_number": stop.trip.route.train_number,
-        "train_type": stop.trip.route.type.name if stop.trip.route.type else None,
-        "carrier": stop.trip.route.carrier.name if stop.trip.route.carrier else None,
-        "final_station": stop.trip.route.final_station.name if stop.trip.route.final_station else None,
-        "station": stop.original_track.platform.station.name if stop.original_track.platform.station else None,
-        "station_id": stop.original_track.platform.station.id if stop.original_track.platform.station else None,
+        "train_number": route.train_number,
+        "train_type": route.type_name,
+        "carrier": route.carrier_name,
+        "final_station": route.final_station,
+        "station": stop.station,
+        "station_id": stop.station_id,
         "arrival": stop.arrival.strftime("%H:%M") if stop.arrival else None,
         "departure": stop.departure.strftime("%H:%M") if stop.departure else None,
         "arrival_delay": status.arrival_delay if status else None,
         "departure_delay": status.departure_delay if status else None,
         "track_id": track.id if track else None,
-        "platform_id": platform.id if platform else None,
+        "platform_id": track.platform_id if track else None,
         "is_cancelled": status.is_cancelled if status else False,
         "bus": status.bus if status else False,
     }
 
 @router.get("/train/{train_id}")
-def get_train_details(train_id: int, db: Session = Depends(database.get_db)):
+def get_train_details(train_id: int, db: Session = Depends(database.get_db),
+                      service_date: Annotated[Optional[date], Query(alias="date")] = None):
     """
-    Zwraca szczegóły trasy pociągu (dla danego train_id)
+    Zwraca szczegóły trasy pociągu (dla danego train_id) ze statusami bieżącej lub wybranej doby
     """
-    trip_id = db.query(models.Stop.trip_id).filter(models.Stop.id == train_id).scalar()
-    trip = (
-        db.query(models.Trip)
-        .options(
-            joinedload(models.Trip.route).joinedload(models.Route.type),
-            joinedload(models.Trip.route).joinedload(models.Route.carrier),
-        )
-        .filter(models.Trip.trip_id == trip_id)
-        .first()
-    )
+    data = reference.get(db, stop_ids=(train_id,))
+    trip = data.trip_of(train_id)
 
     if not trip:
         raise HTTPException(status_code=404, detail="Pociąg nie znaleziony.")
 
-    stops = (
-        db.query(models.Stop)
-        .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == date.today()))
-        .options(
-            joinedload(models.Stop.original_track).joinedload(models.Track.platform),
-            contains_eager(models.Stop.statuses)
-        )
-        .filter(models.Stop.trip_id == trip_id)
-        .order_by(models.Stop.sequence)
-        .all()
-    )
-    
+    today = service_date or rollover.today()
+    stops = data.itinerary(trip.trip_id)
+    statuses = queries.statuses_for(db, [stop.id for stop in stops], today)
+
     stops_details = []
     for stop in stops:
-        status = next((st for st in stop.statuses if st.date == date.today()), None)
-        if status:
-            platform = db.query(models.Platform).filter(models.Platform.id == status.track.platform_id).first()
-            track = db.query(models.Track).filter(models.Track.id == status.track_id).first()
-        else:
-            platform = db.query(models.Platform).filter(models.Platform.id == stop.original_track.platform_id).first()
-            track = db.query(models.Track).filter(models.Track.id == stop.original_track_id).first()
+        status = statuses.get(stop.id)
+        track = data.tracks.get(status.track_id if status and status.track_id else stop.original_track_id)
         stops_details.append({
             "id": stop.id,
-            "station": platform.station.name if platform and platform.station else None,
+            "station": data.stations.get(track.station_id) if track else None,
             "arrival_time": stop.arrival.strftime("%H:%M") if stop.arrival else None,
             "departure_time": stop.departure.strftime("%H:%M") if stop.departure else None,
-            "platform": platform.number if platform else None,
+            "platform": track.platform if track else None,
             "track": track.number if track else None,
             "original": False if status and stop.original_track_id!=status.track_id else True,
             "arrival_delay": status.arrival_delay if status else None,
@@ -397,195 +268,255 @@ def get_train_details(train_id: int, db: Session = Depends(database.get_db)):
 
     return {
         "train_number": trip.route.train_number,
-        "train_type": trip.route.type.name if trip.route.type else None,
-        "carrier": trip.route.carrier.name if trip.route.carrier else None,
-        "final_station": trip.route.final_station.name if trip.route.final_station else None,
+        "train_type": trip.route.type_name,
+        "carrier": trip.route.carrier_name,
+        "final_station": trip.route.final_station,
+        "date": today,
+        "runs": trip.runs_on(today),
         "stops": stops_details,
     }
 
+def get_minutes(t, delay=0):
+    """Pomocnicza funkcja konwertująca Time (z opóźnieniem) na minuty od północy."""
+    return estimated_times.delayed_minute(reference.time_minutes(t), delay)
+
+def format_minutes(minutes: int) -> str:
+    """Formatuje minuty od północy z powrotem na HH:MM."""
+    h, m = divmod(minutes % 1440, 60)
+    return f"{h:02d}:{m:02d}"
+
+def stop_occupancy(stop, status: Optional[models.StopStatus]):
+    """
+    Zwraca (track_id, przyjazd, odjazd) postoju w minutach od północy z uwzględnieniem statusu,
+    lub None jeśli postój nie zajmuje toru (odwołany lub zastąpiony autobusem).
+    """
+    if status and (status.is_cancelled or status.bus):
+        return None
+    track_id = status.track_id if (status and status.track_id) else stop.original_track_id
+    arr_min = get_minutes(stop.arrival, status.arrival_delay if status else 0)
+    dep_min = get_minutes(stop.departure, status.departure_delay if status else 0)
+    return track_id, arr_min, dep_min
+
+def get_track_occupancy_index(db: Session, station_id: int, target_date: date) -> TrackOccupancyIndex:
+    """
+    Zwraca indeks zajętości torów stacji dla danego dnia.
+    Indeks budowany jest jednym zapytaniem przy pierwszym użyciu, a potem aktualizowany przyrostowo przez edit_timetable.
+    Zachowywane są tylko indeksy bieżącej i następnej doby - pozostałe dni budowane są dla pojedynczego żądania.
+    Po zmianie danych referencyjnych (reference.invalidate) indeks budowany jest ponownie.
+    """
+    key = (station_id, target_date)
+    data = reference.get(db)
+    index = track_occupancy_indexes.get(key)
+    if index is not None and index.version == data.version:
+        return index
+
+    # Usuwamy indeksy z minionych dób (indeks następnej doby może być budowany z wyprzedzeniem)
+    today = rollover.today()
+    evict_track_occupancy_indexes(today)
+
+    # Planowe postoje stacji z magazynu kolumnowego, z bazy tylko statusy na dany dzień
+    statuses = queries.station_statuses(db, station_id, target_date)
+    running = data.store.running(target_date)
+
+    index = TrackOccupancyIndex(data.version)
+    for position in data.store.station_stops(station_id):
+        if not running[data.store.trip[position]]:
+            continue
+        s = reference.ItineraryStop(data, position)
+        occupancy = stop_occupancy(s, statuses.get(s.id))
+        if occupancy:
+            index.add(s.id, *occupancy)
+
+    if today <= target_date <= today + timedelta(days=1):
+        track_occupancy_indexes[key] = index
+    return index
+
+def evict_track_occupancy_indexes(current_date: date):
+    for old_key in [k for k in track_occupancy_indexes if k[1] < current_date]:
+        del track_occupancy_indexes[old_key]
+
+def warm_track_occupancy_indexes(station_ids: List[int], target_date: date):
+    db = database.SessionLocal()
+    try:
+        for station_id in station_ids:
+            get_track_occupancy_index(db, station_id, target_date)
+    finally:
+        db.close()
+
+@rollover.on_warm_up
+async def prepare_next_day(next_date: date):
+    """
+    Przed zmianą doby buduje indeksy zajętości torów następnej doby dla stacji, które już ich używają.
+    """
+    station_ids = sorted({station_id for station_id, day in track_occupancy_indexes if day < next_date})
+    if station_ids:
+        await run_in_threadpool(warm_track_occupancy_indexes, station_ids, next_date)
+
+@rollover.on_rollover
+async def start_new_day(new_date: date):
+    """
+    Po zmianie doby usuwa dane minionej doby i odświeża wszystkie podłączone wyświetlacze.
+    """
+    evict_track_occupancy_indexes(new_date)
+    for station_id in list(station_update_listeners):
+        await notify_station_update(station_id)
+
 # Lista dostępnych torów do zmiany dla danego postoju
 @router.get("/tracks/{stop_id}")
-def get_tracks(stop_id: int, db: Session = Depends(database.get_db)):
-    today = date.today()
-
-    def is_collision(
-        a_arrival: Optional[int],
-        a_departure: Optional[int],
-        b_arrival: Optional[int],
-        b_departure: Optional[int]
-    ) -> bool:
-
-        def get_segments(arr: Optional[int], dep: Optional[int]) -> List[Tuple[int, int]]:
-            if arr is None and dep is None:
-                return []
-            
-            start, end = 0, 0
-            if arr is None:
-                start, end = dep, dep + 5
-            elif dep is None:
-                start, end = arr, arr + 5
-            else:
-                start, end = arr, dep
-
-            if end < start:
-                return [(start, 1440), (0, end)]
-            
-            return [(start, end)]
-
-        def segments_collide(s1: Tuple[int, int], s2: Tuple[int, int]) -> bool:
-            return not (s1[1] <= s2[0] or s2[1] <= s1[0])
-
-        segments_a = get_segments(a_arrival, a_departure)
-        segments_b = get_segments(b_arrival, b_departure)
-
-        if not segments_a or not segments_b:
-            return False
-
-        for seg_a in segments_a:
-            for seg_b in segments_b:
-                if segments_collide(seg_a, seg_b):
-                    return True
-
-        return False
-
-    def get_minutes(t, delay=0):
-        """Pomocnicza funkcja konwertująca Time na minuty od północy."""
-        if t is None: return None
-        return (t.hour * 60 + t.minute + (delay or 0)) % 1440
-
-    # 1. Pobieramy szczegóły wybranego postoju
-    stop = (
-        db.query(models.Stop)
-        .options(
-            joinedload(models.Stop.trip).joinedload(models.Trip.route),
-            joinedload(models.Stop.statuses)
-        )
-        .filter(models.Stop.id == stop_id)
-        .first()
-    )
+def get_tracks(stop_id: int, db: Session = Depends(database.get_db),
+               service_date: Annotated[Optional[date], Query(alias="date")] = None):
+    today = service_date or rollover.today()
+
+    # 1. Pobieramy szczegóły wybranego postoju (z danych referencyjnych)
+    data = reference.get(db, stop_ids=(stop_id,))
+    stop = data.stop(stop_id)
     
     if not stop:
         raise HTTPException(status_code=404, detail="Postój nie znaleziony.")
 
-    # 2. Pobieramy station_id (poprzez strukturę peronów)
-    platform = (
-        db.query(models.Platform)
-        .join(models.Track, models.Track.platform_id == models.Platform.id)
-        .join(models.Stop, models.Stop.original_track_id == models.Track.id)
-        .filter(models.Stop.id == stop_id)
-        .first()
-    )
+    # 2. Stacja postoju (poprzez strukturę peronów)
+    station_id = stop.station_id
     
-    if not platform:
+    if station_id is None:
         raise HTTPException(status_code=404, detail="Stacja nie znaleziona.")
-    
-    station_id = platform.station_id
 
     # 3. Wyznaczamy parametry czasowe naszego pociągu (w minutach)
-    my_status = next((st for st in stop.statuses if st.date == today), None)
+    my_status = queries.statuses_for(db, [stop_id], today).get(stop_id)
     my_arr_min = get_minutes(stop.arrival, my_status.arrival_delay if my_status else 0)
     my_dep_min = get_minutes(stop.departure, my_status.departure_delay if my_status else 0)
 
-    # 4. OPTYMALIZACJA: Pobieramy WSZYSTKIE inne dzisiejsze pociągi na tej stacji naraz
-    # Pozwala to uniknąć zapytań SQL wewnątrz pętli po torach.
-    other_station_stops = (
-        db.query(models.Stop)
-        .join(models.Trip)
-        .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-        .filter(models.Stop.id != stop_id)
-        .join(models.Track, models.Stop.original_track_id == models.Track.id)
-        .join(models.Platform, models.Track.platform_id == models.Platform.id)
-        .filter(models.Platform.station_id == station_id)
-        .options(
-            contains_eager(models.Stop.statuses),
-            joinedload(models.Stop.trip)
-        )
-        .all()
-    )
+    # 4. Indeks zajętości torów stacji na wybraną dobę (budowany raz, potem aktualizowany przy edycjach)
+    occupancy = get_track_occupancy_index(db, station_id, today)
 
-    # 5. Pobieramy listę wszystkich dostępnych torów na stacji
-    all_tracks = (
-        db.query(models.Track)
-        .join(models.Platform)
-        .filter(models.Platform.station_id == station_id)
-        .options(joinedload(models.Track.platform))
-        .all()
-    )
+    # 5. Lista wszystkich dostępnych torów na stacji
+    all_tracks = [t for t in data.tracks.values() if t.station_id == station_id]
 
     result = []
     for t in all_tracks:
-        collision = False
-        next_arrival_dt = None
-
-        for os in other_station_stops:
-            # Sprawdzamy kalendarz (czy kursuje dzisiaj)
-            if not os.trip.calendar.runs_on_date(today):
-                continue
-            
-            os_status = next((st for st in os.statuses if st.date == today), None)
-            
-            # Odwołane pociągi i autobusy nie zajmują torów kolejowych
-            if os_status and (os_status.is_cancelled or os_status.bus):
-                continue
-
-            # Sprawdzamy na jakim torze znajduje się pociąg (plan vs status)
-            actual_track_id = os_status.track_id if (os_status and os_status.track_id) else os.original_track_id
-            if actual_track_id != t.id:
-                continue
-
-            # Pobieramy czasy innego pociągu
-            os_arr_min = get_minutes(os.arrival, os_status.arrival_delay if os_status else 0)
-            os_dep_min = get_minutes(os.departure, os_status.departure_delay if os_status else 0)
-
-            # 6. SPRAWDZANIE KOLIZJI (wykorzystuje Twoją nową logikę z track_collision.py)
-            if is_collision(my_arr_min, my_dep_min, os_arr_min, os_dep_min):
-                collision = True
-                break
-
-            # 7. Wyznaczanie dostępności (najbliższy pociąg po naszym odjeździe)
-            # Logika pomocnicza dla frontendu
-            if os_arr_min is not None:
-                # Uproszczone wyznaczanie pociągu przyjeżdżającego "później"
-                # (W systemach czasu rzeczywistego zwykle porównuje się to w skali liniowej dnia)
-                if my_dep_min is not None and os_arr_min >= my_dep_min:
-                    if next_arrival_dt is None or os_arr_min < next_arrival_dt:
-                        next_arrival_dt = os_arr_min
-
-        if not collision:
-            # Formatuje minuty z powrotem na HH:MM
-            available_time = None
-            if next_arrival_dt is not None:
-                h, m = divmod(next_arrival_dt, 60)
-                available_time = f"{h:02d}:{m:02d}"
-
-            result.append({
-                "id": t.id,
-                "number": t.number,
-                "platform_number": t.platform.number if t.platform else None,
-                "available_to": available_time,
-            })
+        # 6. SPRAWDZANIE KOLIZJI - wyszukiwanie binarne w indeksie zamiast przeglądania wszystkich postojów
+        if occupancy.collides(t.id, my_arr_min, my_dep_min, exclude=stop_id):
+            continue
+
+        # 7. Wyznaczanie dostępności (najbliższy pociąg po naszym odjeździe)
+        next_arrival = occupancy.available_until(t.id, my_dep_min, exclude=stop_id)
+
+        result.append({
+            "id": t.id,
+            "number": t.number,
+            "platform_number": t.platform,
+            "available_to": format_minutes(next_arrival) if next_arrival is not None else None,
+        })
 
     return result
 
+# Kolizje torowe na stacji (plan + opóźnienia i zmiany torów z dzisiejszych statusów)
+@router.get("/conflicts/{station_id}")
+def get_track_conflicts(station_id: int, db: Session = Depends(database.get_db),
+                        service_date: Annotated[Optional[date], Query(alias="date")] = None):
+    """
+    Zwraca wszystkie pary postojów zajmujących ten sam tor w tym samym czasie (bieżącej lub wybranej doby).
+    Kolizje wyliczane są z indeksu zajętości torów, który edit_timetable aktualizuje przyrostowo.
+    """
+    today = service_date or rollover.today()
+    occupancy = get_track_occupancy_index(db, station_id, today)
+    conflicts = occupancy.conflicts()
+    if not conflicts:
+        return []
+
+    data = reference.get(db)
+
+    rows = []
+    for track_id, track_conflicts in conflicts.items():
+        track = data.tracks.get(track_id)
+        for a, b, start, end in track_conflicts:
+            rows.append((start, {
+                "track_id": track_id,
+                "track": track.number if track else None,
+                "platform": track.platform if track else None,
+                "from": format_minutes(start),
+                "to": format_minutes(end),
+                "stops": [
+                    {
+                        "id": stop_id,
+                        "train_number": data.train_number(stop_id),
+                    }
+                    for stop_id in (a, b)
+                ],
+            }))
+
+    rows.sort(key=lambda x: x[0])
+    return [row for _, row in rows]
+
+# Propozycja zmian torów usuwająca kolizje w najbliższym czasie
+@router.get("/conflicts/{station_id}/resolve")
+def resolve_track_conflicts(station_id: int, horizon: int = Query(120, ge=1, le=1439),
+                            db: Session = Depends(database.get_db)):
+    """
+    Proponuje minimalny zestaw zmian torów usuwający kolizje w ciągu najbliższych `horizon` minut.
+    Lista "changes" ma format /timetable/edit-bulk i może zostać do niego przesłana bez zmian.
+    """
+    # Horyzont w minutach bieżącej doby przewozowej, jak na tablicach - kończy się razem z dobą,
+    # bo indeks zajętości zawiera tylko jej postoje (minuty od północy, początek doby po końcu)
+    now = datetime.now()
+    today = rollover.operating_day.service_date(now)
+    now_minute = int(rollover.operating_day.minutes_since_midnight(today, now))
+    end_minute = min(now_minute + horizon, rollover.operating_day.start_minute + 1440)
+
+    occupancy = get_track_occupancy_index(db, station_id, today)
+    data = reference.get(db)
+    tracks = {track_id: t for track_id, t in data.tracks.items() if t.station_id == station_id}
+
+    changes, unresolved = propose_track_changes(
+        occupancy.entries(),
+        {track_id: t.platform_id for track_id, t in tracks.items()},
+        (now_minute % 1440, end_minute % 1440)
+    )
 
-@router.put("/edit/{id}")
-async def edit_timetable(id: int, data: schemas.StopStatusUpdate, db: Session = Depends(database.get_db)): # Zmieniono na async def
+    statuses = queries.statuses_for(db, [stop_id for stop_id, _, _ in changes], today)
+
+    result = []
+    for stop_id, old_track_id, new_track_id in changes:
+        status = statuses.get(stop_id)
+        new_track = tracks.get(new_track_id)
+        result.append({
+            "stop_id": stop_id,
+            "track_id": new_track_id,
+            "arrival_delay": status.arrival_delay if status else 0,
+            "departure_delay": status.departure_delay if status else 0,
+            "is_cancelled": False,
+            "bus": False,
+            "previous_track_id": old_track_id,
+            "train_number": data.train_number(stop_id),
+            "track": new_track.number if new_track else None,
+            "platform": new_track.platform if new_track else None,
+        })
+
+    return {
+        "changes": result,
+        "unresolved": [
+            {"stop_id": stop_id, "train_number": data.train_number(stop_id)}
+            for stop_id in unresolved
+        ],
+    }
+
+
+def save_stop_status(db: Session, stop_id: int, data: schemas.StopStatusUpdate, today: date) -> models.Stop:
     """
-    Edytuje szczegóły postoju i wymusza odświeżenie ekranów.
+    Zapisuje w sesji (bez commita) zmiany statusu postoju na dany dzień.
     """
     stop = (
         db.query(models.Stop)
-        .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == date.today()))
+        .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
         .options(contains_eager(models.Stop.statuses))
-        .filter(models.Stop.id == id)
+        .filter(models.Stop.id == stop_id)
         .first()
     )
-    today = date.today()
-    status = next((st for st in stop.statuses if st.date == today), None)
 
     if not stop:
         raise HTTPException(status_code=404, detail="Postój nie znaleziony.")
 
+    status = next((st for st in stop.statuses if st.date == today), None)
+
     if status:
         # Aktualizacja pól
         status.arrival_delay = data.arrival_delay
@@ -597,7 +528,7 @@ async def edit_timetable(id: int, data: schemas.StopStatusUpdate, db: Session =
         # Tworzenie nowego statusu
         new_status = models.StopStatus(
             stop_id=stop.id,
-            date=date.today(),
+            date=today,
             arrival_delay=data.arrival_delay or 0,
             departure_delay=data.departure_delay or 0,
             is_cancelled=data.is_cancelled or False,
@@ -606,25 +537,123 @@ async def edit_timetable(id: int, data: schemas.StopStatusUpdate, db: Session =
         )
         db.add(new_status)
 
+    return stop
+
+def update_track_occupancy(stop: models.Stop, today: date, data: reference.ReferenceData):
+    """
+    Przyrostowa aktualizacja indeksu zajętości torów po zapisaniu statusu (jeśli indeks został już zbudowany).
+    """
+    station_id = stop.original_track.platform.station_id
+    occupancy = track_occupancy_indexes.get((station_id, today))
+    # Indeks ze starszych danych referencyjnych zostanie zbudowany od nowa przy następnym użyciu
+    if occupancy is None or occupancy.version != data.version:
+        return
+
+    status = next((st for st in stop.statuses if st.date == today), None)
+    trip = data.trip_of(stop.id)
+    current_occupancy = stop_occupancy(stop, status) if trip and trip.runs_on(today) else None
+    if current_occupancy:
+        occupancy.update(stop.id, *current_occupancy)
+    else:
+        occupancy.remove(stop.id)
+
+def edit_date(data: schemas.StopStatusUpdate, today: date) -> date:
+    """
+    Doba, której dotyczy zmiana statusu - minione doby są już rozliczone i nie mogą być zmieniane.
+    """
+    day = data.date or today
+    if day < today:
+        raise HTTPException(status_code=400, detail="Nie można zmieniać statusów minionych dób.")
+    return day
+
+def is_displayed(day: date, today: date) -> bool:
+    """Czy doba jest widoczna na tablicach (bieżąca i początek następnej)."""
+    return day <= today + timedelta(days=1)
+
+@router.put("/edit/{id}")
+async def edit_timetable(id: int, data: schemas.StopStatusUpdate, db: Session = Depends(database.get_db)): # Zmieniono na async def
+    """
+    Edytuje szczegóły postoju (bieżącej lub wybranej przyszłej doby) i wymusza odświeżenie ekranów.
+    """
+    today = rollover.today()
+    day = edit_date(data, today)
+    stop = save_stop_status(db, id, data, day)
+
     db.commit()
     db.refresh(stop)
 
+    # Ewentualne ponowne wczytanie danych referencyjnych (pięć zapytań) poza pętlą zdarzeń
+    reference_data = await run_in_threadpool(reference.get, db, stop_ids=(stop.id,))
+    update_track_occupancy(stop, day, reference_data)
+    analytics.record_status(stop, day, reference_data)
+
+    # Zmiana dalszej doby nie jest jeszcze widoczna na wyświetlaczach
+    if not is_displayed(day, today):
+        return {"msg": "Postój zaktualizowany pomyślnie", "id": stop.id}
+
     # --- NOWOŚĆ: Powiadamianie WebSocketów ---
     # Musimy znaleźć station_id, do którego należy ten postój.
     # Ścieżka: Stop -> Track -> Platform -> Station
     try:
-        # Pobieramy obiekt z relacjami, żeby dostać się do ID stacji
-        station_id = status.track.platform.station_id if status and status.track and status.track.platform else stop.original_track.platform.station_id
+        station_id = stop.original_track.platform.station_id
         await notify_station_update(station_id)
-        print(f"Wysłano sygnał odświeżenia dla stacji ID: {station_id}")
-    except Exception as e:
-        print(f"Błąd podczas powiadamiania WS: {e}")
+        log.debug("Wysłano sygnał odświeżenia", extra={"station_id": station_id})
+    except Exception:
+        log.exception("Błąd podczas powiadamiania WebSocketów")
+
+    # Kontrolery głosowe zapowiadają statusy bieżącej doby
+    if day != today:
+        return {"msg": "Postój zaktualizowany pomyślnie", "id": stop.id}
 
     try:
-        station_id = status.track.platform.station_id if status and status.track and status.track.platform else stop.original_track.platform.station_id
+        station_id = stop.original_track.platform.station_id
         await notify_voice_update(station_id, id)
-        print(f"Wysłano sygnał komunikatu dla stacji ID: {station_id}")
-    except Exception as e:
-        print(f"Błąd podczas powiadamiania WS: {e}")
+        log.debug("Wysłano sygnał komunikatu", extra={"station_id": station_id})
+    except Exception:
+        log.exception("Błąd podczas powiadamiania WebSocketów")
 
     return {"msg": "Postój zaktualizowany pomyślnie", "id": stop.id}
+
+@router.put("/edit-bulk")
+async def edit_timetable_bulk(data: List[schemas.StopStatusBulkUpdate], db: Session = Depends(database.get_db)):
+    """
+    Edytuje wiele postojów w jednej transakcji (np. propozycję z /conflicts/{station_id}/resolve).
+    Każda stacja dostaje jeden sygnał odświeżenia niezależnie od liczby zmienionych postojów.
+    """
+    today = rollover.today()
+    days = [edit_date(item, today) for item in data]
+    # Drugi status tego samego postoju i doby nie widzi pierwszego (nie ma go jeszcze w bazie) - byłyby dwa wiersze
+    edited = [(item.stop_id, day) for item, day in zip(data, days)]
+    if len(set(edited)) != len(edited):
+        raise HTTPException(status_code=422, detail="Postój występuje w zmianach tej samej doby więcej niż raz.")
+    stops = [save_stop_status(db, item.stop_id, item, day) for item, day in zip(data, days)]
+
+    db.commit()
+
+    # Ewentualne ponowne wczytanie danych referencyjnych (pięć zapytań) poza pętlą zdarzeń
+    reference_data = await run_in_threadpool(reference.get, db, stop_ids=[stop.id for stop in stops])
+    station_ids = []
+    announced = []
+    for stop, day in zip(stops, days):
+        db.refresh(stop)
+        update_track_occupancy(stop, day, reference_data)
+        analytics.record_status(stop, day, reference_data)
+        if not is_displayed(day, today):
+            continue
+        # Kontrolery głosowe zapowiadają statusy bieżącej doby
+        if day == today:
+            announced.append(stop)
+        station_id = stop.original_track.platform.station_id
+        if station_id not in station_ids:
+            station_ids.append(station_id)
+
+    try:
+        for station_id in station_ids:
+            await notify_station_update(station_id)
+        for stop in announced:
+            await notify_voice_update(stop.original_track.platform.station_id, stop.id)
+        log.debug("Wysłano sygnał odświeżenia", extra={"station_ids": station_ids})
+    except Exception:
+        log.exception("Błąd podczas powiadamiania WebSocketów")
+
+    return {"msg": "Postoje zaktualizowane pomyślnie", "ids": [stop.id for stop in stops]}
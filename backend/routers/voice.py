@@ -4,16 +4,16 @@ from fastapi.responses import Response
 from elevenlabs.client import ElevenLabs
 from elevenlabs import VoiceSettings
 from fastapi import APIRouter, WebSocket, Depends
-from sqlalchemy.orm import Session, joinedload, contains_eager
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
+from array import array
 import asyncio
-import json
-from .. import models, database, schemas
-from sqlalchemy import or_, func, text
-from sqlalchemy.dialects import postgresql
+from .. import models, database, schemas, queries, reference, rollover, metrics, logs
 from dotenv import load_dotenv
 import os
-from .timetable import voice_update_listeners # Słownik kolejek zdarzeń dla komunikatów głosowych
+from .timetable import voice_update_listeners, SEND_TIMEOUT # Odbiorcy zdarzeń dla komunikatów głosowych
+from ..utils import fast_json, estimated_times
+from ..utils.stop_store import NO_TIME
 
 # Załaduj zmienne z pliku .env
 load_dotenv() 
@@ -26,6 +26,7 @@ if not ELEVEN_API_KEY:
     raise ValueError("ELEVENLABS_API_KEY nie został ustawiony w zmiennych środowiskowych lub pliku .env!")
 
 router = APIRouter()
+log = logs.get_logger("voice")
 
 client = ElevenLabs(api_key=ELEVEN_API_KEY)
 
@@ -51,7 +52,7 @@ async def speak_text(request: SpeakRequest, station_id: int, db: Session = Depen
     )
     request.voice_id = voice_id
     try:
-        print(f"Generowanie mowy ...")
+        log.info("Generowanie mowy", extra={"station_id": station_id})
         audio_generator = client.text_to_speech.convert(
             voice_id=request.voice_id,
             model_id="eleven_multilingual_v2",
@@ -66,7 +67,7 @@ async def speak_text(request: SpeakRequest, station_id: int, db: Session = Depen
         return Response(content=audio_bytes, media_type="audio/mpeg")
 
     except Exception as e:
-        print(f"Błąd ElevenLabs: {e}")
+        log.error("Błąd ElevenLabs", extra={"reason": repr(e)})
         # Wypisujemy szczegóły błędu, co ułatwi debugowanie (np. zły klucz API)
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -134,212 +135,156 @@ def edit_station_voice(station_id: int, data: schemas.VoiceSettingsEdit, db: Ses
 @router.websocket("/voice-timetable-edit/{station_id}")
 async def ws_voice_timetable_edit(websocket: WebSocket, station_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Podłączono kontroler głosowy dla stacji {station_id}")
+    log.debug("Podłączono kontroler głosowy", extra={"station_id": station_id})
     
-    # Tworzenie kolejki zdarzeń dla tego konkretnego połączenia
-    update_queue = asyncio.Queue()
-    # Rejestracja kolejki w globalnym słowniku
-    voice_update_listeners[station_id].append(update_queue)
-    today = date.today()
+    # Bufor zdarzeń tego połączenia - przepełniony (kontroler nie nadąża) kończy połączenie wyjątkiem Overflow
+    with voice_update_listeners.subscription(station_id) as updates:
+        try:
+            while True:
+                try:
+                    # Inteligentne oczekiwanie na sygnał
+                    stop_id = await asyncio.wait_for(updates.get(), timeout=60)
+                except asyncio.TimeoutError:
+                    # Brak edycji w ciągu 60s, pętla kręci się dalej (keep-alive)
+                    continue
 
-    try:
-        while True:
-            try:
-                # Inteligentne oczekiwanie na sygnał z kolejki
-                stop_id = await asyncio.wait_for(update_queue.get(), timeout=60)
-                
-                print(f"Wykryto edycję dla stacji {station_id} i postoju {stop_id}!")
-                
-                # Pobieramy szczegóły zmienionego postoju
-                stop = (
-                    db.query(models.Stop)
-                    .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                    .filter(models.Stop.id == stop_id)
-                    .options(
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                        joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                        contains_eager(models.Stop.statuses),
-                    )
-                    .first()
-                )
-                
-                if not stop or not stop.trip.calendar.runs_on_date(today):
+                log.debug("Wykryto edycję", extra={"station_id": station_id, "stop_id": stop_id})
+                # Doba liczona przy każdej edycji - połączenie może trwać dłużej niż jedna doba
+                today = rollover.today()
+
+                # Szczegóły zmienionego postoju z danych referencyjnych, status z bazy
+                data = reference.get(db, stop_ids=(stop_id,))
+                stop = data.stop(stop_id)
+                trip = data.trip_of(stop_id)
+
+                status = queries.statuses_for(db, [stop_id], today).get(stop_id) if stop else None
+                # Zwalniamy połączenie z puli do następnej edycji (sesja jest używana przez cały czas życia WebSocketu)
+                db.close()
+
+                if not stop or not trip.runs_on(today):
                     continue
 
-                status = next((st for st in stop.statuses if st.date == today), None)
-                
-                # Wyznaczanie stacji początkowej (pierwszy stop w trasie)
-                origin_stop = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .join(models.Platform)
-                    .join(models.Station)
-                    .filter(models.Stop.trip_id == stop.trip_id)
-                    .order_by(models.Stop.sequence.asc()) 
-                    .first()
-                )
+                route = trip.route
+
+                # Stacja początkowa (pierwszy stop w trasie)
+                origin_station = data.origin_station(trip.trip_id)
 
                 # Parsowanie nazwy pociągu
                 train_name = ""
-                if stop.trip.route.train_number:
-                    parts = stop.trip.route.train_number.split()
+                if route.train_number:
+                    parts = route.train_number.split()
                     train_name = " ".join(parts[1:]) if len(parts) > 1 else parts[0]
 
                 # Przygotowanie danych dla frontendu
-                print("Wysyłam dane")
+                log.debug("Wysyłanie danych komunikatu", extra={"station_id": station_id, "stop_id": stop_id})
                 data_payload = {
                     "id": stop.id,
-                    "train_type": stop.trip.route.type.name if stop.trip.route.type else "",
+                    "train_type": route.type_name or "",
                     "train_number": train_name,
-                    "origin_station": origin_stop.original_track.platform.station.name if origin_stop else "Nieznana",
-                    "final_station": stop.trip.route.final_station.name if stop.trip.route.final_station else "",
+                    "origin_station": origin_station or "Nieznana",
+                    "final_station": route.final_station or "",
                     "arrival_time": stop.arrival.strftime("%H:%M") if stop.arrival else None,
                     "arrival_delay": status.arrival_delay if status else 0,
                     "departure_time": stop.departure.strftime("%H:%M") if stop.departure else None,
                     "is_cancelled": status.is_cancelled if status else False,
                     "bus": status.bus if status else False
                 }
-                
-                await websocket.send_text(json.dumps(data_payload))
 
-            except asyncio.TimeoutError:
-                # Brak edycji w ciągu 60s, pętla kręci się dalej (keep-alive)
-                pass
+                await asyncio.wait_for(websocket.send_text(fast_json.dumps(data_payload)), SEND_TIMEOUT)
 
-    except Exception as e:
-        print(f"Błąd WS ({station_id}): {e}")
-    finally:
-        print("Rozłączono głos")
-        # Sprzątanie po rozłączeniu
-        if station_id in voice_update_listeners:
-            if update_queue in voice_update_listeners[station_id]:
-                voice_update_listeners[station_id].remove(update_queue)
+        except Exception as e:
+            log.warning("Błąd WebSocket kontrolera głosowego", extra={"station_id": station_id, "reason": repr(e)})
+        finally:
+            log.debug("Rozłączono kontroler głosowy", extra={"station_id": station_id})
 
 
 @router.websocket("/voice-data/{station_id}")
 async def ws_voice_data(websocket: WebSocket, station_id: int, db: Session = Depends(database.get_db)):
     await websocket.accept()
-    print(f"Podłączono kontroler głosowy dla stacji {station_id}")
+    log.debug("Podłączono kontroler głosowy", extra={"station_id": station_id})
 
     try:
         while True:
-            # Commit, aby odświeżyć stan bazy danych (pobranie zmian z innych sesji)
-            db.commit()
+            # Zapytania odświeżenia liczone w metrykach (/metrics) dla tego widoku
+            with metrics.track("ws", "/voice-data/{station_id}"):
+                # Commit, aby odświeżyć stan bazy danych (pobranie zmian z innych sesji)
+                db.commit()
             
-            today = date.today()
-            current_datetime = datetime.now()
-            # Patrzymy 15 minut wstecz
-            lookback = (current_datetime - timedelta(minutes=15)).time()
-
-            # Definicja czasu rzeczywistego bezpośrednio w SQL (wykorzystujemy StopStatus)
-            # Używamy postgresql.INTERVAL do dodawania minut opóźnienia do czasu planowego
-            real_arrival = models.Stop.arrival + func.cast(
-                func.concat(func.coalesce(models.StopStatus.arrival_delay, 0), ' minutes'), 
-                postgresql.INTERVAL
-            )
-            
-            real_departure = models.Stop.departure + func.cast(
-                func.concat(func.coalesce(models.StopStatus.departure_delay, 0), ' minutes'), 
-                postgresql.INTERVAL
-            )
-
-            actual_op_time = func.coalesce(real_arrival, real_departure)
-
-            # Pobieramy pociągi na stacji
-            stops = (
-                db.query(models.Stop)
-                .join(models.Track, models.Stop.original_track_id == models.Track.id)
-                .join(models.Platform, models.Track.platform_id == models.Platform.id)
-                .outerjoin(models.StopStatus, (models.StopStatus.stop_id == models.Stop.id) & (models.StopStatus.date == today))
-                .filter(
-                    models.Platform.station_id == station_id,
-                    or_(
-                        real_arrival >= lookback,
-                        real_departure >= lookback
-                    )
-                )
-                .options(
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.type),
-                    joinedload(models.Stop.trip).joinedload(models.Trip.route).joinedload(models.Route.final_station),
-                    # contains_eager pozwala SQLAlchemy użyć danych z już wykonanego joina do StopStatus
-                    contains_eager(models.Stop.statuses),
-                    joinedload(models.Stop.original_track).joinedload(models.Track.platform)
-                )
-                .order_by(actual_op_time.asc())
-                .limit(20)
-                .all()
-            )
-
-            data_list = []
-            for s in stops:
-                # Sprawdzenie kalendarza (czy pociąg kursuje dzisiaj)
-                if not s.trip.calendar.runs_on_date(today):
-                    continue
-
-                status = next((st for st in s.statuses if st.date == today), None)
-                
-                # Obliczanie czasu postoju (uwzględniając ewentualną północ)
-                stop_duration = 0
-                if s.arrival and s.departure:
-                    dt_arr = datetime.combine(today, s.arrival)
-                    dt_dep = datetime.combine(today, s.departure)
-                    if dt_dep < dt_arr:
-                        dt_dep += timedelta(days=1)
-                    stop_duration = (dt_dep - dt_arr).total_seconds() / 60
-
-                # Wyznaczanie stacji początkowej (pierwszy stop w trasie)
-                origin_stop = (
-                    db.query(models.Stop)
-                    .join(models.Track)
-                    .join(models.Platform)
-                    .join(models.Station)
-                    .filter(models.Stop.trip_id == s.trip_id)
-                    .order_by(models.Stop.sequence.asc()) # Zakładamy, że ID lub sequence określa kolejność
-                    .first()
-                )
-
-                # Parsowanie nazwy pociągu - usunięcie numeru, pozostawienie imienia
-                if(s.trip.route.train_number):
-                    train_number_to_edit = (s.trip.route.train_number).split()
-                    # Łączy słowa od drugiego do końca, rozdzielając je spacją
-                    train_name = " ".join(train_number_to_edit[1:])
-                else:
-                    train_name = ""
-
-                # Wyznaczanie toru i peronu (uwzględniając dynamiczną zmianę w StopStatus)
-                actual_track_id = status.track_id if (status and status.track_id) else s.original_track_id
-                
-                # Pobieramy dane o aktualnym torze (z cache sesji lub bazy)
-                current_track_obj = db.query(models.Track).options(joinedload(models.Track.platform)).filter(models.Track.id == actual_track_id).first()
-                
-                platform_num = current_track_obj.platform.number if current_track_obj and current_track_obj.platform else ""
-                track_num = current_track_obj.number if current_track_obj else ""
-                
-                # Sprawdzamy czy tor został zmieniony względem planu (original_track_id)
-                changed_track = False
-                if status and status.track_id and status.track_id != s.original_track_id:
-                    changed_track = True
-
-                data_list.append({
-                    "id": s.id,
-                    "train_type": s.trip.route.type.name if s.trip.route.type else "",
-                    "train_number": train_name,
-                    "origin_station": origin_stop.original_track.platform.station.name if origin_stop else "",
-                    "final_station": s.trip.route.final_station.name if s.trip.route.final_station else "",
-                    "arrival_time": s.arrival.strftime("%H:%M") if s.arrival else None,
-                    "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
-                    "arrival_delay": status.arrival_delay if status and status.arrival_delay else 0,
-                    "departure_delay": status.departure_delay if status else 0,
-                    "platform": roman_to_arabic(platform_num) if platform_num else "",
-                    "track": track_num,
-                    "stop_duration": int(stop_duration),
-                    "changed_track": changed_track,
-                    "is_cancelled": status.is_cancelled if status else False,
-                    "bus": status.bus if status else False
-                })
-
-            await websocket.send_text(json.dumps(data_list))
+                today = rollover.today()
+                current_datetime = datetime.now()
+                # Patrzymy 15 minut wstecz
+                lookback = (current_datetime - timedelta(minutes=15)).time()
+
+                lookback_minute = lookback.hour * 60 + lookback.minute + lookback.second / 60
+
+                # Pociągi na stacji (planowe postoje z danych referencyjnych, statusy jednym zapytaniem).
+                # Czas rzeczywisty = plan + opóźnienie, zawinięty do doby jak godzina + interwał w SQL.
+                rows = queries.board_rows(db, station_id, today)
+                real_arrival = estimated_times.wrapped(queries.row_times(rows, "arrival")[1])
+                real_departure = estimated_times.wrapped(queries.row_times(rows, "departure")[1])
+                actual_op_time = array("l", (a if a != NO_TIME else d for a, d in zip(real_arrival, real_departure)))
+                recent = [
+                    i for i in range(len(rows))
+                    if real_arrival[i] >= lookback_minute or real_departure[i] >= lookback_minute
+                ]
+                stops = [rows[i] for i in estimated_times.argsort(actual_op_time, recent)[:20]]
+                data = reference.get(db)
+
+                data_list = []
+                for s in stops:
+                    trip = s.trip
+
+                    # Obliczanie czasu postoju (uwzględniając ewentualną północ)
+                    stop_duration = 0
+                    if s.arrival and s.departure:
+                        dt_arr = datetime.combine(today, s.arrival)
+                        dt_dep = datetime.combine(today, s.departure)
+                        if dt_dep < dt_arr:
+                            dt_dep += timedelta(days=1)
+                        stop_duration = (dt_dep - dt_arr).total_seconds() / 60
+
+                    # Stacja początkowa (pierwszy stop w trasie)
+                    origin_station = data.origin_station(trip.trip_id)
+
+                    # Parsowanie nazwy pociągu - usunięcie numeru, pozostawienie imienia
+                    if(trip.route.train_number):
+                        train_number_to_edit = (trip.route.train_number).split()
+                        # Łączy słowa od drugiego do końca, rozdzielając je spacją
+                        train_name = " ".join(train_number_to_edit[1:])
+                    else:
+                        train_name = ""
+
+                    # Tor i peron rzeczywisty (uwzględniając dynamiczną zmianę w StopStatus)
+                    platform_num = s.platform or ""
+                    track_num = s.track or ""
+
+                    # Sprawdzamy czy tor został zmieniony względem planu (original_track_id)
+                    changed_track = bool(s.status_track_id and s.status_track_id != s.original_track_id)
+
+                    data_list.append({
+                        "id": s.id,
+                        "train_type": trip.route.type_name or "",
+                        "train_number": train_name,
+                        "origin_station": origin_station or "",
+                        "final_station": trip.route.final_station or "",
+                        "arrival_time": s.arrival.strftime("%H:%M") if s.arrival else None,
+                        "departure_time": s.departure.strftime("%H:%M") if s.departure else None,
+                        "arrival_delay": s.arrival_delay or 0,
+                        "departure_delay": s.departure_delay if s.status_id else 0,
+                        "platform": roman_to_arabic(platform_num) if platform_num else "",
+                        "track": track_num,
+                        "stop_duration": int(stop_duration),
+                        "changed_track": changed_track,
+                        "is_cancelled": s.is_cancelled if s.status_id else False,
+                        "bus": s.bus if s.status_id else False
+                    })
+
+                # Zwalniamy połączenie z puli na czas oczekiwania do następnego odświeżenia
+                db.close()
+                with metrics.serialization():
+                    text = fast_json.dumps(data_list)
+            await websocket.send_text(text)
             await asyncio.sleep(5)
 
     except Exception as e:
-        print(f"Rozłączono głos ({station_id}): {e}")
\ No newline at end of file
+        log.debug("Rozłączono kontroler głosowy", extra={"station_id": station_id, "reason": repr(e)})
\ No newline at end of file
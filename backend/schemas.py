@@ -1,3 +1,5 @@
+import datetime
+
 from pydantic import BaseModel
 
 # Model Pydantic do odbioru JSON
@@ -60,4 +62,9 @@ class StopStatusUpdate(BaseModel):
     bus: bool | None = None
     is_cancelled: bool | None = None
     arrival_delay: int | None = None
-    departure_delay: int | None = None
\ No newline at end of file
+    departure_delay: int | None = None
+    # Doba, której dotyczy zmiana (domyślnie bieżąca)
+    date: datetime.date | None = None
+
+class StopStatusBulkUpdate(StopStatusUpdate):
+    stop_id: int
\ No newline at end of file
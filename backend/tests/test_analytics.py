@@ -0,0 +1,98 @@
+import os
+import sys
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+
+from backend import analytics, models, reference
+from backend.utils.stop_store import StopStore
+
+DAY = date(2025, 3, 10)  # poniedziałek
+
+def make_data():
+    data = reference.ReferenceData(1)
+    data.stations = {1: "Początkowa", 2: "Końcowa"}
+    route = reference.RouteRef("R1", "Os 1000", "Osobowy", "Os", "Koleje Śląskie", "KŚ", 2, "Końcowa")
+    data.routes = {"R1": route}
+    data.trips = {
+        trip_id: reference.TripRef(trip_id, route, 0b1111111, DAY - timedelta(days=1), DAY + timedelta(days=1))
+        for trip_id in ("T1", "T2")
+    }
+    rows = [
+        (11, "T1", 1, None, 7 * 60, 1, 1), (12, "T1", 2, 7 * 60 + 30, None, 2, 2),
+        (21, "T2", 1, None, 8 * 60, 1, 1), (22, "T2", 2, 8 * 60 + 30, None, 2, 2),
+    ]
+    calendars = {t.trip_id: (t.days_mask, t.start_date, t.end_date) for t in data.trips.values()}
+    data.store = StopStore(rows, calendars)
+    return data
+
+def test_stops_without_status_count_as_on_time():
+    data = make_data()
+    day = analytics.DayRollup(data, DAY, {12: (10, 0, False, False), 21: (0, 0, True, False)})
+
+    station = day.rollup.groups[("station", "2")]
+    assert (station.stops, station.on_time) == (2, 1)
+    route = day.rollup.groups[("route", "R1")]
+    assert (route.stops, route.cancelled, route.on_time) == (4, 1, 2)
+    assert day.rollup.groups[("hour", "7")].stops == 2
+    assert day.rollup.groups[("weekday", "0")].stops == 4
+
+def test_edit_replaces_previous_contribution():
+    data = make_data()
+    day = analytics.DayRollup(data, DAY, {12: (10, 0, False, False)})
+    day.update(data, 12, (2, 0, False, False))
+    day.update(data, 22, (45, 0, False, True))
+
+    station = day.rollup.groups[("station", "2")]
+    assert (station.stops, station.on_time, station.bus, station.delay_minutes) == (2, 1, 1, 47)
+
+def test_closed_day_is_stored_and_summed(monkeypatch):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(models.StopStatus.__table__.insert(), [
+            {"id": 1, "stop_id": 12, "date": DAY, "arrival_delay": 10, "departure_delay": 10, "is_cancelled": False, "bus": False},
+        ])
+    monkeypatch.setattr(reference, "get", lambda *args, **kwargs: make_data())
+
+    analytics.close_day(engine, DAY)
+    analytics.close_day(engine, DAY + timedelta(days=1))
+
+    tallies = analytics.stored_tallies(engine, "station", DAY, DAY + timedelta(days=1))
+    assert (tallies["2"].stops, tallies["2"].on_time) == (4, 3)
+    days = analytics.stored_tallies(engine, "route", DAY, DAY + timedelta(days=1), key="R1", by_day=True)
+    assert [days[d].on_time for d in sorted(days)] == [3, 4]
+
+def test_edit_during_live_build_is_not_lost(monkeypatch):
+    data = make_data()
+    monkeypatch.setattr(reference, "get", lambda *args, **kwargs: data)
+    monkeypatch.setattr(analytics, "_live", None)
+    status = SimpleNamespace(date=DAY, arrival_delay=30, departure_delay=30, is_cancelled=False, bus=False)
+
+    def build_day(engine, day):
+        # Edycja zapisana po odczycie statusów, a przed podmianą liczników
+        analytics.record_status(SimpleNamespace(id=12, statuses=[status]), DAY, data)
+        return analytics.DayRollup(data, day, {})
+    monkeypatch.setattr(analytics, "build_day", build_day)
+
+    station = analytics.live_rollup(DAY, engine=object()).rollup.groups[("station", "2")]
+    assert (station.stops, station.on_time) == (2, 1)
+
+def test_day_without_stops_is_closed_once(monkeypatch):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(reference, "get", lambda *args, **kwargs: make_data())
+    empty_day = DAY + timedelta(days=5)  # poza kalendarzem kursów
+
+    analytics.close_day(engine, empty_day)
+    assert analytics.closed_days(engine, empty_day, empty_day) == {empty_day}
+    assert analytics.stored_tallies(engine, "station", empty_day, empty_day) == {}
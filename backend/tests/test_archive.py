@@ -0,0 +1,84 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, inspect, select
+
+from backend import archive, models
+
+TODAY = date(2025, 3, 10)
+
+def make_engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(models.StopStatus.__table__.insert(), [
+            {"id": i, "stop_id": i % 3 + 1, "date": TODAY - timedelta(days=i % 4), "arrival_delay": i, "departure_delay": i}
+            for i in range(1, 21)
+        ])
+    return engine
+
+def count(engine, table, day=None):
+    query = select(func.count()).select_from(table)
+    if day is not None:
+        query = query.where(table.c.date == day)
+    with engine.connect() as connection:
+        return connection.execute(query).scalar()
+
+def test_previous_days_move_to_archive():
+    engine = make_engine()
+    current, stored = models.StopStatus.__table__, models.StopStatusArchive.__table__
+
+    archive.run(TODAY, engine)
+
+    with engine.connect() as connection:
+        days = set(connection.execute(select(current.c.date).distinct()).scalars())
+    assert days == {TODAY, TODAY - timedelta(days=1)}
+    assert count(engine, stored) == 10
+    assert count(engine, archive.history()) == 20
+    assert count(engine, archive.history(since=TODAY - timedelta(days=2), until=TODAY - timedelta(days=1))) == 10
+
+def test_purge_keeps_newer_archive_days():
+    engine = make_engine()
+    archive.archive_stop_statuses(engine, TODAY)
+
+    assert archive.purge_archive(engine, TODAY - timedelta(days=2)) == 5
+    assert count(engine, models.StopStatusArchive.__table__) == 10
+
+def test_missing_indexes_are_added_to_existing_tables():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_stop_status_date_stop_id")
+
+    archive.ensure_indexes(engine)
+
+    names = {index["name"] for index in inspect(engine).get_indexes("stop_status")}
+    assert "ix_stop_status_date_stop_id" in names
+
+def test_status_ids_reused_after_archiving_do_not_collide():
+    engine = make_engine()
+    archive.run(TODAY, engine)
+    archive.run(TODAY + timedelta(days=2), engine)
+    assert count(engine, models.StopStatus.__table__) == 0
+
+    # Pusta tabela stop_status w SQLite nadaje ponownie id od 1
+    with engine.begin() as connection:
+        connection.execute(models.StopStatus.__table__.insert(), [
+            {"stop_id": 1, "date": TODAY + timedelta(days=2), "arrival_delay": 1, "departure_delay": 1},
+        ])
+        assert connection.execute(select(models.StopStatus.__table__.c.id)).scalar() == 1
+    archive.run(TODAY + timedelta(days=5), engine)
+
+    stored = models.StopStatusArchive.__table__
+    assert count(engine, stored) == 21
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).where(stored.c.status_id == 1)).scalar() == 2
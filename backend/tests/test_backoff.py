@@ -0,0 +1,17 @@
+import random
+from utils.backoff import jittered_backoff
+
+def test_backoff_within_bounds():
+    rng = random.Random(1)
+    for load in (0, 1, 5):
+        delay = 2.0 * (1 + load)
+        for _ in range(50):
+            assert delay / 2 <= jittered_backoff(load, rng=rng) <= delay
+
+def test_backoff_capped():
+    rng = random.Random(1)
+    assert all(jittered_backoff(1000, cap=60, rng=rng) <= 60 for _ in range(50))
+
+def test_backoff_is_spread():
+    rng = random.Random(1)
+    assert len({round(jittered_backoff(3, rng=rng), 3) for _ in range(20)}) > 1
@@ -0,0 +1,28 @@
+from datetime import date
+
+from benchmarks.generator import generate
+
+DAY = date(2024, 1, 1)
+
+def test_same_seed_gives_same_timetable():
+    assert generate(stations=40, trips=30, service_date=DAY) == generate(stations=40, trips=30, service_date=DAY)
+    assert generate(stations=40, trips=30, service_date=DAY) != generate(stations=40, trips=30, service_date=DAY, seed=2)
+
+def test_sizes_follow_parameters():
+    tables = generate(stations=40, trips=30, stops_per_trip=5, platforms_per_station=3, tracks_per_platform=2,
+                      delay_density=0, service_date=DAY)
+    assert len(tables["station"]) == 40
+    assert len(tables["platform"]) == 120
+    assert len(tables["track"]) == 240
+    assert len(tables["stop"]) == 150
+    assert tables["stop_status"] == []
+
+def test_trips_start_and_end_like_real_stops():
+    tables = generate(stations=40, trips=30, stops_per_trip=5, service_date=DAY)
+    first = [s for s in tables["stop"] if s["trip_id"] == "T0"]
+    assert [s["sequence"] for s in first] == [0, 1, 2, 3, 4]
+    assert first[0]["arrival"] is None and first[-1]["departure"] is None
+    track_station = {t["id"]: t["platform_id"] for t in tables["track"]}
+    platform_station = {p["id"]: p["station_id"] for p in tables["platform"]}
+    final = platform_station[track_station[first[-1]["original_track_id"]]]
+    assert tables["route"][0]["final_station_id"] == final
@@ -0,0 +1,37 @@
+import pytest
+from utils.compact_payload import StringTable, pack_data, pack_message
+
+board = [
+    {"station": "Katowice", "intermediate": ["Sosnowiec Główny", "Zawiercie"], "train_number": "40123", "delay": 0},
+    {"station": "Zawiercie", "intermediate": ["Sosnowiec Główny"], "train_number": "40125", "delay": 5},
+]
+
+def test_compact_replaces_strings():
+    table = StringTable()
+    compact, used = table.compact(board, ("station", "intermediate"))
+    assert compact[0]["station"] == 0
+    assert compact[0]["intermediate"] == [1, 2]
+    assert compact[1]["station"] == 2
+    assert compact[0]["train_number"] == "40123"
+    assert len(table) == 3
+    assert used == {0, 1, 2}
+    restored = [
+        {**row, "station": table.string(row["station"]), "intermediate": [table.string(i) for i in row["intermediate"]]}
+        for row in compact
+    ]
+    assert restored == board
+
+def test_ids_are_stable():
+    table = StringTable()
+    first, _ = table.compact(board, ("station", "intermediate"))
+    second, _ = table.compact(board, ("station", "intermediate"))
+    assert first == second
+    assert len(table) == 3
+
+def test_pack_message():
+    msgpack = pytest.importorskip("msgpack")
+    table = StringTable()
+    compact, used = table.compact(board, ("station", "intermediate"))
+    message = msgpack.unpackb(pack_message({i: table.string(i) for i in used}, pack_data(compact)), strict_map_key=False)
+    assert message["data"] == compact
+    assert message["strings"][0] == "Katowice"
@@ -0,0 +1,20 @@
+from utils.estimated_times import argsort, delayed_minute, estimate, window, wrapped
+from utils.stop_store import NO_TIME
+
+def test_estimate_adds_delays_and_moves_early_hours_to_next_day():
+    planned, estimated = estimate([1430, 10, NO_TIME, 300], [5, None, 3, 0], day_start=180)
+    assert list(planned) == [1430, 1450, NO_TIME, 300]
+    assert list(estimated) == [1435, 1450, NO_TIME, 300]
+
+def test_wrapped_keeps_minutes_within_calendar_day():
+    assert list(wrapped([1435, 1450, NO_TIME])) == [1435, 10, NO_TIME]
+    assert delayed_minute(1430, 20) == 10
+    assert delayed_minute(None, 5) is None
+
+def test_window_is_inclusive_and_skips_missing_times():
+    assert window([100, 200, NO_TIME, 300], start=200, end=300) == [1, 3]
+    assert window([100, 200], end=100) == [0]
+
+def test_argsort_is_stable():
+    assert argsort([30, 10, 30, 10]) == [1, 3, 0, 2]
+    assert argsort([30, 10, 30, 10], [0, 2, 3]) == [3, 0, 2]
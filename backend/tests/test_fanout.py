@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from utils.fanout import Fanout, Outbox, Overflow
+
+def test_messages_with_same_key_collapse_in_place():
+    async def main():
+        outbox = Outbox(maxsize=4)
+        outbox.put(1, key=1)
+        outbox.put(2, key=2)
+        outbox.put(10, key=1)
+        assert len(outbox) == 2
+        return [await outbox.get(), await outbox.get()]
+
+    assert asyncio.run(main()) == [10, 2]
+
+def test_full_outbox_overflows_instead_of_growing():
+    async def main():
+        outbox = Outbox(maxsize=2)
+        assert outbox.put("a")
+        assert outbox.put("b")
+        assert not outbox.put("c")
+        assert len(outbox) == 0
+        with pytest.raises(Overflow):
+            await outbox.get()
+
+    asyncio.run(main())
+
+def test_publish_does_not_wait_for_slow_subscriber():
+    fanout = Fanout(maxsize=3)
+    received = []
+
+    async def subscriber(fanout, topic):
+        with fanout.subscription(topic) as updates:
+            while True:
+                received.append(await updates.get())
+
+    async def main():
+        fast = asyncio.create_task(subscriber(fanout, 7))
+        with fanout.subscription(7):  # nigdy nie odbiera
+            await asyncio.sleep(0)
+            lagging = []
+            for stop_id in range(5):
+                lagging.append(fanout.publish(7, stop_id, key=stop_id))
+                await asyncio.sleep(0)
+        fast.cancel()
+        return lagging
+
+    lagging = asyncio.run(main())
+    assert lagging == [0, 0, 0, 1, 1]
+    assert received == [0, 1, 2, 3, 4]
+    assert 7 not in fanout
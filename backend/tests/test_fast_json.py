@@ -0,0 +1,10 @@
+import json
+from utils.fast_json import dumps, dumps_bytes
+
+data = [{"station": "Łódź Fabryczna", "delay": 5, "intermediate": ["Koluszki"], "bus": False, "track": None}]
+
+def test_dumps_round_trip():
+    assert json.loads(dumps(data)) == data
+
+def test_dumps_bytes_round_trip():
+    assert json.loads(dumps_bytes(data).decode("utf-8")) == data
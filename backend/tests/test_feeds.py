@@ -0,0 +1,92 @@
+import os
+import sys
+from datetime import date, time, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import feeds, models, reference
+from backend.utils.gtfs_realtime import parse
+
+def make_engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    today = date.today()
+    db.add_all([
+        models.Station(id=1, name="Początkowa"),
+        models.Station(id=2, name="Końcowa"),
+        models.Carrier(id=1, name="Koleje Śląskie", code="KŚ"),
+        models.RouteType(id=1, name="Osobowy", code="Os"),
+        models.Calendar(service_id=1, start_date=today - timedelta(days=1), end_date=today + timedelta(days=1)),
+        models.Platform(id=1, station_id=1, number="I"),
+        models.Platform(id=2, station_id=2, number="II"),
+        models.Track(id=1, platform_id=1, number="1"),
+        models.Track(id=2, platform_id=2, number="2"),
+        models.Track(id=3, platform_id=2, number="3"),
+        models.Route(id="R", train_number="1000", carrier_id=1, type_id=1, final_station_id=2),
+        models.Trip(trip_id="T", route_id="R", service_id=1),
+        # Kurs przekracza północ
+        models.Stop(id=1, trip_id="T", original_track_id=1, departure=time(23, 50), sequence=0),
+        models.Stop(id=2, trip_id="T", original_track_id=2, arrival=time(0, 10), sequence=1),
+        models.StopStatus(stop_id=2, date=today, arrival_delay=5, departure_delay=5, track_id=3),
+    ])
+    db.commit()
+    reference.invalidate()
+    reference.get(sessionmaker(bind=engine)())
+    return engine
+
+def test_stop_times_continue_past_midnight():
+    engine = make_engine()
+    assert list(feeds.stop_time_rows(engine)) == [
+        ("T", "23:50:00", "23:50:00", "T1", 0),
+        ("T", "24:10:00", "24:10:00", "T2", 1),
+    ]
+
+def test_board_rows_join_statuses_per_station():
+    engine = make_engine()
+    rows = [dict(zip(feeds.BOARD_HEADER, row)) for row in feeds.board_rows(date.today(), engine)]
+    assert [(row["station"], row["arrival_delay"], row["track"]) for row in rows] == [("Początkowa", 0, "1"), ("Końcowa", 5, "3")]
+    assert list(feeds.board_rows(date.today() + timedelta(days=2), engine)) == []
+
+def test_trip_updates_carry_delays_and_track_changes():
+    engine = make_engine()
+    header, entity = (value for _, value in parse(b"".join(feeds.trip_update_chunks(date.today(), engine, timestamp=1))))
+    trip_update = list(parse(dict(parse(entity))[3]))
+    update = dict(parse(trip_update[1][1]))
+    assert (update[1], update[4]) == (1, b"T2")
+    assert dict(parse(update[2])) == {1: 300}
+    assert dict(parse(update[6])) == {1: b"T3"}
+
+def test_routes_without_type_or_final_station_are_exported():
+    engine = make_engine()
+    db = sessionmaker(bind=engine)()
+    # Typ i stacja końcowa usunięte z tabel referencyjnych (SQLite nie sprawdza kluczy obcych)
+    db.add_all([
+        models.Route(id="B", train_number="2000", carrier_id=1, type_id=9, final_station_id=9),
+        models.Trip(trip_id="U", route_id="B", service_id=1),
+    ])
+    db.commit()
+    assert list(feeds.route_rows(engine))[0] == ("B", 1, "2000", "", 2)
+    assert list(feeds.trip_rows(engine)) == [("R", 1, "T", "Końcowa", "1000"), ("B", 1, "U", "", "2000")]
+
+def test_trip_updates_skip_stops_missing_from_reference_data():
+    engine = make_engine()
+    db = sessionmaker(bind=engine)()
+    # Postój dodany po wczytaniu danych referencyjnych
+    db.add_all([
+        models.Stop(id=3, trip_id="T", original_track_id=2, arrival=time(0, 20), sequence=2),
+        models.StopStatus(stop_id=3, date=date.today(), arrival_delay=2, departure_delay=2),
+    ])
+    db.commit()
+    _, entity = (value for _, value in parse(b"".join(feeds.trip_update_chunks(date.today(), engine, timestamp=1))))
+    trip_update = list(parse(dict(parse(entity))[3]))
+    assert [dict(parse(value))[4] for number, value in trip_update if number == 2] == [b"T2"]
@@ -0,0 +1,39 @@
+from utils.gtfs_realtime import (
+    STOP_SKIPPED, TRIP_CANCELED, feed_header, field_varint, parse, stop_time_update, trip_update_entity, varint,
+)
+
+def test_varints_match_protobuf_encoding():
+    assert varint(1) == b"\x01"
+    assert varint(300) == b"\xac\x02"
+    # int32 -1 zajmuje 10 bajtów (uzupełnienie do dwóch na 64 bitach)
+    assert varint(-1) == b"\xff" * 9 + b"\x01"
+    assert field_varint(3, 150) == b"\x18\x96\x01"
+
+def test_header_declares_full_dataset():
+    (number, header), = parse(feed_header(1700000000))
+    assert number == 1
+    assert list(parse(header)) == [(1, b"2.0"), (2, 0), (3, 1700000000)]
+
+def test_trip_update_round_trip():
+    updates = [
+        stop_time_update(0, "T1", None, 300),
+        stop_time_update(1, "T2", 300, 300, assigned_stop_id="T4"),
+        stop_time_update(2, "T3", 0, None, skipped=True),
+    ]
+    (number, entity), = parse(trip_update_entity("A_20250310", "A", "20250310", updates, route_id="R"))
+    assert number == 2
+    entity = dict(parse(entity))
+    assert entity[1] == b"A_20250310"
+    trip_update = list(parse(entity[3]))
+    assert list(parse(trip_update[0][1])) == [(1, b"A"), (3, b"20250310"), (5, b"R")]
+
+    first, second, third = (dict(parse(value)) for number, value in trip_update[1:])
+    assert 2 not in first and dict(parse(first[3])) == {1: 300}
+    assert dict(parse(second[6])) == {1: b"T4"}
+    assert third[5] == STOP_SKIPPED and 2 not in third
+
+def test_cancelled_trip_has_no_stop_updates():
+    (_, entity), = parse(trip_update_entity("A", "A", "20250310", [stop_time_update(0, "T1", 60, 60)], cancelled=True))
+    trip_update = list(parse(dict(parse(entity))[3]))
+    assert len(trip_update) == 1
+    assert dict(parse(trip_update[0][1]))[4] == TRIP_CANCELED
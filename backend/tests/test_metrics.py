@@ -0,0 +1,85 @@
+import logging
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from backend import logs, metrics
+
+def make_client():
+    engine = create_engine("sqlite://")
+    metrics.instrument(engine)
+    metrics.totals.clear()
+
+    app = FastAPI(default_response_class=metrics.TimedJSONResponse)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics.router)
+
+    @app.get("/stations/{station_id}")
+    def station(station_id: int):
+        with engine.connect() as connection:
+            for _ in range(3):
+                connection.execute(text("SELECT 1"))
+        return {"id": station_id}
+
+    return TestClient(app), engine
+
+def test_statements_are_counted_per_route_template():
+    client, _ = make_client()
+    client.get("/stations/1")
+    client.get("/stations/2")
+    totals = metrics.totals[("http", "/stations/{station_id}")]
+    assert totals.requests == 2
+    assert totals.statements == 6
+    assert totals.serialization_seconds > 0
+
+def test_debug_header_only_on_request():
+    client, _ = make_client()
+    assert "server-timing" not in client.get("/stations/1").headers
+    timing = client.get("/stations/1", headers={"X-Debug-Metrics": "1"}).headers["server-timing"]
+    assert '"3 queries' in timing
+
+def test_tracked_block_and_prometheus_text():
+    client, engine = make_client()
+    with metrics.track("ws", "display:edge"):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    body = client.get("/metrics").text
+    assert '# TYPE sdip_db_statements_total counter' in body
+    assert 'sdip_db_statements_total{kind="ws",route="display:edge"} 1' in body
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+def test_repeated_statement_is_reported_with_call_site():
+    engine = create_engine("sqlite://")
+    metrics.instrument(engine)
+    handler = Collect()
+    metrics.log.addHandler(handler)
+    try:
+        with metrics.track("ws", "test"), engine.connect() as connection:
+            for i in range(metrics.QUERY_REPEAT_THRESHOLD):
+                connection.execute(text("SELECT :i"), {"i": i})
+    finally:
+        metrics.log.removeHandler(handler)
+
+    [record] = [r for r in handler.records if "N+1" in r.getMessage()]
+    assert record.route == "test"
+    assert record.count == metrics.QUERY_REPEAT_THRESHOLD
+    assert record.call_site.startswith("tests/test_metrics.py:")
+    assert f"route=test count={record.count} call_site=" in logs.TextFormatter().format(record)
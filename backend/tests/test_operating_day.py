@@ -0,0 +1,25 @@
+from datetime import date, datetime, time
+from utils.operating_day import OperatingDay, parse_day_start
+
+midnight = OperatingDay()
+three = OperatingDay(parse_day_start("03:00"))
+
+def test_midnight_boundary_is_calendar_day():
+    assert midnight.service_date(datetime(2024, 5, 6, 0, 30)) == date(2024, 5, 6)
+    assert midnight.stop_datetime(date(2024, 5, 6), time(0, 30)) == datetime(2024, 5, 6, 0, 30)
+    assert midnight.next_rollover(datetime(2024, 5, 6, 23, 59)) == datetime(2024, 5, 7)
+
+def test_late_boundary_keeps_night_in_previous_day():
+    assert three.service_date(datetime(2024, 5, 7, 2, 59)) == date(2024, 5, 6)
+    assert three.service_date(datetime(2024, 5, 7, 3, 0)) == date(2024, 5, 7)
+    assert three.stop_datetime(date(2024, 5, 6), time(1, 15)) == datetime(2024, 5, 7, 1, 15)
+    assert three.stop_datetime(date(2024, 5, 6), time(22, 0)) == datetime(2024, 5, 6, 22, 0)
+
+def test_window_and_rollover():
+    assert three.window(datetime(2024, 5, 7, 1, 0)) == (date(2024, 5, 6), date(2024, 5, 7))
+    assert three.next_rollover(datetime(2024, 5, 7, 1, 0)) == datetime(2024, 5, 7, 3, 0)
+    assert three.next_rollover(datetime(2024, 5, 7, 3, 0)) == datetime(2024, 5, 8, 3, 0)
+
+def test_parse_day_start():
+    assert parse_day_start("00:00") == time(0, 0)
+    assert parse_day_start("3:30") == time(3, 30)
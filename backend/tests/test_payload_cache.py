@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+from utils.payload_cache import PayloadCache
+
+now = datetime(2024, 5, 6, 12, 0, 30)
+
+def test_hit_within_validity():
+    cache = PayloadCache()
+    cache.put(("departures", 1), 0, now + timedelta(seconds=30), "[]")
+    assert cache.get(("departures", 1), 0, now) == "[]"
+    assert cache.get(("departures", 1), 0, now + timedelta(seconds=29)) == "[]"
+
+def test_miss_after_expiry():
+    cache = PayloadCache()
+    cache.put(("departures", 1), 0, now + timedelta(seconds=30), "[]")
+    assert cache.get(("departures", 1), 0, now + timedelta(seconds=30)) is None
+
+def test_miss_on_new_version():
+    cache = PayloadCache()
+    cache.put(("departures", 1), 0, now + timedelta(seconds=30), "[]")
+    assert cache.get(("departures", 1), 1, now) is None
+
+def test_views_are_separate():
+    cache = PayloadCache()
+    cache.put(("departures", 1), 0, now + timedelta(seconds=30), "a")
+    cache.put(("arrivals", 1), 0, now + timedelta(seconds=30), "b")
+    assert cache.get(("departures", 1), 0, now) == "a"
+    assert cache.get(("arrivals", 1), 0, now) == "b"
+    assert cache.get(("departures", 2), 0, now) is None
+    cache.discard(("departures", 1))
+    assert len(cache) == 1
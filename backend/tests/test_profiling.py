@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import profiling
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_sample_collects_stacks_of_busy_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="busy")
+    thread.start()
+    try:
+        stacks = profiling.sample(0.2, 0.005)
+    finally:
+        stop.set()
+        thread.join()
+
+    busy = [stack for stack in stacks if stack.startswith("busy;")]
+    assert busy
+    assert all("spin (tests/test_profiling.py:" in stack for stack in busy)
+    assert profiling.collapsed(stacks).splitlines()[0].rsplit(" ", 1)[1].isdigit()
+
+def test_loop_monitor_records_blocking_call_site():
+    async def blocking_handler():
+        time.sleep(0.3)
+
+    async def main():
+        monitor = profiling.LoopLagMonitor(0.1, interval=0.02)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.1)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(main())
+    [span] = monitor.spans
+    assert span["ms"] >= 250
+    assert span["call_site"].startswith("tests/test_profiling.py:")
+    assert "blocking_handler" in span["call_site"]
+
+def test_profiling_endpoints_require_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(profiling.router)
+    client = TestClient(app)
+
+    monkeypatch.delenv("PROFILING_TOKEN", raising=False)
+    assert client.get("/admin/profiling/loop-lag").status_code == 404
+
+    monkeypatch.setenv("PROFILING_TOKEN", "sekret")
+    assert client.get("/admin/profiling/loop-lag", headers={"X-Profiling-Token": "zly"}).status_code == 403
+    response = client.get("/admin/profiling/sample?seconds=0.05", headers={"X-Profiling-Token": "sekret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
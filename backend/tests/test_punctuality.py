@@ -0,0 +1,26 @@
+from utils.punctuality import BUCKET_LABELS, Rollup, Tally, bucket
+
+def test_delays_fall_into_inclusive_buckets():
+    assert [bucket(d) for d in (-3, 0, 1, 5, 6, 60, 61)] == [0, 0, 1, 1, 2, 4, 5]
+    assert len(BUCKET_LABELS) == 6
+
+def test_cancelled_stops_have_no_delay():
+    tally = Tally()
+    tally.add(0, False, False, 5)
+    tally.add(12, False, True, 5)
+    tally.add(0, True, False, 5)
+    assert (tally.stops, tally.cancelled, tally.bus, tally.on_time) == (3, 1, 1, 1)
+    assert tally.on_time_percent() == 50.0
+    assert tally.average_delay() == 6.0
+    assert tally.buckets == [1, 0, 1, 0, 0, 0]
+
+def test_subtracting_a_contribution_restores_the_tally():
+    rollup = Rollup(on_time_limit=5)
+    keys = [("station", "1"), ("hour", "7")]
+    rollup.add(keys, 0, False, False)
+    rollup.add(keys, 0, False, False, sign=-1)
+    rollup.add(keys, 20, False, False)
+    tally = rollup.groups[("station", "1")]
+    assert (tally.stops, tally.on_time, tally.delay_minutes) == (1, 0, 20)
+    assert tally.buckets[bucket(20)] == 1
+    assert sum(tally.buckets) == 1
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("fastapi")
+
+# Routery używają importów względnych, więc importujemy cały pakiet backend
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite://")
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import models, reference, schemas
+from backend.routers import timetable, displays
+
+def make_session(trips):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    today = date.today()
+
+    db.add_all([
+        models.Station(id=1, name="Początkowa"),
+        models.Station(id=2, name="Pośrednia"),
+        models.Station(id=3, name="Końcowa"),
+        models.Carrier(id=1, name="Koleje Śląskie", code="KŚ"),
+        models.RouteType(id=1, name="Osobowy", code="Os"),
+        models.Calendar(service_id=1, start_date=today - timedelta(days=1), end_date=today + timedelta(days=7)),
+    ])
+    db.add_all([models.Platform(id=i, station_id=i, number="I") for i in (1, 2, 3)])
+    db.add_all([models.Track(id=i, platform_id=i, number=str(i)) for i in (1, 2, 3)])
+    db.add(models.Track(id=4, platform_id=2, number="4"))
+
+    for i in range(trips):
+        trip_id = f"T{i}"
+        db.add(models.Route(id=trip_id, train_number=str(1000 + i), carrier_id=1, type_id=1, final_station_id=3))
+        db.add(models.Trip(trip_id=trip_id, route_id=trip_id, service_id=1))
+        planned = time(i * 2 % 24, 30)
+        db.add_all([
+            models.Stop(id=i * 3 + 1, trip_id=trip_id, original_track_id=1, departure=planned, sequence=0),
+            models.Stop(id=i * 3 + 2, trip_id=trip_id, original_track_id=2, arrival=planned, departure=planned, sequence=1),
+            models.Stop(id=i * 3 + 3, trip_id=trip_id, original_track_id=3, arrival=planned, sequence=2),
+        ])
+        # Co drugi pociąg ma zmieniony tor na stacji pośredniej
+        if i % 2:
+            db.add(models.StopStatus(stop_id=i * 3 + 2, date=today, track_id=4, arrival_delay=5, departure_delay=5))
+            db.add(models.StopStatus(stop_id=i * 3 + 2, date=today + timedelta(days=1), track_id=4, arrival_delay=7, departure_delay=7))
+
+    db.commit()
+    db.close()
+    # Dane referencyjne wczytujemy przed liczeniem zapytań - w aplikacji są współdzielone przez cały proces
+    reference.invalidate()
+    reference.get(sessionmaker(bind=engine)())
+    return engine, sessionmaker(bind=engine)
+
+def count_queries(engine, call):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        result = call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements), result
+
+@pytest.mark.parametrize("trips", [1, 12])
+def test_departures_query_count(trips):
+    engine, Session = make_session(trips)
+    count, result = count_queries(engine, lambda: timetable.get_departures(2, Session()))
+    assert count == 2
+    assert result and all(row["station"] == "Końcowa" for row in result)
+    for row in result:
+        changed = int(row["train_number"]) % 2
+        assert row["track"] == ("4" if changed else "2")
+        assert row["delay"] in ((5, 7) if changed else (0,))
+
+@pytest.mark.parametrize("trips", [1, 12])
+def test_arrivals_query_count(trips):
+    engine, Session = make_session(trips)
+    count, result = count_queries(engine, lambda: timetable.get_timetable(2, Session()))
+    assert count == 2
+    assert result and all(row["station"] == "Początkowa" for row in result)
+
+def test_stop_details_query_count():
+    engine, Session = make_session(2)
+    count, result = count_queries(engine, lambda: timetable.get_stop_details(5, Session()))
+    assert count == 1
+    assert result["track_id"] == 4
+    assert result["station"] == "Pośrednia"
+
+@pytest.mark.parametrize("trips", [1, 12])
+def test_train_details_query_count(trips):
+    engine, Session = make_session(trips)
+    count, result = count_queries(engine, lambda: timetable.get_train_details(2, Session()))
+    assert count == 1
+    assert [stop["station"] for stop in result["stops"]] == ["Początkowa", "Pośrednia", "Końcowa"]
+
+def test_schedule_resolves_range_in_one_query():
+    engine, Session = make_session(12)
+    today = date.today()
+    until = today + timedelta(days=9)
+    count, result = count_queries(engine, lambda: timetable.get_station_schedule(2, today, until, "departure", Session()))
+    assert count == 1
+    # Kalendarz kursów obejmuje osiem dób od dziś
+    assert [len(day["stops"]) for day in result] == [12] * 8 + [0, 0]
+    assert [{row["delay"] for row in day["stops"]} for day in result[:3]] == [{0, 5}, {0, 7}, {0}]
+    tomorrow = today + timedelta(days=1)
+    assert timetable.get_departures(2, Session(), tomorrow) == result[1]["stops"]
+
+@pytest.mark.parametrize("trips", [1, 12])
+def test_station_display_query_count(trips):
+    engine, Session = make_session(trips)
+    now = datetime.combine(date.today(), time(0, 0))
+    count, (result, first) = count_queries(engine, lambda: displays.station_display_departures_data(Session(), 2, now))
+    assert count == 1
+    assert len(result) == min(trips, 10)
+    assert first is not None
+    for row in result:
+        changed = int(row["train_number"]) % 2
+        assert row["platform/track"] == ("I/4" if changed else "I/2")
+        assert row["intermediate"] == []
+
+def test_platform_display_uses_actual_platform():
+    engine, Session = make_session(4)
+    now = datetime.combine(date.today(), time(0, 0))
+    result, _ = displays.platform_display_data(Session(), 2, 2, now)
+    # Tor 4 leży na peronie 2, więc widoczne są wszystkie pociągi
+    assert [row["track"] for row in result] == ["2", "4", "2"]
+    assert [row["departure_delay"] for row in result] == [0, 5, 0]
+
+def test_station_display_fills_with_next_day_before_rollover():
+    engine, Session = make_session(3)
+    # Ostatni dzisiejszy odjazd o 4:30 już minął - tablica pokazuje kursy jutrzejszej doby
+    now = datetime.combine(date.today(), time(23, 0))
+    result, first = displays.station_display_departures_data(Session(), 2, now)
+    assert [row["train_number"] for row in result] == ["1000", "1001", "1002"]
+    assert [row["delay"] for row in result] == [0, 7, 0]
+    assert first == datetime.combine(date.today() + timedelta(days=1), time(0, 30))
+
+def test_reference_data_reloads_after_invalidate():
+    engine, Session = make_session(2)
+    db = Session()
+    db.get(models.Station, 3).name = "Nowa Końcowa"
+    db.commit()
+    # Bez unieważnienia nazwy pochodzą z wczytanych danych referencyjnych
+    assert timetable.get_stop_details(5, Session())["final_station"] == "Końcowa"
+    reference.invalidate()
+    assert timetable.get_stop_details(5, Session())["final_station"] == "Nowa Końcowa"
+
+def test_track_occupancy_rebuilt_after_reference_reload():
+    engine, Session = make_session(2)
+    today = date.today()
+    first = timetable.get_track_occupancy_index(Session(), 2, today)
+    assert first.get(2)[0] == 2
+
+    db = Session()
+    db.get(models.Stop, 2).original_track_id = 4
+    db.commit()
+    reference.invalidate()
+
+    rebuilt = timetable.get_track_occupancy_index(Session(), 2, today)
+    assert rebuilt is not first
+    assert rebuilt.get(2)[0] == 4
+
+def test_bulk_edit_rejects_repeated_stop_of_one_day():
+    engine, Session = make_session(2)
+    change = schemas.StopStatusBulkUpdate(stop_id=2, track_id=4, arrival_delay=3, departure_delay=3)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(timetable.edit_timetable_bulk([change, change], Session()))
+    assert error.value.status_code == 422
+
+    with engine.connect() as connection:
+        statuses = select(func.count()).select_from(models.StopStatus).where(models.StopStatus.stop_id == 2)
+        assert connection.execute(statuses).scalar() == 0
+
+def test_edit_updates_built_track_occupancy():
+    engine, Session = make_session(2)
+    today = date.today()
+    occupancy = timetable.get_track_occupancy_index(Session(), 2, today)
+    assert occupancy.get(2)[0] == 2
+
+    change = schemas.StopStatusUpdate(track_id=4, arrival_delay=0, departure_delay=0)
+    asyncio.run(timetable.edit_timetable(2, change, Session()))
+    assert timetable.get_track_occupancy_index(Session(), 2, today) is occupancy
+    assert occupancy.get(2)[0] == 4
+
+@pytest.mark.parametrize("hour, proposed", [(0, True), (23, False)])
+def test_resolve_horizon_ends_with_operating_day(monkeypatch, hour, proposed):
+    # Kursy T0 i T12 odjeżdżają o 0:30 z jedynego toru stacji początkowej
+    engine, Session = make_session(13)
+    now = datetime.combine(date.today(), time(hour, 0))
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(timetable, "datetime", Clock)
+    result = timetable.resolve_track_conflicts(1, 120, Session())
+    # O 23:00 postoje z 0:30 należą do minionego początku doby, a nie do najbliższych dwóch godzin
+    assert bool(result["unresolved"]) == proposed
@@ -0,0 +1,25 @@
+from utils.search_index import SearchIndex, fold
+
+STATIONS = ["Łódź Kaliska", "Łódź Widzew", "Łowicz Główny", "Kraków Główny", "Gdańsk Główny", "Pruszcz Gdański"]
+
+def names(index, query, limit=10):
+    return [name for _, name, _ in index.search(query, limit)]
+
+def test_fold_removes_polish_diacritics():
+    assert fold("Łódź Żabieniec") == "lodz zabieniec"
+    assert fold("ŚWINOUJŚCIE") == "swinoujscie"
+
+def test_every_query_word_matches_a_word_prefix():
+    index = SearchIndex((name, None) for name in STATIONS)
+    assert names(index, "lodz k") == ["Łódź Kaliska"]
+    assert names(index, "GŁÓWNY") == ["Gdańsk Główny", "Kraków Główny", "Łowicz Główny"]
+
+def test_names_starting_with_query_rank_first():
+    index = SearchIndex((name, None) for name in STATIONS)
+    assert names(index, "gdansk") == ["Gdańsk Główny", "Pruszcz Gdański"]
+
+def test_typos_are_tolerated_when_prefixes_do_not_match():
+    index = SearchIndex((name, None) for name in STATIONS)
+    assert names(index, "krakwo")[0] == "Kraków Główny"
+    assert names(index, "gdnsk glowny")[0] == "Gdańsk Główny"
+    assert names(index, "xyz") == []
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+import pytest
+from utils.single_flight import SingleFlight, ThreadSingleFlight, coalesce
+
+def test_concurrent_callers_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "board"
+
+    async def main():
+        results = await asyncio.gather(*(flights.run(("departures", 1), compute) for _ in range(20)))
+        assert results == ["board"] * 20
+        assert len(flights) == 0
+
+    asyncio.run(main())
+    assert len(calls) == 1
+
+def test_different_keys_compute_separately():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        await asyncio.gather(flights.run(1, compute), flights.run(2, compute))
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+def test_exception_is_shared_and_key_released():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("db")
+
+    async def main():
+        results = await asyncio.gather(*(flights.run(1, fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert 1 not in flights
+
+    asyncio.run(main())
+
+def test_cancelled_caller_does_not_cancel_computation():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(flights.run(1, compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run(1, compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "ok"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+
+def test_cancelled_follower_does_not_cancel_leader():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(flights.run(1, compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run(1, compute))
+        await asyncio.sleep(0)
+        follower.cancel()
+        assert await leader == "ok"
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    asyncio.run(main())
+
+def test_threads_share_one_computation():
+    flights = ThreadSingleFlight()
+    calls = []
+    results = []
+
+    @coalesce(flights)
+    def departures(station_id, db=None):
+        calls.append(station_id)
+        time.sleep(0.05)
+        return [station_id]
+
+    threads = [threading.Thread(target=lambda i=i: results.append(departures(1, db=i))) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == [[1]] * 10
+    assert len(flights) == 0
+
+def test_threads_different_arguments_not_shared():
+    flights = ThreadSingleFlight()
+    calls = []
+
+    @coalesce(flights)
+    def departures(station_id, db=None):
+        calls.append(station_id)
+        time.sleep(0.02)
+        return station_id
+
+    threads = [threading.Thread(target=departures, args=(i,)) for i in (1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(calls) == [1, 2]
+
+def test_threads_share_exception():
+    flights = ThreadSingleFlight()
+    errors = []
+
+    @coalesce(flights)
+    def departures(station_id):
+        time.sleep(0.05)
+        raise LookupError(station_id)
+
+    def call():
+        try:
+            departures(1)
+        except LookupError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(errors) == 5
+    assert len({id(e) for e in errors}) == 1
@@ -0,0 +1,66 @@
+from datetime import date
+
+from utils.stop_store import StopStore
+
+MONDAY = date(2024, 1, 1)
+CALENDARS = {
+    "A": (0b1111111, date(2024, 1, 1), date(2024, 12, 31)),
+    "B": (0b0000001, date(2024, 1, 1), date(2024, 12, 31)),  # tylko poniedziałki
+}
+
+def build_store():
+    return StopStore([
+        (12, "A", 1, 490, 495, 20, 2),
+        (11, "A", 0, None, 480, 10, 1),
+        (13, "A", 2, 520, None, 30, 3),
+        (21, "B", 0, None, 485, 11, 1),
+        (22, "B", 1, 500, 502, 21, 2),
+    ], CALENDARS)
+
+def test_itinerary_in_sequence_order():
+    store = build_store()
+    trip = store.trip_index("A")
+    assert [store.stop_id[p] for p in store.itinerary(trip)] == [11, 12, 13]
+    assert store.trip_index("X") is None
+
+def test_position_lookup():
+    store = build_store()
+    assert store.stop_id[store.position(22)] == 22
+    assert store.position(99) is None
+
+def test_station_departures_ordered_and_windowed():
+    store = build_store()
+    assert [store.stop_id[p] for p in store.at_station(1, "departure")] == [11, 21]
+    assert [store.stop_id[p] for p in store.at_station(2, "departure", start=496)] == [22]
+    assert [store.stop_id[p] for p in store.at_station(2, "arrival", end=500)] == [12]
+    assert store.at_station(3, "departure") == []
+
+def test_service_day_mask():
+    store = build_store()
+    tuesday = date(2024, 1, 2)
+    assert [store.stop_id[p] for p in store.at_station(1, "departure", MONDAY)] == [11, 21]
+    assert [store.stop_id[p] for p in store.at_station(1, "departure", tuesday)] == [11]
+    assert store.at_station(1, "departure", date(2025, 1, 1)) == []
+
+def test_station_stops():
+    store = build_store()
+    assert [store.stop_id[p] for p in store.station_stops(2)] == [12, 22]
+
+def test_service_days_over_a_range():
+    store = build_store()
+    sunday = date(2023, 12, 31)
+    assert store.service_days(store.trip_index("A"), sunday, 9) == 0b111111110
+    assert store.service_days(store.trip_index("B"), sunday, 9) == 0b100000010
+    mask = store.service_days(store.trip_index("B"), MONDAY, 14)
+    for i in range(14):
+        day = date.fromordinal(MONDAY.toordinal() + i)
+        assert mask >> i & 1 == store.running(day)[store.trip_index("B")]
+
+def test_running_cache_is_thread_safe():
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = build_store()
+    days = [date.fromordinal(MONDAY.toordinal() + i % 20) for i in range(2000)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        masks = list(pool.map(store.running, days))
+    assert all(mask[store.trip_index("A")] == 1 for mask in masks)
@@ -0,0 +1,19 @@
+import io
+import zipfile
+
+from utils.streaming import csv_chunks, zip_chunks
+
+def test_csv_is_emitted_in_batches():
+    chunks = list(csv_chunks(("id", "name"), ((i, "Łódź") for i in range(5)), batch=2))
+    assert len(chunks) == 3
+    assert b"".join(chunks).decode("utf-8").splitlines() == ["id,name"] + [f"{i},Łódź" for i in range(5)]
+
+def test_zip_built_on_the_fly_is_readable():
+    rows = csv_chunks(("id",), ((i,) for i in range(10000)), batch=100)
+    chunks = list(zip_chunks([("a.txt", rows), ("b.txt", [b"x", b"y"])]))
+    # Archiwum wysyłane jest na bieżąco, a nie jednym fragmentem na końcu
+    assert len(chunks) > 3
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert archive.read("b.txt") == b"xy"
+    assert archive.read("a.txt").decode().splitlines()[-1] == "9999"
@@ -0,0 +1,30 @@
+from utils.track_conflicts import find_conflicts
+from utils.track_occupancy import TrackOccupancyIndex
+
+def test_no_conflicts():
+    assert find_conflicts([(60, 70, 1), (70, 80, 2), (90, 100, 3)]) == []
+
+def test_overlapping_pairs():
+    conflicts = find_conflicts([(60, 90, 1), (70, 80, 2), (85, 95, 3)])
+    assert sorted(conflicts) == [(1, 2, 70, 80), (1, 3, 85, 90)]
+
+def test_midnight_wrap_reported_once():
+    index = TrackOccupancyIndex()
+    index.add(1, 10, 1430, 20)
+    index.add(2, 10, 1435, 15)
+    assert index.conflicts() == {10: [(1, 2, 1435, 15)]}
+
+def test_every_overlapping_fragment_is_reported():
+    # Postój 1 przechodzi przez północ, postój 2 zajmuje tor niemal całą dobę
+    conflicts = find_conflicts(sorted([(1430, 1440, 1), (0, 20, 1), (10, 1435, 2)]))
+    assert sorted(conflicts) == [(1, 2, 10, 20), (1, 2, 1430, 1435)]
+
+def test_incremental_recompute():
+    index = TrackOccupancyIndex()
+    index.add(1, 10, 60, 70)
+    index.add(2, 20, 65, 75)
+    assert index.conflicts() == {}
+    index.update(2, 10, 65, 75)
+    assert index.conflicts() == {10: [(1, 2, 65, 70)]}
+    index.update(1, 10, 50, 55)
+    assert index.conflicts() == {}
@@ -0,0 +1,41 @@
+from utils.track_occupancy import TrackOccupancyIndex
+
+def build_index():
+    index = TrackOccupancyIndex()
+    index.add(1, 10, 60, 70)
+    index.add(2, 10, 100, 110)
+    index.add(3, 20, None, 200)
+    index.add(4, 20, 1430, 10)
+    return index
+
+def test_free_and_occupied_track():
+    index = build_index()
+    assert index.collides(10, 65, 75)
+    assert not index.collides(10, 70, 100)
+    assert not index.collides(30, 65, 75)
+
+def test_exclude_own_stop():
+    index = build_index()
+    assert not index.collides(10, 60, 70, exclude=1)
+
+def test_midnight_wrap():
+    index = build_index()
+    assert index.collides(20, 5, 8)
+    assert index.collides(20, 1435, 1439)
+    assert not index.collides(20, 15, 190)
+
+def test_available_until():
+    index = build_index()
+    assert index.available_until(10, 70) == 100
+    assert index.available_until(10, 70, exclude=2) is None
+    assert index.available_until(10, None) is None
+
+def test_incremental_update():
+    index = build_index()
+    index.update(2, 20, 300, 310)
+    assert not index.collides(10, 100, 110)
+    assert index.collides(20, 305, 306)
+    assert index.available_until(10, 70) is None
+    index.remove(1)
+    assert not index.collides(10, 60, 70)
+    assert 1 not in index
\ No newline at end of file
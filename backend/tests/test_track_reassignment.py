@@ -0,0 +1,38 @@
+import time
+from utils.track_reassignment import propose_track_changes
+
+# track_id -> platform_id
+tracks = {1: 1, 2: 1, 3: 2}
+
+def test_no_conflicts_no_changes():
+    occupancies = {10: (1, 60, 70), 11: (1, 80, 90)}
+    assert propose_track_changes(occupancies, tracks, (0, 1440)) == ([], [])
+
+def test_conflict_moved_to_same_platform():
+    occupancies = {10: (1, 60, 70), 11: (1, 65, 75)}
+    assert propose_track_changes(occupancies, tracks, (0, 1440)) == ([(11, 1, 2)], [])
+
+def test_minimal_changes():
+    occupancies = {10: (1, 60, 120), 11: (1, 65, 75), 12: (1, 80, 90), 13: (2, 70, 85)}
+    changes, unresolved = propose_track_changes(occupancies, tracks, (0, 1440))
+    assert changes == [(11, 1, 3), (12, 1, 3)]
+    assert unresolved == []
+
+def test_outside_horizon_is_fixed():
+    occupancies = {10: (1, 60, 70), 11: (1, 65, 75)}
+    assert propose_track_changes(occupancies, tracks, (0, 30)) == ([], [])
+    assert propose_track_changes(occupancies, tracks, (68, 100)) == ([(11, 1, 2)], [])
+
+def test_unresolved_when_no_track_free():
+    occupancies = {10: (1, 60, 70), 11: (2, 60, 70), 12: (3, 60, 70), 13: (1, 65, 75)}
+    assert propose_track_changes(occupancies, tracks, (0, 1440)) == ([], [13])
+
+def test_large_hub_within_budget():
+    hub_tracks = {t: t // 2 for t in range(20)}
+    occupancies = {
+        stop_id: (stop_id % 5, (stop_id * 7) % 1440, (stop_id * 7 + 6) % 1440)
+        for stop_id in range(2000)
+    }
+    started = time.monotonic()
+    propose_track_changes(occupancies, hub_tracks, (0, 1440), time_budget=0.5)
+    assert time.monotonic() - started < 1.0
\ No newline at end of file
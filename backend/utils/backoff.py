@@ -0,0 +1,10 @@
+import random
+
+def jittered_backoff(load: float, base: float = 2.0, cap: float = 60.0, rng: random.Random = random) -> float:
+    """
+    Sugerowany czas (w sekundach) przed ponownym połączeniem klienta.
+    Rośnie z obciążeniem (load - np. liczba oczekujących na pojemność) i jest losowo rozrzucony,
+    żeby klienci odrzuceni w tej samej chwili nie wrócili jednocześnie.
+    """
+    delay = min(cap, base * (1 + max(load, 0)))
+    return rng.uniform(delay / 2, delay)
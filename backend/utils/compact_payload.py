@@ -0,0 +1,68 @@
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+try:
+    import msgpack
+except ImportError:  # msgpack jest opcjonalny - bez niego wyświetlacze dostają tylko JSON
+    msgpack = None
+
+class StringTable:
+    """
+    Tablica powtarzających się napisów (np. nazw stacji) z przypisanymi numerami.
+    Numery są wspólne dla wszystkich połączeń, więc skompaktowane dane widoku można zakodować raz,
+    a każde połączenie dosyła tylko napisy, których jeszcze nie wysłało.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def id_of(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+
+    def string(self, string_id: int) -> str:
+        return self._strings[string_id]
+
+    def compact(self, data: Any, keys: Iterable[str]) -> Tuple[Any, Set[int]]:
+        """
+        Zamienia napisy pod podanymi kluczami (także listy napisów) na numery.
+        Zwraca (skompaktowane dane, użyte numery).
+        """
+        keys = set(keys)
+        used = set()
+
+        def replace(value):
+            if isinstance(value, str):
+                string_id = self.id_of(value)
+                used.add(string_id)
+                return string_id
+            if isinstance(value, list):
+                return [replace(item) for item in value]
+            return value
+
+        def walk(value):
+            if isinstance(value, dict):
+                return {k: replace(v) if k in keys else walk(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [walk(item) for item in value]
+            return value
+
+        return walk(data), used
+
+def pack_data(data: Any) -> bytes:
+    return msgpack.packb(data)
+
+def pack_message(strings: Dict[int, str], packed_data: bytes) -> bytes:
+    """
+    Wiadomość binarna {"strings": {numer: napis}, "data": dane} - dane są już zakodowane przez pack_data,
+    więc dokleja się je bez ponownego kodowania.
+    """
+    # 0x82 - mapa msgpack z dwoma elementami
+    return b"\x82" + msgpack.packb("strings") + msgpack.packb(strings) + msgpack.packb("data") + packed_data
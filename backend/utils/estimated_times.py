@@ -0,0 +1,52 @@
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from .stop_store import NO_TIME
+
+# Wspólne wyliczanie czasów rzeczywistych (plan + opóźnienie) na kolumnach minut.
+# Minuty liczone są od północy dnia doby przewozowej: godziny wcześniejsze niż początek doby
+# należą do następnego dnia kalendarzowego, więc mają wartość >= 1440.
+
+def service_minute(planned: int, day_start: int = 0) -> int:
+    if planned == NO_TIME:
+        return NO_TIME
+    return planned + 1440 if planned < day_start else planned
+
+def delayed_minute(planned: Optional[int], delay: Optional[int]) -> Optional[int]:
+    """
+    Minuta rzeczywista w obrębie doby (z zawinięciem przez północ) - dla indeksów zajętości torów.
+    """
+    if planned is None or planned == NO_TIME:
+        return None
+    return (planned + (delay or 0)) % 1440
+
+def estimate(planned: Sequence[int], delays: Sequence[Optional[int]], day_start: int = 0) -> Tuple[array, array]:
+    """
+    Zwraca (plan, czas rzeczywisty) w minutach od północy dnia doby; NO_TIME pozostaje bez zmian.
+    """
+    service = array("l", (service_minute(p, day_start) for p in planned))
+    estimated = array("l", (NO_TIME if p == NO_TIME else p + (d or 0) for p, d in zip(service, delays)))
+    return service, estimated
+
+def wrapped(values: Sequence[int]) -> array:
+    """
+    Minuty sprowadzone do zakresu doby kalendarzowej 0-1439 (jak godzina + interwał w SQL).
+    """
+    return array("l", (NO_TIME if v == NO_TIME else v % 1440 for v in values))
+
+def window(values: Sequence[int], start: Optional[float] = None, end: Optional[float] = None) -> List[int]:
+    """
+    Indeksy wartości w przedziale domkniętym [start, end] (bez NO_TIME), w kolejności wejściowej.
+    """
+    return [
+        i for i, v in enumerate(values)
+        if v != NO_TIME and (start is None or v >= start) and (end is None or v <= end)
+    ]
+
+def argsort(values: Sequence[int], indices: Optional[Sequence[int]] = None) -> List[int]:
+    """
+    Indeksy uporządkowane według wartości; sortowanie stabilne (równe wartości zachowują kolejność wejściową).
+    """
+    if indices is None:
+        indices = range(len(values))
+    return sorted(indices, key=values.__getitem__)
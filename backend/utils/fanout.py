@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, Optional, Set
+
+class Overflow(Exception):
+    """
+    Odbiorca nie nadąża z odbieraniem wiadomości - jego bufor się przepełnił.
+    """
+
+class Outbox:
+    """
+    Ograniczony bufor wiadomości dla jednego odbiorcy.
+    Wiadomość z kluczem zastępuje oczekującą wiadomość o tym samym kluczu (np. kolejny sygnał odświeżenia
+    albo kolejna zmiana tego samego postoju), więc odbiorca dostaje tylko najnowszą wersję.
+    Gdy bufor jest pełny, odbiorca zostaje oznaczony jako przepełniony: oczekujące wiadomości są odrzucane,
+    a get() zgłasza Overflow - odbiorca powinien się rozłączyć i po ponownym połączeniu pobrać pełny stan.
+    """
+
+    __slots__ = ("maxsize", "overflowed", "_pending", "_ready")
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._pending: Dict[Hashable, Any] = {}
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, message: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        Dodaje wiadomość bez czekania. Zwraca False, jeśli odbiorca jest przepełniony.
+        """
+        if self.overflowed:
+            return False
+        if key is None:
+            key = object()
+        if key not in self._pending and len(self._pending) >= self.maxsize:
+            self.overflowed = True
+            self._pending.clear()
+        else:
+            # Zastąpienie wiadomości o tym samym kluczu zachowuje jej miejsce w kolejności
+            self._pending[key] = message
+        self._ready.set()
+        return not self.overflowed
+
+    async def get(self) -> Any:
+        while not self._pending and not self.overflowed:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.overflowed:
+            raise Overflow()
+        return self._pending.pop(next(iter(self._pending)))
+
+class Fanout:
+    """
+    Rozsyłanie wiadomości do odbiorców zapisanych na temat (np. id stacji).
+    publish() tylko wkłada wiadomość do bufora każdego odbiorcy i nie czeka na żadnego z nich -
+    czas rozesłania nie zależy od najwolniejszego odbiorcy, a wysyłaniem zajmuje się połączenie odbiorcy.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._subscribers: Dict[Hashable, Set[Outbox]] = {}
+
+    def __contains__(self, topic: Hashable) -> bool:
+        return topic in self._subscribers
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._subscribers))
+
+    def subscribers(self, topic: Hashable) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    @contextmanager
+    def subscription(self, topic: Hashable) -> Iterator[Outbox]:
+        outbox = Outbox(self.maxsize)
+        self._subscribers.setdefault(topic, set()).add(outbox)
+        try:
+            yield outbox
+        finally:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(outbox)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic: Hashable, message: Any, key: Optional[Hashable] = None) -> int:
+        """
+        Przekazuje wiadomość wszystkim odbiorcom tematu. Zwraca liczbę odbiorców przepełnionych (do rozłączenia).
+        """
+        lagging = 0
+        for outbox in self._subscribers.get(topic, ()):
+            if not outbox.put(message, key):
+                lagging += 1
+        return lagging
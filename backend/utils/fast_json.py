@@ -0,0 +1,29 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson jest opcjonalny - bez niego używamy modułu json
+    orjson = None
+
+def dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps(obj) -> str:
+    """
+    Kodowanie JSON do wysłania przez WebSocket (send_text).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj)
+
+class FastJSONResponse(JSONResponse):
+    """
+    Odpowiedź REST kodowana przez orjson (jeśli jest zainstalowany).
+    """
+
+    def render(self, content) -> bytes:
+        return dumps_bytes(content)
@@ -0,0 +1,103 @@
+from typing import Iterable, Optional, Tuple
+
+# Kodowanie komunikatów GTFS-Realtime (gtfs-realtime.proto) w formacie binarnym protobuf.
+# Potrzebny jest tylko podzbiór: nagłówek strumienia i TripUpdates, więc pola kodowane są wprost,
+# bez zależności od biblioteki protobuf. Komunikat protobuf to ciąg pól, a powtarzane pole `entity`
+# można dopisywać kolejno - strumień FeedMessage to nagłówek i po jednym fragmencie na kurs.
+
+GTFS_REALTIME_VERSION = "2.0"
+
+# TripDescriptor.ScheduleRelationship
+TRIP_SCHEDULED, TRIP_CANCELED = 0, 3
+# TripUpdate.StopTimeUpdate.ScheduleRelationship
+STOP_SCHEDULED, STOP_SKIPPED = 0, 1
+
+_VARINT, _LENGTH_DELIMITED = 0, 2
+
+def varint(value: int) -> bytes:
+    # Liczby ujemne (int32/int64) kodowane są jako 64-bitowe uzupełnienie do dwóch
+    value &= 0xFFFFFFFFFFFFFFFF
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def field_varint(number: int, value: int) -> bytes:
+    return varint(number << 3 | _VARINT) + varint(value)
+
+def field_bytes(number: int, value: bytes) -> bytes:
+    return varint(number << 3 | _LENGTH_DELIMITED) + varint(len(value)) + value
+
+def field_string(number: int, value: str) -> bytes:
+    return field_bytes(number, value.encode("utf-8"))
+
+def feed_header(timestamp: int) -> bytes:
+    """
+    Pole `header` komunikatu FeedMessage (pełny zbiór danych).
+    """
+    header = field_string(1, GTFS_REALTIME_VERSION) + field_varint(2, 0) + field_varint(3, timestamp)
+    return field_bytes(1, header)
+
+def stop_time_update(stop_sequence: int, stop_id: str, arrival_delay: Optional[int], departure_delay: Optional[int],
+                     skipped: bool = False, assigned_stop_id: Optional[str] = None) -> bytes:
+    """
+    StopTimeUpdate postoju; opóźnienia w sekundach (None - bez zdarzenia), `assigned_stop_id` - zmieniony tor.
+    """
+    update = field_varint(1, stop_sequence)
+    if not skipped:
+        if arrival_delay is not None:
+            update += field_bytes(2, field_varint(1, arrival_delay))
+        if departure_delay is not None:
+            update += field_bytes(3, field_varint(1, departure_delay))
+    update += field_string(4, stop_id)
+    if skipped:
+        update += field_varint(5, STOP_SKIPPED)
+    if assigned_stop_id is not None:
+        update += field_bytes(6, field_string(1, assigned_stop_id))
+    return update
+
+def trip_update_entity(entity_id: str, trip_id: str, start_date: str, stop_updates: Iterable[bytes],
+                       cancelled: bool = False, route_id: Optional[str] = None) -> bytes:
+    """
+    Pole `entity` komunikatu FeedMessage z TripUpdate kursu; `start_date` w formacie RRRRMMDD.
+    """
+    trip = field_string(1, trip_id) + field_string(3, start_date)
+    if cancelled:
+        trip += field_varint(4, TRIP_CANCELED)
+    if route_id is not None:
+        trip += field_string(5, route_id)
+    trip_update = field_bytes(1, trip)
+    if not cancelled:
+        trip_update += b"".join(field_bytes(2, update) for update in stop_updates)
+    entity = field_string(1, entity_id) + field_bytes(3, trip_update)
+    return field_bytes(2, entity)
+
+def parse(message: bytes) -> Iterable[Tuple[int, object]]:
+    """
+    Pola komunikatu jako (numer, wartość) - liczby dla varint, bajty dla pól o zmiennej długości.
+    Do podglądu i testów strumienia; zagnieżdżone komunikaty parsuje się ponownie.
+    """
+    i = 0
+    while i < len(message):
+        key, i = _read_varint(message, i)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == _VARINT:
+            value, i = _read_varint(message, i)
+        elif wire_type == _LENGTH_DELIMITED:
+            length, i = _read_varint(message, i)
+            value, i = message[i:i + length], i + length
+        else:
+            raise ValueError(f"Nieobsługiwany typ pola protobuf: {wire_type}")
+        yield number, value
+
+def _read_varint(message: bytes, i: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = message[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, i
@@ -0,0 +1,54 @@
+from datetime import date, datetime, time, timedelta
+from typing import Tuple
+
+def parse_day_start(value: str) -> time:
+    """
+    Godzina rozpoczęcia doby przewozowej w formacie HH:MM (np. "03:00").
+    """
+    hours, minutes = map(int, value.split(":"))
+    return time(hours, minutes)
+
+class OperatingDay:
+    """
+    Doba przewozowa rozpoczynająca się o godzinie `start` (domyślnie o północy).
+    Doba D trwa od D `start` do D+1 `start`; postoje z godziną wcześniejszą niż `start`
+    należą do końcówki doby (odbywają się następnego dnia kalendarzowego).
+    """
+
+    def __init__(self, start: time = time(0, 0)):
+        self.start = start
+        self.start_minute = start.hour * 60 + start.minute
+        self._offset = timedelta(minutes=self.start_minute)
+
+    def service_date(self, now: datetime) -> date:
+        """
+        Doba przewozowa trwająca w chwili `now`.
+        """
+        return (now - self._offset).date()
+
+    def window(self, now: datetime) -> Tuple[date, date]:
+        """
+        Aktywne okno rozkładu: bieżąca doba i następna (jej początek jest widoczny na tablicach przed zmianą doby).
+        """
+        today = self.service_date(now)
+        return today, today + timedelta(days=1)
+
+    def stop_datetime(self, service_date: date, t: time) -> datetime:
+        """
+        Chwila postoju o godzinie `t` w dobie `service_date`.
+        """
+        if t < self.start:
+            return datetime.combine(service_date + timedelta(days=1), t)
+        return datetime.combine(service_date, t)
+
+    def minutes_since_midnight(self, service_date: date, moment: datetime) -> float:
+        """
+        Chwila `moment` w minutach od północy dnia `service_date` (skala minut z utils.estimated_times).
+        """
+        return (moment - datetime.combine(service_date, time(0, 0))).total_seconds() / 60
+
+    def next_rollover(self, now: datetime) -> datetime:
+        """
+        Najbliższa zmiana doby po chwili `now`.
+        """
+        return datetime.combine(self.service_date(now) + timedelta(days=1), self.start)
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class PayloadCache:
+    """
+    Ostatnio zbudowane dane każdego widoku (np. tablicy odjazdów stacji) razem z wersją danych,
+    z której powstały, i czasem, do którego są aktualne. Wszyscy odbiorcy tego samego widoku
+    dostają te same, raz zakodowane dane.
+    """
+
+    def __init__(self):
+        # klucz widoku -> (wersja, ważne do, wartość)
+        self._entries: Dict[Hashable, Tuple[Hashable, datetime, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: Hashable, now: datetime) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry_version, valid_until, value = entry
+        if entry_version != version or now >= valid_until:
+            return None
+        return value
+
+    def put(self, key: Hashable, version: Hashable, valid_until: datetime, value: Any):
+        self._entries[key] = (version, valid_until, value)
+
+    def discard(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,77 @@
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, List
+
+# Górne granice przedziałów opóźnień w minutach (włącznie); ostatni przedział to opóźnienia powyżej 60 minut
+BUCKETS = (0, 5, 15, 30, 60)
+BUCKET_LABELS = ("0", "1-5", "6-15", "16-30", "31-60", ">60")
+
+def bucket(delay: int) -> int:
+    """
+    Numer przedziału opóźnienia (przyjazd przed czasem liczony jest jak brak opóźnienia).
+    """
+    return bisect_left(BUCKETS, max(delay, 0))
+
+class Tally:
+    """
+    Liczniki punktualności grupy postojów. Wszystkie pola są sumami, więc liczniki można dodawać
+    i odejmować - zmiana statusu postoju to odjęcie poprzedniego udziału i dodanie nowego.
+    Postoje odwołane liczone są tylko w stops i cancelled (nie mają opóźnienia).
+    """
+    __slots__ = ("stops", "cancelled", "bus", "on_time", "delay_minutes", "buckets")
+
+    def __init__(self):
+        self.stops = 0
+        self.cancelled = 0
+        self.bus = 0
+        self.on_time = 0
+        self.delay_minutes = 0
+        self.buckets = [0] * len(BUCKET_LABELS)
+
+    def add(self, delay: int, cancelled: bool, bus: bool, on_time_limit: int, sign: int = 1):
+        self.stops += sign
+        if bus:
+            self.bus += sign
+        if cancelled:
+            self.cancelled += sign
+            return
+        if delay <= on_time_limit:
+            self.on_time += sign
+        self.delay_minutes += sign * max(delay, 0)
+        self.buckets[bucket(delay)] += sign
+
+    def merge(self, other: "Tally"):
+        self.stops += other.stops
+        self.cancelled += other.cancelled
+        self.bus += other.bus
+        self.on_time += other.on_time
+        self.delay_minutes += other.delay_minutes
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    @property
+    def ran(self) -> int:
+        return self.stops - self.cancelled
+
+    def on_time_percent(self) -> float:
+        return round(100 * self.on_time / self.ran, 1) if self.ran else 100.0
+
+    def average_delay(self) -> float:
+        return round(self.delay_minutes / self.ran, 2) if self.ran else 0.0
+
+    def distribution(self) -> List[dict]:
+        return [{"delay": label, "stops": count} for label, count in zip(BUCKET_LABELS, self.buckets)]
+
+class Rollup:
+    """
+    Liczniki Tally dla wielu grup naraz - klucz grupy to np. ("station", "38653").
+    """
+
+    def __init__(self, on_time_limit: int):
+        self.on_time_limit = on_time_limit
+        self.groups: Dict[Hashable, Tally] = {}
+
+    def add(self, keys: Iterable[Hashable], delay: int, cancelled: bool, bus: bool, sign: int = 1):
+        for key in keys:
+            tally = self.groups.get(key)
+            if tally is None:
+                tally = self.groups[key] = Tally()
+            tally.add(delay, cancelled, bus, self.on_time_limit, sign)
@@ -0,0 +1,121 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Litery, których NFKD nie rozkłada na literę bazową i znak diakrytyczny
+_FOLD = str.maketrans({"ł": "l", "Ł": "l", "ß": "ss"})
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+def fold(text: str) -> str:
+    """
+    Tekst do porównań: małe litery bez polskich znaków ("Łódź Kaliska" -> "lodz kaliska").
+    """
+    decomposed = unicodedata.normalize("NFKD", text.translate(_FOLD))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokens(text: str) -> List[str]:
+    return _TOKEN.findall(fold(text))
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Punkty za dopasowanie słowa zapytania do słowa nazwy
+EXACT, PREFIX = 3.0, 2.0
+# Najmniejsze podobieństwo trygramów (współczynnik Dice'a) słowa z literówką
+FUZZY_THRESHOLD = 0.45
+
+class SearchIndex:
+    """
+    Wyszukiwanie nazw po początkach słów z tolerancją literówek.
+    Słowa wszystkich nazw trzymane są w posortowanej liście (słowa o danym początku to jej ciągły zakres -
+    wyszukiwanie binarne), a indeks trygramów znajduje słowa podobne, gdy dopasowań po początku jest za mało.
+    Każde słowo zapytania musi pasować do któregoś słowa nazwy; wyniki są uporządkowane według dopasowania
+    (całe słowo, początek słowa, literówka), a przy równej ocenie - od najkrótszej nazwy.
+
+    entries: (nazwa, dane zwracane w wyniku).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]]):
+        self.names: List[str] = []
+        self.values: List[Any] = []
+        self._folded: List[str] = []
+        words: Dict[str, set] = defaultdict(set)
+        for name, value in entries:
+            entry = len(self.names)
+            self.names.append(name)
+            self.values.append(value)
+            self._folded.append(fold(name))
+            for token in tokens(name):
+                words[token].add(entry)
+
+        self._words: List[str] = sorted(words)
+        self._entries: List[Tuple[int, ...]] = [tuple(sorted(words[w])) for w in self._words]
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._gram_counts: List[int] = []
+        for word_index, word in enumerate(self._words):
+            grams = trigrams(word)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(word_index)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _prefix_scores(self, token: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        i = bisect_left(self._words, token)
+        while i < len(self._words) and self._words[i].startswith(token):
+            score = EXACT if self._words[i] == token else PREFIX
+            for entry in self._entries[i]:
+                if scores.get(entry, 0) < score:
+                    scores[entry] = score
+            i += 1
+        return scores
+
+    def _fuzzy_scores(self, token: str) -> Dict[int, float]:
+        grams = trigrams(token)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for word_index in self._trigrams.get(gram, ()):
+                shared[word_index] += 1
+        scores: Dict[int, float] = {}
+        for word_index, count in shared.items():
+            # Dłuższe słowo porównywane jest jak jego początek (zapytanie może być niedokończone)
+            similarity = 2 * count / (len(grams) + min(self._gram_counts[word_index], len(grams)))
+            if similarity >= FUZZY_THRESHOLD:
+                for entry in self._entries[word_index]:
+                    if scores.get(entry, 0) < similarity:
+                        scores[entry] = similarity
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, str, Any]]:
+        """
+        Zwraca do `limit` wyników (ocena, nazwa, dane) uporządkowanych od najlepszego.
+        """
+        query_tokens = tokens(query)
+        if not query_tokens:
+            return []
+
+        per_token = [self._prefix_scores(token) for token in query_tokens]
+        matched = set.intersection(*(set(scores) for scores in per_token))
+        if len(matched) < limit:
+            # Za mało dopasowań po początkach słów - słowa dłuższe niż 2 znaki mogą zawierać literówkę
+            for scores, token in zip(per_token, query_tokens):
+                if len(token) > 2:
+                    for entry, score in self._fuzzy_scores(token).items():
+                        if score > scores.get(entry, 0):
+                            scores[entry] = score
+            matched = set.intersection(*(set(scores) for scores in per_token))
+
+        folded_query = " ".join(query_tokens)
+        ranked = []
+        for entry in matched:
+            score = sum(scores[entry] for scores in per_token)
+            if self._folded[entry].startswith(folded_query):
+                score += PREFIX
+            ranked.append((-score, len(self.names[entry]), self.names[entry], entry))
+        ranked.sort()
+        return [(-score, name, self.values[entry]) for score, _, name, entry in ranked[:limit]]
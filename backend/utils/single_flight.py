@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+class SingleFlight:
+    """
+    Łączenie równoczesnych obliczeń o tym samym kluczu: pierwszy wywołujący uruchamia obliczenie,
+    a pozostali czekają na jego wynik (lub wyjątek) zamiast liczyć to samo ponownie.
+    Obliczenie działa jako osobne zadanie, więc rozłączenie któregokolwiek z czekających go nie przerywa.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(compute())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Odebranie wyjątku, gdy wszyscy czekający zdążyli się rozłączyć
+        if not flight.cancelled():
+            flight.exception()
+
+class ThreadSingleFlight:
+    """
+    Odpowiednik SingleFlight dla kodu synchronicznego wykonywanego w wielu wątkach (np. synchroniczne
+    endpointy FastAPI w puli wątków): równoczesne wywołania z tym samym kluczem czekają na wynik pierwszego.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def run(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._flights[key] = flight
+
+        if not leader:
+            return flight.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+def coalesce(flights: ThreadSingleFlight, ignore: Iterable[str] = ("db",)):
+    """
+    Dekorator funkcji synchronicznej: równoczesne wywołania z tymi samymi argumentami (poza `ignore`,
+    np. sesją bazy danych) wykonują funkcję raz i dostają ten sam wynik. Kluczem jest nazwa funkcji i argumenty.
+    """
+    ignore = set(ignore)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__qualname__,) + tuple(
+                (name, value) for name, value in bound.arguments.items() if name not in ignore
+            )
+            return flights.run(key, lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,185 @@
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Brak godziny przyjazdu/odjazdu w kolumnach minut
+NO_TIME = -1
+# Ile masek dni kursowania trzymać naraz (bieżąca i następna doba oraz dni przeglądane przez planistów)
+RUNNING_CACHE_SIZE = 8
+
+class StopStore:
+    """
+    Kolumnowy magazyn planowych postojów całej sieci.
+    Każda kolumna to tablica array (kilka bajtów na postój zamiast obiektu na wiersz), kursy są numerowane
+    (identyfikatory trzymane raz w trip_ids), a postoje ułożone według kursu i sequence - trasa kursu
+    to ciągły zakres pozycji. Dodatkowe indeksy porządkują postoje każdej stacji według godziny
+    przyjazdu i odjazdu, więc wybór postojów stacji w oknie czasowym to wyszukiwanie binarne.
+
+    rows: (stop_id, trip_id, sequence, przyjazd, odjazd, track_id, station_id), godziny w minutach od północy lub None.
+    calendars: trip_id -> (maska dni tygodnia, pierwszy dzień, ostatni dzień) - jak w runs_on_date.
+    """
+
+    def __init__(self, rows: Iterable[Tuple], calendars: Dict[str, Tuple[int, date, date]]):
+        rows = sorted(rows, key=lambda r: (r[1], r[2]))
+
+        self.trip_ids: List[str] = []
+        self._trip_index: Dict[str, int] = {}
+        self.trip_start = array("l")  # pozycja pierwszego postoju kursu, ostatni element = liczba postojów
+
+        self.stop_id = array("l")
+        self.trip = array("l")
+        self.sequence = array("l")
+        self.arrival = array("h")
+        self.departure = array("h")
+        self.track = array("l")
+        self.station = array("l")
+
+        for position, (stop_id, trip_id, sequence, arrival, departure, track_id, station_id) in enumerate(rows):
+            trip = self._trip_index.get(trip_id)
+            if trip is None:
+                trip = self._trip_index[trip_id] = len(self.trip_ids)
+                self.trip_ids.append(trip_id)
+                self.trip_start.append(position)
+            self.stop_id.append(stop_id)
+            self.trip.append(trip)
+            self.sequence.append(sequence)
+            self.arrival.append(NO_TIME if arrival is None else arrival)
+            self.departure.append(NO_TIME if departure is None else departure)
+            self.track.append(track_id)
+            self.station.append(-1 if station_id is None else station_id)
+        self.trip_start.append(len(self.stop_id))
+
+        # Kalendarze kursów: maska dni tygodnia oraz zakres ważności jako numery dni
+        self.days_mask = array("B")
+        self.start_day = array("l")
+        self.end_day = array("l")
+        for trip_id in self.trip_ids:
+            days_mask, start_date, end_date = calendars.get(trip_id, (0, date.max, date.min))
+            self.days_mask.append(days_mask)
+            self.start_day.append(start_date.toordinal())
+            self.end_day.append(end_date.toordinal())
+        self._running: Dict[date, bytearray] = {}
+        self._running_lock = threading.Lock()
+
+        # Wyszukiwanie pozycji po stop_id
+        by_id = sorted(range(len(self.stop_id)), key=self.stop_id.__getitem__)
+        self._sorted_ids = array("l", (self.stop_id[p] for p in by_id))
+        self._id_positions = array("l", by_id)
+
+        # Postoje stacji według godziny: station_id -> (pozycje, minuty) dla przyjazdów i odjazdów
+        self._by_station = {"arrival": self._station_index(self.arrival), "departure": self._station_index(self.departure)}
+
+    def _station_index(self, minutes: array) -> Dict[int, Tuple[array, array]]:
+        order = sorted(
+            (p for p in range(len(minutes)) if minutes[p] != NO_TIME),
+            key=lambda p: (self.station[p], minutes[p], self.stop_id[p])
+        )
+        index = {}
+        start = 0
+        while start < len(order):
+            station_id = self.station[order[start]]
+            end = start
+            while end < len(order) and self.station[order[end]] == station_id:
+                end += 1
+            positions = array("l", order[start:end])
+            index[station_id] = (positions, array("h", (minutes[p] for p in positions)))
+            start = end
+        return index
+
+    def __len__(self) -> int:
+        return len(self.stop_id)
+
+    def position(self, stop_id: int) -> Optional[int]:
+        i = bisect_left(self._sorted_ids, stop_id)
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == stop_id:
+            return self._id_positions[i]
+        return None
+
+    def trip_index(self, trip_id: str) -> Optional[int]:
+        return self._trip_index.get(trip_id)
+
+    def itinerary(self, trip: int) -> range:
+        """
+        Pozycje postojów kursu (numer kursu z trip_index) w kolejności sequence.
+        """
+        return range(self.trip_start[trip], self.trip_start[trip + 1])
+
+    def running(self, service_date: date) -> bytearray:
+        """
+        Maska kursów kursujących danego dnia (1 bajt na kurs), liczona raz na dzień.
+        """
+        # Wywoływane równocześnie z wielu wątków - kolejność i usuwanie masek pod blokadą
+        with self._running_lock:
+            mask = self._running.pop(service_date, None)
+            if mask is not None:
+                self._running[service_date] = mask
+                return mask
+        day = service_date.toordinal()
+        weekday = 1 << service_date.weekday()
+        mask = bytearray(
+            1 if (self.days_mask[t] & weekday and self.start_day[t] <= day <= self.end_day[t]) else 0
+            for t in range(len(self.trip_ids))
+        )
+        with self._running_lock:
+            # Najdawniej używana maska ustępuje miejsca nowej
+            if service_date not in self._running and len(self._running) >= RUNNING_CACHE_SIZE:
+                del self._running[next(iter(self._running))]
+            self._running[service_date] = mask
+        return mask
+
+    def service_days(self, trip: int, since: date, days: int) -> int:
+        """
+        Dni kursowania kursu w zakresie `days` dób od `since` jako maska bitowa (bit i - doba since + i).
+        Liczona z kalendarza jednego kursu, bez masek całej sieci dla każdej doby zakresu.
+        """
+        first = since.toordinal()
+        week = self.days_mask[trip]
+        mask = 0
+        for day in range(max(first, self.start_day[trip]), min(first + days - 1, self.end_day[trip]) + 1):
+            # Numer dnia 1 (1 stycznia roku 1) to poniedziałek
+            if week >> ((day - 1) % 7) & 1:
+                mask |= 1 << (day - first)
+        return mask
+
+    def at_station(self, station_id: int, field: str, service_date: Optional[date] = None,
+                   start: int = 0, end: int = 1440) -> List[int]:
+        """
+        Pozycje postojów stacji z godziną `field` ("arrival" lub "departure") w przedziale [start, end)
+        minut od północy, uporządkowane według tej godziny. Z `service_date` - tylko kursy kursujące tego dnia.
+        """
+        index = self._by_station[field].get(station_id)
+        if index is None:
+            return []
+        positions, minutes = index
+        lo = bisect_left(minutes, start) if start > 0 else 0
+        hi = bisect_left(minutes, end) if end < 1440 else len(minutes)
+        if service_date is None:
+            return list(positions[lo:hi])
+        running = self.running(service_date)
+        trip = self.trip
+        return [p for p in positions[lo:hi] if running[trip[p]]]
+
+    def station_stops(self, station_id: int) -> List[int]:
+        """
+        Pozycje wszystkich postojów stacji (z przyjazdem lub odjazdem).
+        """
+        positions = set()
+        for index in self._by_station.values():
+            if station_id in index:
+                positions.update(index[station_id][0])
+        return sorted(positions)
+
+    def nbytes(self) -> int:
+        """
+        Przybliżony rozmiar kolumn i indeksów w bajtach (bez identyfikatorów kursów).
+        """
+        columns = (
+            self.stop_id, self.trip, self.sequence, self.arrival, self.departure, self.track, self.station,
+            self.trip_start, self.days_mask, self.start_day, self.end_day, self._sorted_ids, self._id_positions,
+        )
+        total = sum(c.itemsize * len(c) for c in columns)
+        for index in self._by_station.values():
+            total += sum(p.itemsize * len(p) + m.itemsize * len(m) for p, m in index.values())
+        return total
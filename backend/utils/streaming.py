@@ -0,0 +1,70 @@
+import csv
+import io
+import zipfile
+from typing import Iterable, Iterator, Sequence, Tuple
+
+# Generatory fragmentów odpowiedzi strumieniowych (CSV, archiwum ZIP) - w pamięci jest tylko bieżąca paczka
+# wierszy, niezależnie od rozmiaru eksportu.
+
+# Liczba wierszy CSV kodowanych w jednym fragmencie odpowiedzi
+BATCH_ROWS = 500
+
+class _Sink(io.RawIOBase):
+    """
+    Plik tylko do zapisu zbierający bajty do odebrania przez generator (zipfile pisze do niego bez seek).
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence], batch: int = BATCH_ROWS) -> Iterator[bytes]:
+    """
+    Plik CSV (UTF-8, separator przecinek) jako fragmenty po `batch` wierszy.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def zip_chunks(files: Iterable[Tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    """
+    Archiwum ZIP z plików (nazwa, fragmenty zawartości) tworzone w locie - rozmiary i sumy kontrolne
+    zapisywane są po danych pliku, więc archiwum nie wymaga cofania się w strumieniu.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            with archive.open(name, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
@@ -1,5 +1,32 @@
 from typing import Optional, List, Tuple
 
+# Domyślny czas zajętości toru (w minutach), gdy znany jest tylko przyjazd albo tylko odjazd
+DEFAULT_OCCUPANCY = 5
+
+def get_segments(arr: Optional[int], dep: Optional[int]) -> List[Tuple[int, int]]:
+    """
+    Zamienia czasy przyjazdu i odjazdu (w minutach od północy) na przedziały zajętości toru.
+    Postój przechodzący przez północ dzielony jest na dwa przedziały.
+    """
+    if arr is None and dep is None:
+        return []
+
+    start, end = 0, 0
+    if arr is None:
+        start, end = dep, dep + DEFAULT_OCCUPANCY
+    elif dep is None:
+        start, end = arr, arr + DEFAULT_OCCUPANCY
+    else:
+        start, end = arr, dep
+
+    if end < start:
+        return [(start, 1440), (0, end)]
+
+    return [(start, end)]
+
+def segments_collide(s1: Tuple[int, int], s2: Tuple[int, int]) -> bool:
+    return not (s1[1] <= s2[0] or s2[1] <= s1[0])
+
 def is_collision(
     a_arrival: Optional[int],
     a_departure: Optional[int],
@@ -7,26 +34,6 @@ def is_collision(
     b_departure: Optional[int]
 ) -> bool:
 
-    def get_segments(arr: Optional[int], dep: Optional[int]) -> List[Tuple[int, int]]:
-        if arr is None and dep is None:
-            return []
-        
-        start, end = 0, 0
-        if arr is None:
-            start, end = dep, dep + 5
-        elif dep is None:
-            start, end = arr, arr + 5
-        else:
-            start, end = arr, dep
-
-        if end < start:
-            return [(start, 1440), (0, end)]
-        
-        return [(start, end)]
-
-    def segments_collide(s1: Tuple[int, int], s2: Tuple[int, int]) -> bool:
-        return not (s1[1] <= s2[0] or s2[1] <= s1[0])
-
     segments_a = get_segments(a_arrival, a_departure)
     segments_b = get_segments(b_arrival, b_departure)
 
@@ -0,0 +1,39 @@
+import heapq
+from typing import Dict, List, Tuple
+
+def find_conflicts(segments: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Wyszukuje nakładające się postoje na jednym torze metodą miotły (sweep-line).
+    Przyjmuje posortowaną listę przedziałów (start, koniec, stop_id) w minutach od północy.
+    Zwraca listę (stop_a, stop_b, początek_kolizji, koniec_kolizji) dla każdego nakładającego się fragmentu.
+    Kolizja trwająca przez północ jest jednym wpisem z początkiem późniejszym niż koniec (np. 1435, 15).
+    """
+    conflicts: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+    # Kopiec aktywnych przedziałów: (koniec, start, stop_id)
+    active: List[Tuple[int, int, int]] = []
+
+    for start, end, stop_id in segments:
+        # Usuwamy przedziały, które skończyły się przed początkiem bieżącego
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+
+        for other_end, other_start, other_id in active:
+            if other_id == stop_id or end <= other_start:
+                continue
+            pair = (min(stop_id, other_id), max(stop_id, other_id))
+            conflicts.setdefault(pair, []).append((max(start, other_start), min(end, other_end)))
+
+        heapq.heappush(active, (end, start, stop_id))
+
+    return [(a, b, overlap_start, overlap_end) for (a, b), overlaps in conflicts.items()
+            for overlap_start, overlap_end in join_midnight(overlaps)]
+
+def join_midnight(overlaps: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Łączy fragment kończący się o północy z fragmentem zaczynającym się o północy w jeden przedział.
+    """
+    overlaps = sorted(overlaps)
+    if len(overlaps) > 1 and overlaps[0][0] == 0 and overlaps[-1][1] == 1440:
+        after, before = overlaps.pop(0), overlaps.pop()
+        overlaps.append((before[0], after[1]))
+    return overlaps
\ No newline at end of file
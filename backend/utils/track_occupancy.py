@@ -0,0 +1,151 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .track_collision import get_segments
+from .track_conflicts import find_conflicts
+
+class TrackOccupancyIndex:
+    """
+    Indeks zajętości torów jednej stacji w danym dniu.
+    Dla każdego toru trzyma posortowaną listę przedziałów (start, koniec, stop_id) w minutach od północy
+    oraz posortowaną listę przyjazdów, dzięki czemu zapytania wykonywane są wyszukiwaniem binarnym.
+    `version` - wersja danych (rozkładu planowego), z której zbudowano indeks.
+    """
+
+    def __init__(self, version: Optional[int] = None):
+        self.version = version
+        # track_id -> posortowana lista (start, koniec, stop_id)
+        self._segments: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        # track_id -> posortowana lista (przyjazd, stop_id)
+        self._arrivals: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        # track_id -> najdłuższy przedział na torze (ogranicza zakres przeszukiwania)
+        self._max_length: Dict[int, int] = defaultdict(int)
+        # stop_id -> (track_id, przyjazd, odjazd)
+        self._entries: Dict[int, Tuple[int, Optional[int], Optional[int]]] = {}
+        # track_id -> wyliczone kolizje; tory zmienione od ostatniego wyliczenia trafiają do _dirty
+        self._conflicts: Dict[int, List[Tuple[int, int, int, int]]] = {}
+        self._dirty = set()
+
+    def __contains__(self, stop_id: int) -> bool:
+        return stop_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, stop_id: int) -> Optional[Tuple[int, Optional[int], Optional[int]]]:
+        return self._entries.get(stop_id)
+
+    def entries(self) -> Dict[int, Tuple[int, Optional[int], Optional[int]]]:
+        return dict(self._entries)
+
+    def add(self, stop_id: int, track_id: int, arrival: Optional[int], departure: Optional[int]):
+        if stop_id in self._entries:
+            self.remove(stop_id)
+
+        segments = get_segments(arrival, departure)
+        if not segments:
+            return
+
+        self._entries[stop_id] = (track_id, arrival, departure)
+        self._dirty.add(track_id)
+        for start, end in segments:
+            insort(self._segments[track_id], (start, end, stop_id))
+            self._max_length[track_id] = max(self._max_length[track_id], end - start)
+        if arrival is not None:
+            insort(self._arrivals[track_id], (arrival, stop_id))
+
+    def remove(self, stop_id: int):
+        entry = self._entries.pop(stop_id, None)
+        if entry is None:
+            return
+
+        track_id, arrival, departure = entry
+        self._dirty.add(track_id)
+        segments = self._segments[track_id]
+        for start, end in get_segments(arrival, departure):
+            i = bisect_left(segments, (start, end, stop_id))
+            if i < len(segments) and segments[i] == (start, end, stop_id):
+                del segments[i]
+        if arrival is not None:
+            arrivals = self._arrivals[track_id]
+            i = bisect_left(arrivals, (arrival, stop_id))
+            if i < len(arrivals) and arrivals[i] == (arrival, stop_id):
+                del arrivals[i]
+        # _max_length nie jest zmniejszane - zawyżone ograniczenie nadal daje poprawne wyniki
+
+    # Aktualizacja pojedynczego postoju (np. po edycji opóźnienia lub toru)
+    update = add
+
+    def occupants(
+        self,
+        track_id: int,
+        arrival: Optional[int],
+        departure: Optional[int],
+        exclude: Optional[int] = None
+    ) -> List[int]:
+        """
+        Zwraca id postojów zajmujących tor w podanym przedziale czasu.
+        Przeszukiwane są tylko przedziały rozpoczynające się w oknie [start - najdłuższy przedział, koniec).
+        """
+        segments = self._segments.get(track_id)
+        if not segments:
+            return []
+
+        max_length = self._max_length[track_id]
+        result = []
+        for q_start, q_end in get_segments(arrival, departure):
+            lo = bisect_left(segments, (q_start - max_length,))
+            hi = bisect_left(segments, (q_end,))
+            for start, end, stop_id in segments[lo:hi]:
+                if end > q_start and stop_id != exclude and stop_id not in result:
+                    result.append(stop_id)
+        return result
+
+    def collides(
+        self,
+        track_id: int,
+        arrival: Optional[int],
+        departure: Optional[int],
+        exclude: Optional[int] = None
+    ) -> bool:
+        return bool(self.occupants(track_id, arrival, departure, exclude))
+
+    def available_until(self, track_id: int, after: Optional[int], exclude: Optional[int] = None) -> Optional[int]:
+        """
+        Zwraca najbliższy przyjazd innego pociągu na tor nie wcześniej niż w minucie `after`.
+        """
+        if after is None:
+            return None
+
+        arrivals = self._arrivals.get(track_id)
+        if not arrivals:
+            return None
+
+        i = bisect_left(arrivals, (after,))
+        while i < len(arrivals):
+            arrival, stop_id = arrivals[i]
+            if stop_id != exclude:
+                return arrival
+            i += 1
+        return None
+
+    def track_segments(self, track_id: int) -> List[Tuple[int, int, int]]:
+        return self._segments.get(track_id, [])
+
+    def track_ids(self) -> List[int]:
+        return [track_id for track_id, segments in self._segments.items() if segments]
+
+    def conflicts(self) -> Dict[int, List[Tuple[int, int, int, int]]]:
+        """
+        Zwraca kolizje na wszystkich torach: track_id -> [(stop_a, stop_b, od, do)].
+        Ponownie wyliczane są tylko tory zmienione od poprzedniego wywołania.
+        """
+        for track_id in self._dirty:
+            track_conflicts = find_conflicts(self._segments.get(track_id, []))
+            if track_conflicts:
+                self._conflicts[track_id] = track_conflicts
+            else:
+                self._conflicts.pop(track_id, None)
+        self._dirty.clear()
+        return self._conflicts
\ No newline at end of file
@@ -0,0 +1,80 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .track_collision import get_segments, segments_collide
+from .track_occupancy import TrackOccupancyIndex
+
+def propose_track_changes(
+    occupancies: Dict[int, Tuple[int, Optional[int], Optional[int]]],
+    tracks: Dict[int, int],
+    horizon: Tuple[int, int],
+    time_budget: float = 0.2
+) -> Tuple[List[Tuple[int, int, int]], List[int]]:
+    """
+    Proponuje zmiany torów usuwające kolizje w podanym horyzoncie czasu.
+    occupancies: stop_id -> (track_id, przyjazd, odjazd) w minutach od północy (z opóźnieniami)
+    tracks: track_id -> platform_id wszystkich torów stacji
+    horizon: (od, do) w minutach od północy; postoje spoza horyzontu pozostają na swoich torach
+
+    Kolorowanie grafu przedziałów zachłannie w kolejności rozpoczęcia postoju:
+    pociąg zostaje na swoim torze, jeśli ten jest wolny, w przeciwnym razie dostaje wolny tor
+    (najpierw taki, na który nie wjadą później inne pociągi, i przy tym samym peronie).
+    Zwraca (lista (stop_id, stary_tor, nowy_tor), lista postojów bez rozwiązania).
+    """
+    deadline = time.monotonic() + time_budget
+    horizon_segments = get_segments(*horizon)
+
+    def in_horizon(arrival, departure):
+        return any(
+            segments_collide(segment, horizon_segment)
+            for segment in get_segments(arrival, departure)
+            for horizon_segment in horizon_segments
+        )
+
+    # index - postoje już rozmieszczone, pending - postoje czekające na rozmieszczenie (na planowanych torach)
+    index = TrackOccupancyIndex()
+    pending = TrackOccupancyIndex()
+    movable = []
+    for stop_id, (track_id, arrival, departure) in occupancies.items():
+        if in_horizon(arrival, departure):
+            movable.append(stop_id)
+            pending.add(stop_id, track_id, arrival, departure)
+        else:
+            index.add(stop_id, track_id, arrival, departure)
+
+    def start_of(stop_id):
+        _, arrival, departure = occupancies[stop_id]
+        return get_segments(arrival, departure)[0][0], stop_id
+
+    movable.sort(key=start_of)
+
+    changes = []
+    unresolved = []
+    for position, stop_id in enumerate(movable):
+        track_id, arrival, departure = occupancies[stop_id]
+        pending.remove(stop_id)
+
+        # Po przekroczeniu limitu czasu pozostałe postoje zostają na swoich torach
+        if time.monotonic() > deadline:
+            for rest_id in movable[position:]:
+                rest_track, rest_arrival, rest_departure = occupancies[rest_id]
+                if index.collides(rest_track, rest_arrival, rest_departure):
+                    unresolved.append(rest_id)
+                index.add(rest_id, rest_track, rest_arrival, rest_departure)
+            break
+
+        new_track_id = track_id
+        if index.collides(track_id, arrival, departure):
+            platform_id = tracks.get(track_id)
+            candidates = [t for t in tracks if t != track_id and not index.collides(t, arrival, departure)]
+            candidates.sort(key=lambda t: (pending.collides(t, arrival, departure), tracks[t] != platform_id, t))
+            new_track_id = candidates[0] if candidates else None
+            if new_track_id is None:
+                unresolved.append(stop_id)
+                new_track_id = track_id
+            else:
+                changes.append((stop_id, track_id, new_track_id))
+
+        index.add(stop_id, new_track_id, arrival, departure)
+
+    return changes, unresolved
\ No newline at end of file